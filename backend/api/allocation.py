@@ -0,0 +1,209 @@
+import random
+from bisect import bisect_left, insort
+
+# Seat layout used by SeatMatrixView: rows of 6, 3 on each side of the aisle
+SEATS_PER_ROW = 6
+
+# Positions within a row (0-based) that satisfy each seating preference
+PREFERENCE_POSITIONS = {
+    'window': (0, SEATS_PER_ROW - 1),
+    'aisle': (SEATS_PER_ROW // 2 - 1, SEATS_PER_ROW // 2),
+}
+
+
+class NotEnoughSeats(Exception):
+    """Raised when a train has fewer available seats than requested."""
+
+
+class SeatAllocator:
+    """
+    Free-block index over one train's available seats.
+
+    Rows are bucketed twice, by how many free seats they have and by their
+    longest run of adjacent free seats, with each bucket a sorted list of row
+    numbers; a parallel set of buckets per seating preference holds the rows
+    that still have a preferred seat free. Building the index is linear in
+    the available seats. Once built, placing a group walks at most
+    SEATS_PER_ROW buckets per row it uses, and taking or releasing seats
+    re-files only their rows, each with a bisect, so an index kept between
+    requests (see seat_index and ShardWriter) is updated in proportion to
+    the seats that changed rather than rebuilt.
+
+    Among equally good rows one is picked at random, so concurrent requests
+    for the same train spread out instead of racing for the first free row.
+    """
+
+    def __init__(self, available_seat_numbers, seats_per_row=SEATS_PER_ROW):
+        self.seats_per_row = seats_per_row
+        self.free_count = 0
+        self.free_by_row = {}
+        for seat_number in sorted(available_seat_numbers):
+            row, position = divmod(seat_number - 1, seats_per_row)
+            self.free_by_row.setdefault(row, []).append(position)
+            self.free_count += 1
+
+        self.rows_by_free = self._empty_buckets()
+        self.rows_by_run = self._empty_buckets()
+        self.preferred_rows_by_free = {
+            preference: self._empty_buckets() for preference in PREFERENCE_POSITIONS
+        }
+        self.preferred_rows_by_run = {
+            preference: self._empty_buckets() for preference in PREFERENCE_POSITIONS
+        }
+        for row in sorted(self.free_by_row):
+            self._file(row)
+
+    def _empty_buckets(self):
+        return [[] for _ in range(self.seats_per_row + 1)]
+
+    def _longest_run(self, positions):
+        longest = run = 0
+        previous = None
+        for position in positions:
+            run = run + 1 if previous is not None and position == previous + 1 else 1
+            longest = max(longest, run)
+            previous = position
+        return longest
+
+    def _buckets_for(self, row):
+        """Yield (buckets, size) for every bucket list the row is filed in."""
+        positions = self.free_by_row[row]
+        free = len(positions)
+        run = self._longest_run(positions)
+        yield self.rows_by_free, free
+        yield self.rows_by_run, run
+        for preference, preferred in PREFERENCE_POSITIONS.items():
+            if any(position in preferred for position in positions):
+                yield self.preferred_rows_by_free[preference], free
+                yield self.preferred_rows_by_run[preference], run
+
+    def _file(self, row):
+        for buckets, size in self._buckets_for(row):
+            insort(buckets[size], row)
+
+    def _unfile(self, row):
+        for buckets, size in self._buckets_for(row):
+            bucket = buckets[size]
+            del bucket[bisect_left(bucket, row)]
+
+    def _take(self, row, positions):
+        self._unfile(row)
+        remaining = [position for position in self.free_by_row[row] if position not in positions]
+        if remaining:
+            self.free_by_row[row] = remaining
+            self._file(row)
+        else:
+            del self.free_by_row[row]
+        self.free_count -= len(positions)
+        return [row * self.seats_per_row + position + 1 for position in positions]
+
+    def _positions_by_row(self, seat_numbers):
+        by_row = {}
+        for seat_number in seat_numbers:
+            row, position = divmod(seat_number - 1, self.seats_per_row)
+            by_row.setdefault(row, set()).add(position)
+        return by_row
+
+    def is_free(self, seat_number):
+        """Return True if the seat is in the index."""
+        row, position = divmod(seat_number - 1, self.seats_per_row)
+        return position in self.free_by_row.get(row, ())
+
+    def take(self, seat_numbers):
+        """Remove specific seats from the index; seats not in it are ignored."""
+        for row, positions in self._positions_by_row(seat_numbers).items():
+            taken = [position for position in self.free_by_row.get(row, ()) if position in positions]
+            if taken:
+                self._take(row, taken)
+
+    def release(self, seat_numbers):
+        """Add seats to the index; seats already in it are ignored."""
+        for row, positions in self._positions_by_row(seat_numbers).items():
+            free = self.free_by_row.get(row, [])
+            added = positions.difference(free)
+            if not added:
+                continue
+            if free:
+                self._unfile(row)
+            self.free_by_row[row] = sorted(free + list(added))
+            self._file(row)
+            self.free_count += len(added)
+
+    def _find_row(self, count, preference=None, adjacent=False):
+        """
+        Pick a row with at least ``count`` free seats, smallest fit first.
+
+        With ``adjacent`` the seats must also form one run of adjacent seats.
+        """
+        if adjacent:
+            preferred_buckets, all_buckets = self.preferred_rows_by_run, self.rows_by_run
+        else:
+            preferred_buckets, all_buckets = self.preferred_rows_by_free, self.rows_by_free
+        bucket_sets = []
+        if preference in preferred_buckets:
+            bucket_sets.append(preferred_buckets[preference])
+        bucket_sets.append(all_buckets)
+
+        for buckets in bucket_sets:
+            for size in range(count, self.seats_per_row + 1):
+                if buckets[size]:
+                    return random.choice(buckets[size])
+        return None
+
+    def _pick_positions(self, row, count, preference=None):
+        """Choose ``count`` free positions in a row, adjacent if possible."""
+        free = self.free_by_row[row]
+        preferred = PREFERENCE_POSITIONS.get(preference, ())
+
+        runs = [
+            free[start:start + count]
+            for start in range(len(free) - count + 1)
+            if free[start + count - 1] - free[start] == count - 1
+        ]
+        if runs:
+            runs.sort(key=lambda run: not any(position in preferred for position in run))
+            return runs[0]
+
+        ordered = sorted(free, key=lambda position: position not in preferred)
+        return sorted(ordered[:count])
+
+    def allocate(self, count, together=False, preference=None):
+        """
+        Pick ``count`` available seats and remove them from the index.
+
+        Args:
+            count (int): Number of seats wanted
+            together (bool): Keep the group in as few rows as possible
+            preference (str, optional): 'window' or 'aisle'
+
+        Returns:
+            list: Sorted seat numbers
+
+        Raises:
+            NotEnoughSeats: If fewer than ``count`` seats are available
+        """
+        if count > self.free_count:
+            raise NotEnoughSeats(f"Only {self.free_count} seats available")
+
+        seats = []
+        remaining = count
+        if together:
+            while remaining:
+                chunk = min(remaining, self.seats_per_row)
+                # A row where the chunk sits side by side, else any row it fits in
+                row = self._find_row(chunk, preference, adjacent=True)
+                if row is None:
+                    row = self._find_row(chunk, preference)
+                if row is None:
+                    break
+                seats += self._take(row, self._pick_positions(row, chunk, preference))
+                remaining -= chunk
+
+        # Whatever is left goes one seat at a time into the most fragmented
+        # rows, keeping emptier rows free for groups
+        while remaining:
+            row = self._find_row(1, preference)
+            seats += self._take(row, self._pick_positions(row, 1, preference))
+            remaining -= 1
+
+        return sorted(seats)
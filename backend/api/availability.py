@@ -0,0 +1,25 @@
+from django.db.models import F
+
+from .models import Train
+
+
+def trains_with_availability(queryset=None):
+    """
+    Annotate trains with their stations and available seat count.
+
+    Stations are joined in the same query and availability comes from the
+    train's own seat counters, so listing N trains costs one round-trip.
+
+    Args:
+        queryset (QuerySet, optional): Trains to annotate. Defaults to all trains.
+
+    Returns:
+        QuerySet: Trains annotated with ``available_seats``
+    """
+    if queryset is None:
+        queryset = Train.objects.all()
+
+    # The packed seat bitmap is never needed for listings
+    return queryset.select_related('source', 'destination').defer('seat_bitmap').annotate(
+        available_seats=F('seats_available'),
+    )
@@ -0,0 +1,149 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .allocation import NotEnoughSeats, SeatAllocator
+from .booking import ALLOCATION_ATTEMPTS, book_best_seats, book_seats, book_seats_batch, plan_seats
+from .holds import release_expired_holds
+from .inventory import ConcurrentUpdate, InvalidSeats, SeatsUnavailable, available_seat_numbers
+from .models import Train
+from .retry import retry_on_conflict
+
+BATCH_MODES = ('atomic', 'per_item')
+
+# Errors that fail one item rather than the whole request
+ITEM_ERRORS = (InvalidSeats, SeatsUnavailable, NotEnoughSeats, DatabaseError, ConcurrentUpdate)
+
+
+class BatchItemFailed(Exception):
+    """Raised in atomic mode when one item cannot be booked."""
+
+    def __init__(self, index, error):
+        super().__init__(f"Item {index} could not be booked: {error}")
+        self.index = index
+        self.error = error
+
+
+def describe_item_error(error):
+    """Return the error_type/message fields reported for a failed item."""
+    if isinstance(error, InvalidSeats):
+        return {"error_type": "invalid_seats", "message": str(error)}
+    if isinstance(error, NotEnoughSeats):
+        return {"error_type": "not_enough_seats", "message": str(error)}
+    if isinstance(error, SeatsUnavailable):
+        return {
+            "error_type": "seats_taken",
+            "message": "Some selected seats are not available.",
+            "unavailable_seats": error.seat_numbers
+        }
+    return {
+        "error_type": "concurrent_booking",
+        "message": "The seats could not be booked right now. Please retry."
+    }
+
+
+def book_batch(user, items, mode='atomic'):
+    """
+    Book several (train, seats) items for one user.
+
+    Items are processed in train_id order whatever order they were sent in,
+    so two batches touching the same trains always lock them in the same
+    order and cannot deadlock each other.
+
+    In 'atomic' mode each train's items are planned against one read of its
+    availability and inserted together, and the whole batch commits or rolls
+    back as one transaction. Locks follow settings.SEAT_CLAIM_MODE like
+    single bookings (see inventory.lock_train_before_seats): with
+    'train_lock' every train is locked up front; with 'conditional' seats
+    are claimed first and the batch is planned again if another booking took
+    some of them. In 'per_item' mode each item is booked in its own
+    transaction and failures are reported per item.
+
+    Args:
+        user (User): The passenger
+        items (list): Dicts with 'train' and either 'seat_numbers' or
+            'seat_count' (plus optional 'together' and 'preference')
+        mode (str): 'atomic' or 'per_item'
+
+    Returns:
+        list: One entry per item, in request order: the Booking, or in
+            'per_item' mode the exception that failed it
+
+    Raises:
+        BatchItemFailed: In 'atomic' mode, for the first item that failed
+    """
+    order = sorted(range(len(items)), key=lambda i: (items[i]['train'].pk, i))
+    for train in {item['train'].pk: item['train'] for item in items}.values():
+        release_expired_holds(train)
+
+    if mode == 'per_item':
+        results = [None] * len(items)
+        for i in order:
+            try:
+                results[i] = _book_item(user, items[i])
+            except ITEM_ERRORS as e:
+                results[i] = e
+        return results
+
+    for attempt in range(ALLOCATION_ATTEMPTS):
+        try:
+            return retry_on_conflict(lambda: _book_atomic(user, items, order))
+        except SeatsUnavailable:
+            # Only without train locks: seats planned as free were taken meanwhile
+            if attempt == ALLOCATION_ATTEMPTS - 1:
+                raise
+
+
+def _book_item(user, item):
+    if item.get('seat_numbers'):
+        return book_seats(user, item['train'], item['seat_numbers'])
+    return book_best_seats(
+        user,
+        item['train'],
+        item['seat_count'],
+        together=item.get('together', False),
+        preference=item.get('preference')
+    )
+
+
+def _book_atomic(user, items, order):
+    with transaction.atomic():
+        trains = {item['train'].pk: item['train'] for item in items}
+        if settings.SEAT_CLAIM_MODE == 'train_lock':
+            # Same order as single bookings in this mode: trains first, in train_id order
+            trains = {
+                train.pk: train
+                for train in Train.objects.select_for_update().filter(pk__in=list(trains)).order_by('pk')
+            }
+
+        plans = defaultdict(list)  # train_id -> [(item index, seat numbers)]
+        available = {}
+        for i in order:
+            item = items[i]
+            train = trains[item['train'].pk]
+            if train.pk not in available:
+                available[train.pk] = SeatAllocator(available_seat_numbers(train))
+            try:
+                seat_numbers = plan_seats(
+                    train,
+                    available[train.pk],
+                    seat_numbers=item.get('seat_numbers'),
+                    seat_count=item.get('seat_count'),
+                    together=item.get('together', False),
+                    preference=item.get('preference')
+                )
+            except (InvalidSeats, SeatsUnavailable, NotEnoughSeats) as e:
+                raise BatchItemFailed(i, e)
+            plans[train.pk].append((i, seat_numbers))
+
+        results = [None] * len(items)
+        for train_id in sorted(plans):
+            train_plans = plans[train_id]
+            bookings = book_seats_batch(
+                trains[train_id],
+                [(user.pk, seat_numbers) for _, seat_numbers in train_plans]
+            )
+            for (i, _), booking in zip(train_plans, bookings):
+                results[i] = booking
+    return results
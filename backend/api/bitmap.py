@@ -0,0 +1,77 @@
+STATUSES = ('AVAILABLE', 'BOOKED', 'LOCKED')
+STATUS_CODES = {seat_status: code for code, seat_status in enumerate(STATUSES)}
+
+BITS_PER_SEAT = 2
+SEATS_PER_BYTE = 8 // BITS_PER_SEAT
+SEAT_MASK = (1 << BITS_PER_SEAT) - 1
+
+# For each status code, a translation table mapping a packed byte to the
+# number of seats in it holding that code. Counting a status is then one
+# bytes.translate() plus sum(), both running in C.
+_BYTE_COUNTS = [
+    bytes(
+        sum(1 for slot in range(SEATS_PER_BYTE) if (value >> (slot * BITS_PER_SEAT)) & SEAT_MASK == code)
+        for value in range(256)
+    )
+    for code in range(len(STATUSES))
+]
+
+
+class SeatBitmap:
+    """
+    Packed seat inventory for one train, two bits per seat.
+
+    Seat 1 lives in the lowest bits of the first byte. Padding slots in the
+    last byte are zero, i.e. AVAILABLE, and are excluded from counts.
+    """
+
+    def __init__(self, total_seats, data=None):
+        self.total_seats = total_seats
+        size = (total_seats + SEATS_PER_BYTE - 1) // SEATS_PER_BYTE
+        if data is None:
+            self.data = bytearray(size)
+        else:
+            self.data = bytearray(data)
+            if len(self.data) != size:
+                raise ValueError(
+                    f"Seat bitmap holds {len(self.data) * SEATS_PER_BYTE} slots, expected {total_seats} seats"
+                )
+
+    def _locate(self, seat_number):
+        if not 1 <= seat_number <= self.total_seats:
+            raise IndexError(f"Seat {seat_number} does not exist")
+        index = seat_number - 1
+        return index // SEATS_PER_BYTE, (index % SEATS_PER_BYTE) * BITS_PER_SEAT
+
+    def get(self, seat_number):
+        position, shift = self._locate(seat_number)
+        return STATUSES[(self.data[position] >> shift) & SEAT_MASK]
+
+    def set(self, seat_number, seat_status):
+        position, shift = self._locate(seat_number)
+        self.data[position] = (
+            self.data[position] & ~(SEAT_MASK << shift)
+        ) | (STATUS_CODES[seat_status] << shift)
+
+    def count(self, seat_status):
+        code = STATUS_CODES[seat_status]
+        total = sum(self.data.translate(_BYTE_COUNTS[code]))
+        if code == STATUS_CODES['AVAILABLE']:
+            total -= len(self.data) * SEATS_PER_BYTE - self.total_seats
+        return total
+
+    def seats_with_status(self, seat_status):
+        return [seat_number for seat_number, current in self if current == seat_status]
+
+    def __iter__(self):
+        seat_number = 1
+        for value in self.data:
+            for _ in range(SEATS_PER_BYTE):
+                if seat_number > self.total_seats:
+                    return
+                yield seat_number, STATUSES[value & SEAT_MASK]
+                value >>= BITS_PER_SEAT
+                seat_number += 1
+
+    def to_bytes(self):
+        return bytes(self.data)
@@ -0,0 +1,192 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .holds import release_expired_holds
+from .inventory import (
+    InvalidSeats,
+    SeatsUnavailable,
+    normalize_seat_numbers,
+    reserve_seats,
+    reserve_seats_for_bookings,
+)
+from .models import Booking, Train
+from .retry import retry_on_conflict
+from .seat_index import allocate_seats, forget_seat_index
+
+# Times an automatic allocation is re-planned after losing seats to another booking
+ALLOCATION_ATTEMPTS = 3
+
+
+def book_seats(user, train, seat_numbers, request_id=None):
+    """
+    Book specific seats on a train for a user in one transaction.
+
+    Lock conflicts (NOWAIT failures, deadlocks, lost bitmap swaps) are
+    retried in-process under settings.BOOKING_RETRY before giving up.
+
+    Args:
+        user (User): The passenger
+        train (Train): The train to book on
+        seat_numbers (list): Seat numbers to book
+        request_id (UUID, optional): Stored on the booking for later lookup
+
+    Returns:
+        Booking: The confirmed booking
+
+    Raises:
+        InvalidSeats: If any seat does not exist
+        SeatsUnavailable: If any seat is already booked or locked
+        OperationalError: If the train stayed locked by other bookings
+        ConcurrentUpdate: If the seat bitmap kept changing
+    """
+    seat_numbers = normalize_seat_numbers(seat_numbers)
+    # Seats whose hold lapsed are fair game even before the sweep runs
+    release_expired_holds(train)
+    return retry_on_conflict(lambda: _book_seats(user, train, seat_numbers, request_id))
+
+
+def _book_seats(user, train, seat_numbers, request_id):
+    with transaction.atomic():
+        if settings.SEAT_CLAIM_MODE == 'train_lock':
+            # Lock the train so bookings on it run one at a time
+            train = Train.objects.select_for_update(nowait=True).get(pk=train.pk)
+
+        booking = Booking.objects.create(
+            user=user,
+            train=train,
+            seat_count=len(seat_numbers),
+            seat_numbers=seat_numbers,
+            status='CONFIRMED',
+            booked=True,
+            request_timestamp=timezone.now(),
+            request_id=request_id
+        )
+
+        # Claim the seats; an invalid or taken seat rolls the booking back
+        reserve_seats(train, seat_numbers, booking)
+
+    return booking
+
+
+def book_best_seats(user, train, seat_count, together=False, preference=None, request_id=None):
+    """
+    Let the server choose seats for a booking and book them.
+
+    Seats are picked from the train's cached free-block index (see
+    seat_index.allocate_seats), which is brought up to date from the seat
+    change log rather than rebuilt from every available seat. If another
+    booking takes some of them first, the index is dropped and the
+    allocation is planned again from a fresh read, up to ALLOCATION_ATTEMPTS
+    times.
+
+    Args:
+        user (User): The passenger
+        train (Train): The train to book on
+        seat_count (int): Number of seats wanted
+        together (bool): Keep the group in as few rows as possible
+        preference (str, optional): 'window' or 'aisle'
+        request_id (UUID, optional): Stored on the booking for later lookup
+
+    Returns:
+        Booking: The confirmed booking
+
+    Raises:
+        NotEnoughSeats: If the train cannot fit the group
+        SeatsUnavailable: If every attempt lost seats to other bookings
+    """
+    for attempt in range(ALLOCATION_ATTEMPTS):
+        seat_numbers = allocate_seats(train, seat_count, together=together, preference=preference)
+        try:
+            return book_seats(user, train, seat_numbers, request_id=request_id)
+        except SeatsUnavailable:
+            forget_seat_index(train)
+            if attempt == ALLOCATION_ATTEMPTS - 1:
+                raise
+        except Exception:
+            # The picked seats were taken out of the index but stay free
+            forget_seat_index(train)
+            raise
+
+
+def book_seats_batch(train, plans, request_ids=None):
+    """
+    Book several seat sets on one train in a single transaction.
+
+    Used to group-commit bookings that were already planned against a known
+    view of the train's seats: all bookings are inserted with one statement,
+    their seats are claimed with one update (see reserve_seats_for_bookings)
+    and the batch commits once. If any seat was taken in the meantime the
+    whole batch rolls back and the caller falls back to booking one by one.
+
+    Args:
+        train (Train): The train to book on
+        plans (list): (user_id, seat_numbers) pairs
+        request_ids (list, optional): A request_id to store on each booking,
+            in plan order
+
+    Returns:
+        list: The confirmed bookings, in plan order
+
+    Raises:
+        InvalidSeats: If any seat does not exist
+        SeatsUnavailable: If any seat is no longer available
+        ConcurrentUpdate: If the seat bitmap kept changing
+    """
+    now = timezone.now()
+    request_ids = request_ids or [None] * len(plans)
+    with transaction.atomic():
+        bookings = Booking.objects.bulk_create([
+            Booking(
+                user_id=user_id,
+                train=train,
+                seat_count=len(seat_numbers),
+                seat_numbers=seat_numbers,
+                total_price=Booking.price_for(len(seat_numbers)),  # bulk_create skips Booking.save()
+                status='CONFIRMED',
+                booked=True,
+                request_timestamp=now,
+                request_id=request_id
+            )
+            for (user_id, seat_numbers), request_id in zip(plans, request_ids)
+        ])
+        reserve_seats_for_bookings(train, {
+            booking.pk: seat_numbers for booking, (_, seat_numbers) in zip(bookings, plans)
+        })
+    return bookings
+
+
+def plan_seats(train, available, seat_numbers=None, seat_count=None, together=False, preference=None):
+    """
+    Decide which seats a request gets, given an index of seats known to be free.
+
+    Nothing is written to the database; used by the batching writers, which
+    plan a whole batch against one SeatAllocator. The planned seats are
+    taken out of ``available``, so later plans in the batch cannot reuse them.
+
+    Args:
+        train (Train): The train
+        available (SeatAllocator): Index of the available seats
+        seat_numbers (list, optional): Specific seats wanted
+        seat_count (int, optional): Number of seats to pick instead
+        together (bool): Keep a picked group in as few rows as possible
+        preference (str, optional): 'window' or 'aisle' for picked seats
+
+    Returns:
+        list: The seat numbers to book
+
+    Raises:
+        InvalidSeats: If any requested seat does not exist
+        SeatsUnavailable: If any requested seat is not in ``available``
+        NotEnoughSeats: If ``seat_count`` seats cannot be found
+    """
+    if seat_numbers:
+        seat_numbers = normalize_seat_numbers(seat_numbers)
+        if any(not 1 <= n <= train.total_seats for n in seat_numbers):
+            raise InvalidSeats("One or more selected seats do not exist.")
+        taken = [n for n in seat_numbers if not available.is_free(n)]
+        if taken:
+            raise SeatsUnavailable(taken)
+        available.take(seat_numbers)
+        return seat_numbers
+    return available.allocate(seat_count, together=together, preference=preference)
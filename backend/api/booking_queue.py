@@ -0,0 +1,190 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .allocation import NotEnoughSeats
+from .booking import book_best_seats, book_seats
+from .inventory import ConcurrentUpdate, InvalidSeats, SeatsUnavailable, normalize_seat_numbers
+from .models import BookingIntent
+from .retry import retry_on_conflict
+
+
+class QueueFull(Exception):
+    """Raised when a train's booking queue is not admitting more intents."""
+
+
+class IntentLost(Exception):
+    """Raised when another worker re-queued an intent while it was being booked."""
+
+
+def enqueue_booking(user, train, seat_numbers=None, seat_count=None, preferences=None):
+    """
+    Admit a booking request to the train's queue without touching its seats.
+
+    Args:
+        user (User): The passenger
+        train (Train): The train to book on
+        seat_numbers (list, optional): Specific seats wanted
+        seat_count (int, optional): Number of seats for the server to pick
+        preferences (dict, optional): 'together' and 'position' for seat_count requests
+
+    Returns:
+        BookingIntent: The queued intent, whose ticket identifies it
+
+    Raises:
+        InvalidSeats: If seat_numbers are malformed
+        QueueFull: If the train already has BOOKING_QUEUE_MAX_PER_TRAIN queued intents
+    """
+    if seat_numbers:
+        seat_numbers = normalize_seat_numbers(seat_numbers)
+        seat_count = len(seat_numbers)
+
+    limit = settings.BOOKING_QUEUE_MAX_PER_TRAIN
+    if limit and BookingIntent.objects.filter(train=train, status='QUEUED').count() >= limit:
+        raise QueueFull(f"The booking queue for train {train.train_id} is full")
+
+    return BookingIntent.objects.create(
+        user=user,
+        train=train,
+        seat_numbers=seat_numbers or [],
+        seat_count=seat_count,
+        preferences=preferences or {}
+    )
+
+
+def queue_position(intent):
+    """Return the intent's 1-based place among the train's queued intents."""
+    return BookingIntent.objects.filter(
+        train_id=intent.train_id,
+        status='QUEUED',
+        id__lt=intent.id
+    ).count() + 1
+
+
+def trains_with_queued_intents():
+    """Return the ids of trains with intents waiting, oldest queue first."""
+    return list(
+        BookingIntent.objects.filter(
+            status='QUEUED'
+        ).values('train_id').annotate(
+            oldest=Min('id')
+        ).order_by('oldest').values_list('train_id', flat=True)
+    )
+
+
+def requeue_stale_intents():
+    """
+    Put intents whose worker has held them past BOOKING_QUEUE_LEASE back in the queue.
+
+    Returns:
+        int: Number of intents re-queued
+    """
+    return BookingIntent.objects.filter(
+        status='PROCESSING',
+        claimed_at__lte=timezone.now() - timedelta(seconds=settings.BOOKING_QUEUE_LEASE)
+    ).update(status='QUEUED', claimed_at=None)
+
+
+def claim_intents(train_id, batch_size):
+    """
+    Take the oldest queued intents of a train for processing.
+
+    Intents locked by another worker are skipped, so several drain processes
+    can share a queue without handing out the same intent twice.
+
+    Returns:
+        list: Claimed BookingIntents, oldest first
+    """
+    with transaction.atomic():
+        intent_ids = list(
+            BookingIntent.objects.select_for_update(skip_locked=True).filter(
+                train_id=train_id,
+                status='QUEUED'
+            ).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not intent_ids:
+            return []
+        BookingIntent.objects.filter(id__in=intent_ids).update(
+            status='PROCESSING',
+            claimed_at=timezone.now()
+        )
+    return list(
+        BookingIntent.objects.filter(id__in=intent_ids).select_related('user', 'train').order_by('id')
+    )
+
+
+def _finish(intent, status, **fields):
+    # Only the worker still holding the claim may record the outcome
+    return BookingIntent.objects.filter(
+        pk=intent.pk,
+        status='PROCESSING',
+        claimed_at=intent.claimed_at
+    ).update(status=status, processed_at=timezone.now(), **fields)
+
+
+def _book_intent(intent):
+    with transaction.atomic():
+        if intent.seat_numbers:
+            booking = book_seats(intent.user, intent.train, intent.seat_numbers)
+        else:
+            booking = book_best_seats(
+                intent.user,
+                intent.train,
+                intent.seat_count,
+                together=bool(intent.preferences.get('together')),
+                preference=intent.preferences.get('position')
+            )
+        if not _finish(intent, 'CONFIRMED', booking=booking):
+            raise IntentLost(intent.ticket)
+
+
+def process_intent(intent):
+    """
+    Book a claimed intent and record the outcome on it.
+
+    The booking and the CONFIRMED status commit together; if the claim was
+    lost to a re-queue in the meantime the booking is rolled back. Lock
+    conflicts retry that whole transaction, so the backoff between attempts
+    is spent outside it rather than with the intent's update pending.
+
+    Returns:
+        str: The intent's final status, or None if the claim was lost
+    """
+    try:
+        retry_on_conflict(lambda: _book_intent(intent))
+        return 'CONFIRMED'
+    except IntentLost:
+        return None
+    except NotEnoughSeats as e:
+        error_type, message = 'not_enough_seats', str(e)
+    except InvalidSeats as e:
+        error_type, message = 'invalid_seats', str(e)
+    except SeatsUnavailable as e:
+        error_type, message = 'seats_taken', str(e)
+    except (DatabaseError, ConcurrentUpdate):
+        error_type, message = 'concurrent_booking', "The seats could not be booked right now. Please retry."
+
+    if not _finish(intent, 'FAILED', error_type=error_type, message=message[:255]):
+        return None
+    return 'FAILED'
+
+
+def drain_train(train_id, batch_size=100):
+    """
+    Process a train's queued intents in order until its queue is empty.
+
+    Returns:
+        dict: Number of intents per final status
+    """
+    results = {'CONFIRMED': 0, 'FAILED': 0}
+    while True:
+        intents = claim_intents(train_id, batch_size)
+        if not intents:
+            return results
+        for intent in intents:
+            outcome = process_intent(intent)
+            if outcome:
+                results[outcome] += 1
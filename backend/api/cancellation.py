@@ -0,0 +1,91 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .inventory import lock_train_before_seats, move_seat_counters, release_seats, uses_bitmap
+from .models import Booking, Seat, Train
+from .retry import retry_on_conflict
+from .waitlist import schedule_promotion
+
+# Booking statuses that can still be cancelled
+CANCELLABLE_STATUSES = ('PENDING', 'CONFIRMED')
+
+
+class BookingNotCancellable(Exception):
+    """Raised when none of the requested bookings can be cancelled."""
+
+
+def cancel_bookings(bookings):
+    """
+    Cancel bookings and give their seats back to their trains.
+
+    All bookings are flipped to CANCELLED with one UPDATE, and each train's
+    seats are released with one set-based UPDATE that also moves the seat
+    counters, all in one transaction. The query count therefore depends on
+    the number of trains involved, not on the number of bookings or seats.
+    Bookings that are already cancelled or failed are skipped. Freed seats
+    go to the trains' waitlists once the transaction commits.
+
+    Args:
+        bookings (QuerySet): Bookings to cancel, already filtered to what the
+            caller may cancel
+
+    Returns:
+        list: Primary keys of the bookings that were cancelled
+
+    Raises:
+        BookingNotCancellable: If no booking in ``bookings`` can be cancelled
+    """
+    def cancel():
+        with transaction.atomic():
+            rows = list(
+                bookings.select_for_update().filter(
+                    status__in=CANCELLABLE_STATUSES
+                ).order_by('pk').values_list('pk', 'train_id', 'seat_numbers')
+            )
+            if not rows:
+                raise BookingNotCancellable("No cancellable bookings found")
+
+            booking_ids = [pk for pk, _, _ in rows]
+            Booking.objects.filter(pk__in=booking_ids).update(
+                status='CANCELLED',
+                booked=False,
+                version=F('version') + 1,
+                updated_at=timezone.now()
+            )
+
+            by_train = defaultdict(lambda: ([], []))
+            for pk, train_id, seat_numbers in rows:
+                if train_id is None:
+                    continue
+                ids, seats = by_train[train_id]
+                ids.append(pk)
+                seats.extend(seat_numbers or [])
+
+            trains = Train.objects.filter(pk__in=list(by_train)).only(
+                'pk', 'total_seats', 'seat_bitmap'
+            ).order_by('pk')
+            for train in trains:
+                ids, seats = by_train[train.pk]
+                if _release_booked_seats(train, ids, seats):
+                    schedule_promotion(train)
+            return booking_ids
+
+    return retry_on_conflict(cancel)
+
+
+def _release_booked_seats(train, booking_ids, seat_numbers):
+    if uses_bitmap(train):
+        # The bitmap does not record owners; a booked seat belongs to one booking
+        return release_seats(train, seat_numbers, 'BOOKED')
+
+    lock_train_before_seats(train)
+    released = Seat.objects.filter(
+        train=train,
+        booking_id__in=booking_ids,
+        status='BOOKED'
+    ).update(status='AVAILABLE', booking=None, locked_by=None, lock_expires_at=None)
+    move_seat_counters(train.pk, 'BOOKED', 'AVAILABLE', released, seat_numbers)
+    return released
@@ -0,0 +1,42 @@
+from django.utils.cache import get_conditional_response
+
+
+def inventory_etag(train, user=None, lapsed=(), since=None):
+    """
+    Return the ETag of a train's seat views at its current inventory version.
+
+    Views that mark the user's own seats pass the user, so two users never
+    share a tag for different bodies. Views that show lapsed holds as
+    available pass them too: within one version holds only ever lapse, so
+    their count tells the bodies apart. Deltas pass the version they start
+    from, since each one is a different body at the same inventory version.
+    """
+    tag = f"{train.pk}-{train.inventory_version}"
+    if lapsed:
+        tag += f"-l{len(lapsed)}"
+    if since is not None:
+        tag += f"-s{since}"
+    if user is not None:
+        tag += f"-u{user.pk}"
+    return f'"{tag}"'
+
+
+def tag_response(response, etag, private=False):
+    """Attach the ETag, and make clients revalidate before reusing the body."""
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response
+
+
+def not_modified(request, etag, private=False):
+    """
+    Return a 304 response if the request's If-None-Match already has ``etag``.
+
+    Returns:
+        HttpResponse: The 304 (or 412 for a failed If-Match), or None when
+            the full response should be built
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        tag_response(response, etag, private)
+    return response
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .allocation import NotEnoughSeats, SeatAllocator
+from .booking import book_best_seats, book_seats, book_seats_batch, plan_seats
+from .holds import release_expired_holds
+from .inventory import ConcurrentUpdate, InvalidSeats, SeatsUnavailable, available_seat_numbers
+from .models import Train
+from .retry import retry_on_conflict
+
+
+class _PendingBooking:
+    """One request waiting in a train's group-commit batch."""
+
+    def __init__(self, user, seat_numbers, seat_count, together, preference):
+        self.user = user
+        self.seat_numbers = seat_numbers
+        self.seat_count = seat_count
+        self.together = together
+        self.preference = preference
+        self.booking = None
+        self.error = None
+        self.done = threading.Event()
+        self.started = False  # its batch transaction has begun
+        self.abandoned = False  # its caller stopped waiting before that
+
+
+_lock = threading.Lock()
+_pending = {}  # train_id -> list of _PendingBooking not yet taken by a leader
+
+
+def book_coalesced(user, train, seat_numbers=None, seat_count=None, together=False, preference=None):
+    """
+    Book seats, committing together with other bookings for the same train.
+
+    The first request for a train becomes the batch leader: it waits
+    settings.GROUP_COMMIT_WINDOW seconds for more requests on that train in
+    this process, then books them all in one transaction with one train
+    lock, one multi-row Booking insert and one seat update, and hands each
+    waiting request its own booking or error. Requests that cannot be served
+    fail on their own without affecting the rest of the batch.
+
+    Coalescing happens between threads of one process, so it pays off under
+    threaded servers; with one request per process it only adds the window.
+
+    A follower whose batch has not started within
+    settings.GROUP_COMMIT_WAIT_TIMEOUT withdraws from it and fails with
+    ConcurrentUpdate, which is safe to retry as nothing was booked. Once its
+    batch transaction has begun it waits for that transaction to end.
+
+    Args:
+        user (User): The passenger
+        train (Train): The train to book on
+        seat_numbers (list, optional): Specific seats wanted
+        seat_count (int, optional): Number of seats to pick instead
+        together (bool): Keep a picked group in as few rows as possible
+        preference (str, optional): 'window' or 'aisle' for picked seats
+
+    Returns:
+        Booking: The confirmed booking
+
+    Raises:
+        The same exceptions as book_seats and book_best_seats
+        ConcurrentUpdate: If the batch did not start in time
+    """
+    request = _PendingBooking(user, seat_numbers, seat_count, together, preference)
+    with _lock:
+        queue = _pending.setdefault(train.pk, [])
+        queue.append(request)
+        leader = len(queue) == 1
+
+    if leader:
+        try:
+            time.sleep(settings.GROUP_COMMIT_WINDOW)
+        finally:
+            # Always hand the train back, so a new request can lead a batch
+            with _lock:
+                batch = _pending.pop(train.pk)
+        max_batch = settings.GROUP_COMMIT_MAX_BATCH
+        try:
+            for start in range(0, len(batch), max_batch):
+                chunk = _start(batch[start:start + max_batch])
+                if chunk:
+                    _commit_batch(train.pk, chunk)
+        finally:
+            for waiting in batch:
+                if not waiting.done.is_set():
+                    waiting.error = ConcurrentUpdate("The booking batch was not run. Please retry.")
+                    waiting.done.set()
+    elif not request.done.wait(settings.GROUP_COMMIT_WAIT_TIMEOUT):
+        with _lock:
+            if not request.started:
+                request.abandoned = True
+        if request.abandoned:
+            raise ConcurrentUpdate("Timed out waiting for the booking batch. Please retry.")
+        request.done.wait()
+
+    if request.error is not None:
+        raise request.error
+    return request.booking
+
+
+def _start(requests):
+    """Mark requests as started, leaving out those whose callers gave up."""
+    with _lock:
+        started = [request for request in requests if not request.abandoned]
+        for request in started:
+            request.started = True
+    return started
+
+
+def _commit_batch(train_id, batch):
+    try:
+        train = Train.objects.get(pk=train_id)
+        release_expired_holds(train)
+        try:
+            retry_on_conflict(lambda: _book_batch(train, batch))
+        except (InvalidSeats, SeatsUnavailable, NotEnoughSeats, DatabaseError, ConcurrentUpdate):
+            # Seats moved under the plan (holds, cancellations); book one by one
+            for request in batch:
+                if request.booking is None and request.error is None:
+                    _book_one(train, request)
+    except Exception as e:
+        for request in batch:
+            if request.booking is None and request.error is None:
+                request.error = e
+    finally:
+        for request in batch:
+            request.done.set()
+
+
+def _book_batch(train, batch):
+    with transaction.atomic():
+        if settings.SEAT_CLAIM_MODE == 'train_lock':
+            train = Train.objects.select_for_update(nowait=True).get(pk=train.pk)
+
+        available = SeatAllocator(available_seat_numbers(train))
+        planned = []
+        errors = {}
+        for request in batch:
+            try:
+                seat_numbers = plan_seats(
+                    train,
+                    available,
+                    seat_numbers=request.seat_numbers,
+                    seat_count=request.seat_count,
+                    together=request.together,
+                    preference=request.preference
+                )
+            except (InvalidSeats, SeatsUnavailable, NotEnoughSeats) as e:
+                errors[request] = e
+                continue
+            planned.append((request, seat_numbers))
+
+        bookings = book_seats_batch(
+            train,
+            [(request.user.pk, seat_numbers) for request, seat_numbers in planned]
+        ) if planned else []
+
+    # Only publish results once the batch has committed
+    for (request, _), booking in zip(planned, bookings):
+        booking.user = request.user
+        request.booking = booking
+    for request, error in errors.items():
+        request.error = error
+
+
+def _book_one(train, request):
+    try:
+        if request.seat_numbers:
+            request.booking = book_seats(request.user, train, request.seat_numbers)
+        else:
+            request.booking = book_best_seats(
+                request.user,
+                train,
+                request.seat_count,
+                together=request.together,
+                preference=request.preference
+            )
+    except Exception as e:
+        request.error = e
@@ -0,0 +1,318 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .inventory import (
+    SeatsUnavailable,
+    claim_seats,
+    lock_train_before_seats,
+    normalize_seat_numbers,
+    release_seats,
+    uses_bitmap,
+)
+from .models import Booking, Seat, SeatLock, Train
+from .retry import retry_on_conflict
+from .waitlist import schedule_promotion
+
+
+class NoActiveHold(Exception):
+    """Raised when a user has no unexpired hold to confirm or release."""
+
+
+def _lock_held_seats(train, seat_numbers, skip_locked=False):
+    """
+    Lock seats of a train before touching their SeatLocks.
+
+    hold_seats claims the seats and then inserts their SeatLocks, so the
+    paths that start from SeatLocks take the same order: the train as in
+    lock_train_before_seats (a bitmap-backed train's row always, as it holds
+    the seats), then the Seat rows, and only then the SeatLocks.
+
+    Returns:
+        list: The seat numbers locked; with ``skip_locked``, seats locked by
+            another transaction are left out
+    """
+    if uses_bitmap(train):
+        locked = Train.objects.select_for_update(skip_locked=skip_locked).filter(pk=train.pk)
+        return list(seat_numbers) if list(locked.values_list('pk', flat=True)) else []
+    lock_train_before_seats(train)
+    return list(
+        Seat.objects.select_for_update(skip_locked=skip_locked).filter(
+            train=train,
+            seat_number__in=seat_numbers
+        ).order_by('seat_number').values_list('seat_number', flat=True)
+    )
+
+
+def release_expired_holds(train, limit=None):
+    """
+    Release a train's lapsed holds.
+
+    Called lazily before seats are claimed, so an expired hold never blocks a
+    booking even if the background sweep has not run yet. Costs one indexed
+    read when nothing has expired. Reads use lapsed_hold_seats instead.
+
+    Args:
+        train (Train): The train to sweep
+        limit (int, optional): Release at most this many seats
+
+    Returns:
+        int: Number of seats released
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        expired = list(
+            SeatLock.objects.filter(
+                train=train,
+                expires_at__lte=now
+            ).order_by('expires_at').values_list('seat_number', flat=True)[:limit]
+        )
+        if not expired:
+            return 0
+        seat_numbers = _lock_held_seats(train, expired, skip_locked=True)
+        expired = list(
+            SeatLock.objects.select_for_update(skip_locked=True).filter(
+                train=train,
+                seat_number__in=seat_numbers,
+                expires_at__lte=now
+            ).values_list('id', 'seat_number')
+        )
+        if not expired:
+            return 0
+        SeatLock.objects.filter(id__in=[lock_id for lock_id, _ in expired]).delete()
+        released = release_seats(train, [seat_number for _, seat_number in expired], 'LOCKED')
+        if released:
+            schedule_promotion(train)
+        return released
+
+
+def lapsed_hold_seats(train):
+    """
+    Return the seats of a train's holds that expired but are not released yet.
+
+    Read-only views report these seats as available instead of calling
+    release_expired_holds, which would open a write transaction on the
+    primary for every poll. The seats are released for real by the reaper,
+    or by the next booking or hold on the train.
+
+    Returns:
+        set: Seat numbers, still LOCKED in the inventory
+    """
+    return set(
+        SeatLock.objects.filter(
+            train=train,
+            expires_at__lte=timezone.now()
+        ).values_list('seat_number', flat=True)
+    )
+
+
+def reap_expired_holds(batch_size=500):
+    """
+    Release one batch of lapsed holds across all trains, oldest first.
+
+    Expired SeatLocks are picked through the expires_at index, deleted and
+    their seats released in one transaction, so a pass never holds more than
+    ``batch_size`` locks at once. Each train's seats are locked before its
+    SeatLocks, as in _lock_held_seats, and rows already claimed by a
+    concurrent reaper or confirmation are skipped rather than waited on. Seat rows left LOCKED
+    past their expiry with no SeatLock behind them are released too. Trains
+    that got seats back have their waitlists promoted after the commit.
+
+    Args:
+        batch_size (int): Maximum number of locks (and orphaned seats) per batch
+
+    Returns:
+        tuple: (locks deleted, seats released)
+    """
+    now = timezone.now()
+    deleted = released = 0
+    with transaction.atomic():
+        seats_by_train = defaultdict(list)
+        for train_id, seat_number in SeatLock.objects.filter(
+            expires_at__lte=now
+        ).order_by('expires_at').values_list('train_id', 'seat_number')[:batch_size]:
+            seats_by_train[train_id].append(seat_number)
+        for train in Train.objects.filter(pk__in=list(seats_by_train)).order_by('pk'):
+            seat_numbers = _lock_held_seats(train, seats_by_train[train.pk], skip_locked=True)
+            expired = list(
+                SeatLock.objects.select_for_update(skip_locked=True).filter(
+                    train=train,
+                    seat_number__in=seat_numbers,
+                    expires_at__lte=now
+                ).values_list('id', 'seat_number')
+            )
+            if not expired:
+                continue
+            SeatLock.objects.filter(id__in=[lock_id for lock_id, _ in expired]).delete()
+            deleted += len(expired)
+            train_released = release_seats(train, [seat_number for _, seat_number in expired], 'LOCKED')
+            if train_released:
+                schedule_promotion(train)
+            released += train_released
+
+        orphaned = Seat.objects.filter(
+            status='LOCKED',
+            lock_expires_at__lte=now
+        ).exclude(
+            Exists(SeatLock.objects.filter(train=OuterRef('train'), seat_number=OuterRef('seat_number')))
+        )
+        seats_by_train = defaultdict(list)
+        for train_id, seat_number in orphaned.values_list('train_id', 'seat_number')[:batch_size]:
+            seats_by_train[train_id].append(seat_number)
+        for train in Train.objects.filter(pk__in=list(seats_by_train)).order_by('pk'):
+            # Lock the seats only now, in the same order as every other seat change
+            lock_train_before_seats(train)
+            seat_numbers = list(
+                orphaned.select_for_update(skip_locked=True).filter(
+                    train=train,
+                    seat_number__in=seats_by_train[train.pk]
+                ).values_list('seat_number', flat=True)
+            )
+            train_released = release_seats(train, seat_numbers, 'LOCKED')
+            if train_released:
+                schedule_promotion(train)
+            released += train_released
+
+    return deleted, released
+
+
+def active_holds(user, train):
+    """Return the user's unexpired SeatLocks on a train, by seat number."""
+    return SeatLock.objects.filter(
+        train=train,
+        user=user,
+        expires_at__gt=timezone.now()
+    ).order_by('seat_number')
+
+
+def _lock_active_holds(user, train, seat_numbers=None):
+    """Lock the user's held seats and then their SeatLocks; return the seat numbers."""
+    locks = active_holds(user, train)
+    if seat_numbers is not None:
+        locks = locks.filter(seat_number__in=seat_numbers)
+    held = list(locks.values_list('seat_number', flat=True))
+    if not held:
+        return []
+    _lock_held_seats(train, held)
+    # Re-read under the locks: the hold may have lapsed or been reaped meanwhile
+    return list(locks.filter(seat_number__in=held).select_for_update().values_list('seat_number', flat=True))
+
+
+def hold_seats(user, train, seat_numbers):
+    """
+    Hold available seats for a user while they pay.
+
+    The seats are claimed with one conditional write and their SeatLocks
+    are inserted in one batch, both in the same transaction.
+
+    Args:
+        user (User): The passenger
+        train (Train): The train
+        seat_numbers (list): Seat numbers to hold
+
+    Returns:
+        datetime: When the hold expires
+
+    Raises:
+        InvalidSeats: If any seat does not exist
+        SeatsUnavailable: If any seat is booked or held
+    """
+    seat_numbers = normalize_seat_numbers(seat_numbers)
+    release_expired_holds(train)
+    expires_at = timezone.now() + timedelta(seconds=settings.SEAT_HOLD_SECONDS)
+
+    def hold():
+        with transaction.atomic():
+            claim_seats(
+                train, seat_numbers, 'AVAILABLE', 'LOCKED',
+                locked_by=user, lock_expires_at=expires_at
+            )
+            SeatLock.objects.bulk_create([
+                SeatLock(train=train, seat_number=seat_number, user=user, expires_at=expires_at)
+                for seat_number in seat_numbers
+            ])
+
+    try:
+        retry_on_conflict(hold)
+    except IntegrityError:
+        # A lapsed lock on one of the seats is still being released
+        raise SeatsUnavailable(seat_numbers)
+    return expires_at
+
+
+def confirm_hold(user, train, seat_numbers=None):
+    """
+    Turn a user's held seats into a confirmed booking.
+
+    Args:
+        user (User): The passenger
+        train (Train): The train
+        seat_numbers (list, optional): Held seats to confirm. Defaults to all of them
+
+    Returns:
+        Booking: The confirmed booking
+
+    Raises:
+        NoActiveHold: If the user holds no seats on the train
+        SeatsUnavailable: If some requested seats are not held or the hold lapsed
+    """
+    if seat_numbers is not None:
+        seat_numbers = normalize_seat_numbers(seat_numbers)
+
+    def confirm():
+        with transaction.atomic():
+            held = _lock_active_holds(user, train, seat_numbers)
+            if not held:
+                raise NoActiveHold("No active hold on this train")
+            if seat_numbers is not None and len(held) != len(seat_numbers):
+                raise SeatsUnavailable(sorted(set(seat_numbers) - set(held)))
+
+            booking = Booking.objects.create(
+                user=user,
+                train=train,
+                seat_count=len(held),
+                seat_numbers=held,
+                status='CONFIRMED',
+                booked=True,
+                request_timestamp=timezone.now()
+            )
+            claim_seats(train, held, 'LOCKED', 'BOOKED', booking=booking)
+            SeatLock.objects.filter(train=train, seat_number__in=held).delete()
+            return booking
+
+    return retry_on_conflict(confirm)
+
+
+def release_hold(user, train, seat_numbers=None):
+    """
+    Give up a user's held seats before the hold expires.
+
+    Args:
+        user (User): The passenger
+        train (Train): The train
+        seat_numbers (list, optional): Held seats to release. Defaults to all of them
+
+    Returns:
+        list: Seat numbers released
+
+    Raises:
+        NoActiveHold: If the user holds none of the seats
+    """
+    if seat_numbers is not None:
+        seat_numbers = normalize_seat_numbers(seat_numbers)
+
+    def release():
+        with transaction.atomic():
+            held = _lock_active_holds(user, train, seat_numbers)
+            if not held:
+                raise NoActiveHold("No active hold on this train")
+            SeatLock.objects.filter(train=train, seat_number__in=held).delete()
+            if release_seats(train, held, 'LOCKED'):
+                schedule_promotion(train)
+            return held
+
+    return retry_on_conflict(release)
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import random
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# Share of claimed keys that also evict a batch of expired ones
+PURGE_PROBABILITY = 0.01
+PURGE_BATCH_SIZE = 1000
+
+# Client errors that depend on the state of the system rather than on the
+# request: seats taken, a hold that lapsed, a retry racing the first attempt.
+# The same request may succeed later, so these are never replayed.
+TRANSIENT_STATUS_CODES = {
+    status.HTTP_408_REQUEST_TIMEOUT,
+    status.HTTP_409_CONFLICT,
+    status.HTTP_423_LOCKED,
+    status.HTTP_425_TOO_EARLY,
+    status.HTTP_429_TOO_MANY_REQUESTS,
+}
+
+
+def purge_expired_idempotency_keys(limit=PURGE_BATCH_SIZE):
+    """
+    Delete up to ``limit`` expired idempotency keys, oldest first.
+
+    Returns:
+        int: Number of keys deleted
+    """
+    expired_ids = list(
+        IdempotencyKey.objects.filter(
+            expires_at__lte=timezone.now()
+        ).order_by('expires_at').values_list('id', flat=True)[:limit]
+    )
+    if not expired_ids:
+        return 0
+    deleted, _ = IdempotencyKey.objects.filter(id__in=expired_ids).delete()
+    return deleted
+
+
+def _scope(request):
+    caller = getattr(request.user, 'pk', None) or 'anonymous'
+    return f"{request.method} {request.path} {caller}"[:255]
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _claim(scope, key, request_hash):
+    """Insert an in-progress record for the key, or return the existing one."""
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    scope=scope,
+                    key=key,
+                    request_hash=request_hash,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE)
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if record is None:
+                continue
+            if record.expires_at <= now:
+                # Stale response or abandoned request: evict it and claim again
+                IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+                continue
+            return record, False
+
+
+def idempotent(view_method):
+    """
+    Make a POST handler safe to retry with an Idempotency-Key header.
+
+    The first request with a key runs the handler and stores its response;
+    replays with the same key and body get the stored response back without
+    running the handler again. Reusing a key with a different body is a 422,
+    and a replay that arrives while the first request is still running is a
+    409. Only successful responses and validation failures are stored; server
+    errors and TRANSIENT_STATUS_CODES release the key so the client can retry.
+    Requests without the header are passed straight through.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({
+                "message": f"{IDEMPOTENCY_HEADER} must be at most 255 characters."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        request_hash = _request_hash(request)
+        record, claimed = _claim(_scope(request), key, request_hash)
+
+        if not claimed:
+            if record.request_hash != request_hash:
+                return Response({
+                    "message": f"{IDEMPOTENCY_HEADER} was already used for a different request."
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.status_code is None:
+                return Response({
+                    "message": f"A request with this {IDEMPOTENCY_HEADER} is still being processed."
+                }, status=status.HTTP_409_CONFLICT)
+            return Response(
+                record.response_body,
+                status=record.status_code,
+                headers={'Idempotent-Replayed': 'true'}
+            )
+
+        if random.random() < PURGE_PROBABILITY:
+            purge_expired_idempotency_keys()
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500 or response.status_code in TRANSIENT_STATUS_CODES:
+            record.delete()
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code,
+                response_body=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+                expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,109 @@
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import IdSequence
+
+TRAIN_ID_SEQUENCE = 'api_train_id_seq'
+
+_lock = threading.Lock()
+_block = deque()  # train_id numbers reserved by next_train_id, in increasing order
+
+
+def format_train_id(number):
+    """Return the train_id for a sequence number, e.g. 42 -> 'T0042'."""
+    return f'T{number:04d}'
+
+
+def parse_train_id(train_id):
+    """Return the sequence number of a generated train_id, or None."""
+    if train_id[:1] == 'T' and train_id[1:].isdigit():
+        return int(train_id[1:])
+    return None
+
+
+def allocate_numbers(count, sequence=TRAIN_ID_SEQUENCE):
+    """
+    Take ``count`` numbers from a sequence in one round trip.
+
+    On PostgreSQL this draws from a native sequence, which never blocks and
+    never hands the same number out twice, even across transactions that
+    later roll back. Elsewhere it bumps an IdSequence row, which holds a row
+    lock until the surrounding transaction ends.
+
+    Returns:
+        list: ``count`` distinct numbers in increasing order
+    """
+    if count <= 0:
+        return []
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                [sequence, count]
+            )
+            return sorted(number for number, in cursor.fetchall())
+
+    with transaction.atomic():
+        IdSequence.objects.get_or_create(name=sequence)
+        IdSequence.objects.filter(name=sequence).update(last_value=F('last_value') + count)
+        last = IdSequence.objects.get(name=sequence).last_value
+    return list(range(last - count + 1, last + 1))
+
+
+def advance_sequence(number, sequence=TRAIN_ID_SEQUENCE):
+    """
+    Make sure a sequence never hands out ``number`` or anything below it.
+
+    For numbers taken outside the sequence, such as train_ids given
+    explicitly in an import. A sequence already past ``number`` is left alone.
+    Numbers this process has reserved for next_train_id up to ``number`` are
+    dropped too, since the sequence handed them out before it was advanced.
+    """
+    if number < 1:
+        return
+    if sequence == TRAIN_ID_SEQUENCE:
+        with _lock:
+            while _block and _block[0] <= number:
+                _block.popleft()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT setval(%s, %s) FROM {connection.ops.quote_name(sequence)} "
+                "WHERE NOT is_called OR last_value < %s",
+                [sequence, number, number]
+            )
+        return
+
+    with transaction.atomic():
+        IdSequence.objects.get_or_create(name=sequence)
+        IdSequence.objects.filter(name=sequence, last_value__lt=number).update(last_value=number)
+
+
+def next_train_ids(count):
+    """Allocate ``count`` new train_ids at once, for bulk imports."""
+    return [format_train_id(number) for number in allocate_numbers(count)]
+
+
+def next_train_id():
+    """
+    Allocate one train_id.
+
+    With TRAIN_ID_BLOCK_SIZE above 1 the process reserves that many numbers
+    at a time and hands them out locally, so most trains are created without
+    touching the sequence. Numbers still unused when the process exits are
+    skipped for good, and trains created by different processes are not
+    numbered in creation order. An import in another process may give a
+    train one of the reserved numbers explicitly; Train.save draws another
+    number when the one it was handed is taken.
+    """
+    block_size = settings.TRAIN_ID_BLOCK_SIZE
+    if block_size <= 1:
+        return next_train_ids(1)[0]
+    with _lock:
+        if not _block:
+            _block.extend(allocate_numbers(block_size))
+        return format_train_id(_block.popleft())
@@ -0,0 +1,613 @@
+import io
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from .bitmap import SeatBitmap
+from .models import Seat, SeatChange, Train
+
+# Train counter field tracking each Seat status
+SEAT_COUNTER_FIELDS = {
+    'AVAILABLE': 'seats_available',
+    'BOOKED': 'seats_booked',
+    'LOCKED': 'seats_locked',
+}
+
+
+# Compare-and-swap attempts before a bitmap claim gives up
+BITMAP_CLAIM_ATTEMPTS = 5
+
+# Versions between trims of a train's seat change log
+SEAT_CHANGE_TRIM_EVERY = 100
+
+
+class InvalidSeats(Exception):
+    """Raised when requested seat numbers do not exist on the train."""
+
+
+class SeatsUnavailable(Exception):
+    """Raised when requested seats exist but are not in the expected status."""
+
+    def __init__(self, seat_numbers):
+        super().__init__(f"Seats not available: {seat_numbers}")
+        self.seat_numbers = seat_numbers
+
+
+class ConcurrentUpdate(Exception):
+    """Raised when a seat claim keeps losing races against other claims."""
+
+
+def move_seat_counters(train_id, from_status, to_status, count, seat_numbers):
+    """
+    Move seats between two counters on a train and bump its inventory_version.
+
+    Call inside the transaction that changes the Seat rows. Under
+    settings.SEAT_CLAIM_MODE 'train_lock' the train row is already locked by
+    then, so the counters and the seat change log are written in the same
+    transaction. Under 'conditional' they are written in a short transaction
+    of their own once the seat change commits (and dropped if it rolls back),
+    so a claim never holds the train row and claims on different seats of
+    one train do not wait for each other. The counters and version then trail
+    the Seat rows by that one statement; repair_seat_counters recomputes them
+    should a process die in between.
+
+    Args:
+        train_id (str): Primary key of the train
+        from_status (str): Seat status the seats are leaving
+        to_status (str): Seat status the seats are entering
+        count (int): Number of seats that changed status
+        seat_numbers (list): The seats that may have changed, for the change log
+    """
+    if not count or from_status == to_status:
+        return
+    if settings.SEAT_CLAIM_MODE == 'conditional':
+        transaction.on_commit(
+            lambda: _apply_seat_counters(train_id, from_status, to_status, count, seat_numbers),
+            robust=True
+        )
+    else:
+        _apply_seat_counters(train_id, from_status, to_status, count, seat_numbers)
+
+
+def _apply_seat_counters(train_id, from_status, to_status, count, seat_numbers):
+    from_field = SEAT_COUNTER_FIELDS[from_status]
+    to_field = SEAT_COUNTER_FIELDS[to_status]
+    with transaction.atomic():
+        Train.objects.filter(pk=train_id).update(**{
+            from_field: F(from_field) - count,
+            to_field: F(to_field) + count,
+            'inventory_version': F('inventory_version') + 1,
+        })
+        record_seat_change(train_id, seat_numbers)
+
+
+def record_seat_change(train_id, seat_numbers):
+    """
+    Log the seats touched by the train's latest inventory_version bump.
+
+    Call in the transaction that bumped the version, which keeps the train
+    row locked so the version read back is our own. The log keeps the last
+    settings.SEAT_CHANGE_LOG_SIZE versions per train (trimmed every
+    SEAT_CHANGE_TRIM_EVERY versions) and serves seat_changes_since.
+    """
+    version = Train.objects.values_list('inventory_version', flat=True).get(pk=train_id)
+    SeatChange.objects.create(train_id=train_id, version=version, seat_numbers=sorted(seat_numbers))
+    if version % SEAT_CHANGE_TRIM_EVERY == 0:
+        SeatChange.objects.filter(
+            train_id=train_id,
+            version__lte=version - settings.SEAT_CHANGE_LOG_SIZE
+        ).delete()
+
+
+def seat_changes_since(train, version):
+    """
+    Return the seats that changed status after ``version``, or None.
+
+    Seats are reported once however often they changed; callers read their
+    current status. A seat logged by a change that did not end up moving it
+    is reported too, which is harmless for a client applying the delta.
+
+    Args:
+        train (Train): The train, with the inventory_version to diff up to
+        version (int): The last version the client has seen
+
+    Returns:
+        list: Sorted seat numbers, or None when the log no longer covers
+            every version since ``version`` and a full snapshot is needed
+    """
+    current = train.inventory_version
+    if version == current:
+        return []
+    if not 0 <= version < current:
+        return None
+    changes = list(
+        SeatChange.objects.filter(
+            train=train,
+            version__gt=version,
+            version__lte=current
+        ).values_list('seat_numbers', flat=True)
+    )
+    # Trimmed entries, or bumps that changed counters without a log entry
+    if len(changes) != current - version:
+        return None
+    return sorted({seat_number for seat_numbers in changes for seat_number in seat_numbers})
+
+
+def uses_bitmap(train):
+    """Return True if the train keeps its seats in a packed bitmap."""
+    return train.seat_bitmap is not None
+
+
+def load_bitmap(train):
+    """Decode the train's seat bitmap."""
+    return SeatBitmap(train.total_seats, train.seat_bitmap)
+
+
+def initial_seat_bitmap(total_seats, backend=None):
+    """
+    Return the seat bitmap a new train should be created with.
+
+    Args:
+        total_seats (int): Number of seats on the train
+        backend (str, optional): 'rows' or 'bitmap'. Defaults to settings.SEAT_INVENTORY_BACKEND
+
+    Returns:
+        bytes: An all-available bitmap, or None for row-backed trains
+    """
+    backend = backend or settings.SEAT_INVENTORY_BACKEND
+    if backend == 'bitmap':
+        return SeatBitmap(total_seats).to_bytes()
+    return None
+
+
+def materialize_seats(train):
+    """
+    Create a row-backed train's Seat rows if they do not exist yet.
+
+    Trains are created without Seat rows, so creation does not scale with
+    total_seats; until the first booking or hold all seats are implicitly
+    available. Only seat claims call this; reads of a train without rows
+    report every seat available and never write. The first caller flips
+    seats_materialized with a conditional UPDATE and inserts every seat in
+    one statement, in the same transaction, so concurrent callers wait for
+    it and then find the rows in place. Afterwards this costs nothing for
+    instances loaded from the database, and one read for stale ones.
+
+    The instance's flag is only set once the transaction commits, so a claim
+    that rolls back (taking the new rows with it) leaves the instance asking
+    again rather than assuming rows that no longer exist.
+
+    Returns:
+        bool: True if this call created the rows
+    """
+    if uses_bitmap(train) or train.seats_materialized:
+        return False
+    # Read first: the conditional UPDATE would lock the train row even when
+    # it no longer matches, ahead of the seats in 'conditional' mode
+    if Train.objects.filter(pk=train.pk, seats_materialized=True).exists():
+        _remember_materialized(train)
+        return False
+    with transaction.atomic():
+        created = Train.objects.filter(pk=train.pk, seats_materialized=False).update(seats_materialized=True)
+        if created:
+            Seat.objects.bulk_create([
+                Seat(
+                    train=train,
+                    seat_number=seat_num,
+                    status='AVAILABLE'
+                ) for seat_num in range(1, train.total_seats + 1)
+            ])
+        else:
+            # Another claim created the rows while we waited. Rolling back to
+            # the savepoint drops the train row lock the UPDATE took anyway
+            transaction.set_rollback(True)
+    _remember_materialized(train)
+    return bool(created)
+
+
+def _remember_materialized(train):
+    # Runs straight away outside a transaction
+    transaction.on_commit(lambda: setattr(train, 'seats_materialized', True))
+
+
+def bulk_create_seat_inventory(trains, batch_size=10000):
+    """
+    Create Seat rows for many newly created row-backed trains at once.
+
+    For bulk loads that want the rows in place up front; the trains should be
+    created with seats_materialized set.
+
+    On PostgreSQL the rows are streamed with COPY, which is several times
+    faster than multi-row INSERTs at timetable scale; other databases get
+    bulk_create in ``batch_size`` chunks. Bitmap-backed trains are skipped.
+
+    Returns:
+        int: Number of Seat rows created
+    """
+    rows = (
+        (train.pk, seat_number)
+        for train in trains if not uses_bitmap(train)
+        for seat_number in range(1, train.total_seats + 1)
+    )
+    if connection.vendor == 'postgresql':
+        return _copy_seats(rows)
+
+    created = 0
+    while True:
+        batch = [
+            Seat(train_id=train_id, seat_number=seat_number, status='AVAILABLE')
+            for train_id, seat_number in islice(rows, batch_size)
+        ]
+        if not batch:
+            return created
+        Seat.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def _copy_seats(rows):
+    quote = connection.ops.quote_name
+    sql = "COPY {} ({}, {}, {}) FROM STDIN".format(
+        quote(Seat._meta.db_table),
+        quote(Seat._meta.get_field('train').column),
+        quote(Seat._meta.get_field('seat_number').column),
+        quote(Seat._meta.get_field('status').column),
+    )
+    created = 0
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                for train_id, seat_number in rows:
+                    copy.write_row((train_id, seat_number, 'AVAILABLE'))
+                    created += 1
+        else:
+            # psycopg2 reads COPY data from a file-like object
+            buffer = io.StringIO()
+            for train_id, seat_number in rows:
+                buffer.write(f"{train_id}\t{seat_number}\tAVAILABLE\n")
+                created += 1
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+    return created
+
+
+def lock_train_before_seats(train):
+    """
+    Lock a row-backed train's row ahead of its Seat rows in 'train_lock' mode.
+
+    Every path that changes seats takes its row locks in one order, so two
+    of them can never deadlock each other. Under settings.SEAT_CLAIM_MODE
+    'train_lock' the Train row comes first and then its Seat rows; under
+    'conditional' only the Seat rows are locked, and move_seat_counters
+    updates the Train row after commit. Paths that change several trains
+    handle them in train_id order. Bitmap-backed trains only have the Train
+    row.
+    """
+    if settings.SEAT_CLAIM_MODE == 'train_lock' and not uses_bitmap(train):
+        list(Train.objects.select_for_update().filter(pk=train.pk).values_list('pk', flat=True))
+
+
+def normalize_seat_numbers(seat_numbers):
+    """
+    Convert requested seat numbers to a list of distinct integers.
+
+    Raises:
+        InvalidSeats: If a seat number is not an integer or is repeated
+    """
+    try:
+        normalized = [int(seat_number) for seat_number in seat_numbers]
+    except (TypeError, ValueError):
+        raise InvalidSeats("Seat numbers must be integers")
+    if len(set(normalized)) != len(normalized):
+        raise InvalidSeats("Seat numbers must not repeat")
+    return normalized
+
+
+def seat_statuses(train, seat_numbers=None, lapsed=()):
+    """
+    Return (seat_number, status) pairs ordered by seat number.
+
+    Never writes, so it is safe on a replica. The statuses of a train whose
+    Seat rows do not exist yet come from the instance's seats_materialized,
+    read together with the counters and inventory_version the caller reports.
+
+    Args:
+        train (Train): The train
+        seat_numbers (iterable, optional): Only these seats; default every seat
+        lapsed (set, optional): Seats whose hold expired but is not released
+            yet (see holds.lapsed_hold_seats), reported as available
+    """
+    statuses = _stored_seat_statuses(train, seat_numbers)
+    if not lapsed:
+        return statuses
+    return [
+        (n, 'AVAILABLE' if seat_status == 'LOCKED' and n in lapsed else seat_status)
+        for n, seat_status in statuses
+    ]
+
+
+def _stored_seat_statuses(train, seat_numbers):
+    wanted = None if seat_numbers is None else set(seat_numbers)
+    if uses_bitmap(train):
+        statuses = load_bitmap(train)
+    elif not train.seats_materialized:
+        # Nothing can have been booked or held before the rows existed
+        statuses = ((seat_number, 'AVAILABLE') for seat_number in range(1, train.total_seats + 1))
+    else:
+        seats = Seat.objects.filter(train=train)
+        if wanted is not None:
+            seats = seats.filter(seat_number__in=wanted)
+        return list(seats.order_by('seat_number').values_list('seat_number', 'status'))
+    return [(n, seat_status) for n, seat_status in statuses if wanted is None or n in wanted]
+
+
+def available_seat_numbers(train, limit=None):
+    """
+    Return the currently available seat numbers, read fresh from the database.
+
+    Args:
+        train (Train): The train
+        limit (int, optional): Return at most this many, lowest seat numbers first
+    """
+    if uses_bitmap(train):
+        train.seat_bitmap = Train.objects.values_list('seat_bitmap', flat=True).get(pk=train.pk)
+        return load_bitmap(train).seats_with_status('AVAILABLE')[:limit]
+    if not train.seats_materialized:
+        if not Train.objects.values_list('seats_materialized', flat=True).get(pk=train.pk):
+            return list(range(1, train.total_seats + 1))[:limit]
+        _remember_materialized(train)
+    seats = Seat.objects.filter(train=train, status='AVAILABLE').order_by('seat_number')
+    return list(seats.values_list('seat_number', flat=True)[:limit])
+
+
+def claim_seats(train, seat_numbers, from_status, to_status, booking=None, locked_by=None, lock_expires_at=None):
+    """
+    Move seats from one status to another, all or nothing.
+
+    Row-backed seats are claimed with a single conditional UPDATE guarded on
+    ``from_status``, so only the requested seats are locked and claims on
+    other seats of the same train proceed in parallel. Bitmap-backed trains
+    compare-and-swap the whole bitmap, re-reading it when another claim got
+    there first. Seat counters are moved as described in move_seat_counters.
+
+    The caller must run inside a transaction and roll it back on error, which
+    undoes any partial claim.
+
+    Args:
+        train (Train): The train owning the seats
+        seat_numbers (list): Seat numbers to move
+        from_status (str): Status every seat must currently have
+        to_status (str): Status to move the seats to
+        booking (Booking, optional): Booking to link booked seats to
+        locked_by (User, optional): User holding locked seats
+        lock_expires_at (datetime, optional): When the hold on locked seats lapses
+
+    Raises:
+        InvalidSeats: If any seat does not exist
+        SeatsUnavailable: If any seat is not in ``from_status``
+        ConcurrentUpdate: If the bitmap kept changing under us
+    """
+    seat_numbers = normalize_seat_numbers(seat_numbers)
+
+    if uses_bitmap(train):
+        _claim_bitmap(train, seat_numbers, from_status, to_status)
+        return
+
+    lock_train_before_seats(train)
+    materialize_seats(train)
+    seat_fields = {
+        'booking_id': booking.pk if booking else None,
+        'locked_by_id': locked_by.pk if locked_by else None,
+        'lock_expires_at': lock_expires_at,
+    }
+    claimed = Seat.objects.filter(
+        train=train,
+        seat_number__in=seat_numbers,
+        status=from_status
+    ).update(status=to_status, **seat_fields)
+
+    if claimed != len(seat_numbers):
+        # Partial claim: work out which seats we lost before the caller rolls back
+        current = {
+            row[0]: row[1:]
+            for row in Seat.objects.filter(
+                train=train,
+                seat_number__in=seat_numbers
+            ).values_list('seat_number', 'status', *seat_fields)
+        }
+        if len(current) != len(seat_numbers):
+            raise InvalidSeats("One or more selected seats do not exist.")
+        ours = (to_status, *seat_fields.values())
+        raise SeatsUnavailable([n for n in seat_numbers if current[n] != ours])
+
+    move_seat_counters(train.pk, from_status, to_status, len(seat_numbers), seat_numbers)
+
+
+def _claim_bitmap(train, seat_numbers, from_status, to_status):
+    if any(not 1 <= seat_number <= train.total_seats for seat_number in seat_numbers):
+        raise InvalidSeats("One or more selected seats do not exist.")
+
+    from_field = SEAT_COUNTER_FIELDS[from_status]
+    to_field = SEAT_COUNTER_FIELDS[to_status]
+    for _ in range(BITMAP_CLAIM_ATTEMPTS):
+        bitmap = load_bitmap(train)
+        unavailable = [n for n in seat_numbers if bitmap.get(n) != from_status]
+        if unavailable:
+            raise SeatsUnavailable(unavailable)
+        for seat_number in seat_numbers:
+            bitmap.set(seat_number, to_status)
+
+        expected = bytes(train.seat_bitmap)
+        claimed = bitmap.to_bytes()
+        if Train.objects.filter(pk=train.pk, seat_bitmap=expected).update(**{
+            'seat_bitmap': claimed,
+            from_field: F(from_field) - len(seat_numbers),
+            to_field: F(to_field) + len(seat_numbers),
+            'inventory_version': F('inventory_version') + 1,
+        }):
+            train.seat_bitmap = claimed
+            record_seat_change(train.pk, seat_numbers)
+            return
+
+        # Another claim changed the bitmap first; retry against the new one
+        train.seat_bitmap = Train.objects.values_list('seat_bitmap', flat=True).get(pk=train.pk)
+
+    raise ConcurrentUpdate(f"Seat bitmap for train {train.pk} kept changing")
+
+
+def release_seats(train, seat_numbers, from_status):
+    """
+    Make seats available again, skipping any no longer in ``from_status``.
+
+    Unlike claim_seats this never fails on seats that moved on, which suits
+    sweeps releasing seats that may have been confirmed in the meantime.
+
+    Args:
+        train (Train): The train owning the seats
+        seat_numbers (list): Seat numbers to release
+        from_status (str): Status the seats are released from
+
+    Returns:
+        int: Number of seats released
+    """
+    if not seat_numbers:
+        return 0
+
+    if not uses_bitmap(train):
+        lock_train_before_seats(train)
+        released = Seat.objects.filter(
+            train=train,
+            seat_number__in=seat_numbers,
+            status=from_status
+        ).update(status='AVAILABLE', booking=None, locked_by=None, lock_expires_at=None)
+        move_seat_counters(train.pk, from_status, 'AVAILABLE', released, seat_numbers)
+        return released
+
+    for _ in range(BITMAP_CLAIM_ATTEMPTS):
+        train.seat_bitmap = Train.objects.values_list('seat_bitmap', flat=True).get(pk=train.pk)
+        bitmap = load_bitmap(train)
+        releasable = [
+            n for n in seat_numbers
+            if 1 <= n <= train.total_seats and bitmap.get(n) == from_status
+        ]
+        if not releasable:
+            return 0
+        try:
+            _claim_bitmap(train, releasable, from_status, 'AVAILABLE')
+            return len(releasable)
+        except SeatsUnavailable:
+            continue
+    raise ConcurrentUpdate(f"Seat bitmap for train {train.pk} kept changing")
+
+
+def reserve_seats(train, seat_numbers, booking):
+    """
+    Mark available seats as booked for a booking.
+
+    See claim_seats for the locking and error behaviour.
+    """
+    claim_seats(train, seat_numbers, 'AVAILABLE', 'BOOKED', booking=booking)
+
+
+def reserve_seats_for_bookings(train, seats_by_booking):
+    """
+    Mark available seats as booked for several bookings at once.
+
+    Row-backed seats are claimed with one conditional UPDATE that links each
+    seat to its own booking through a CASE, and the counters are moved once;
+    bitmap-backed trains swap the bitmap once for all the seats. Like
+    claim_seats, the caller must run inside a transaction and roll it back on
+    error.
+
+    Args:
+        train (Train): The train owning the seats
+        seats_by_booking (dict): Seat numbers to book, keyed by booking id
+
+    Raises:
+        InvalidSeats: If any seat does not exist or is requested twice
+        SeatsUnavailable: If any seat is not available
+        ConcurrentUpdate: If the bitmap kept changing under us
+    """
+    seat_numbers = normalize_seat_numbers(
+        [n for seats in seats_by_booking.values() for n in seats]
+    )
+    if not seat_numbers:
+        return
+
+    if uses_bitmap(train):
+        _claim_bitmap(train, seat_numbers, 'AVAILABLE', 'BOOKED')
+        return
+
+    lock_train_before_seats(train)
+    materialize_seats(train)
+    booking_for_seat = Case(
+        *[
+            When(seat_number__in=seats, then=Value(booking_id))
+            for booking_id, seats in seats_by_booking.items()
+        ],
+        output_field=IntegerField()
+    )
+    claimed = Seat.objects.filter(
+        train=train,
+        seat_number__in=seat_numbers,
+        status='AVAILABLE'
+    ).update(status='BOOKED', booking_id=booking_for_seat, locked_by=None, lock_expires_at=None)
+
+    if claimed != len(seat_numbers):
+        expected = {n: booking_id for booking_id, seats in seats_by_booking.items() for n in seats}
+        current = dict(
+            (seat_number, (status, booking_id))
+            for seat_number, status, booking_id in Seat.objects.filter(
+                train=train,
+                seat_number__in=seat_numbers
+            ).values_list('seat_number', 'status', 'booking_id')
+        )
+        if len(current) != len(seat_numbers):
+            raise InvalidSeats("One or more selected seats do not exist.")
+        raise SeatsUnavailable([n for n in seat_numbers if current[n] != ('BOOKED', expected[n])])
+
+    move_seat_counters(train.pk, 'AVAILABLE', 'BOOKED', len(seat_numbers), seat_numbers)
+
+
+def compute_seat_counters(trains):
+    """
+    Recompute seat counters for trains from their seat inventory.
+
+    Row-backed trains are counted from Seat rows, where seats without a row
+    (trains created without seats) count as available. Bitmap-backed trains
+    are counted from the bitmap.
+
+    Args:
+        trains (iterable): Train instances to recompute
+
+    Returns:
+        list: Trains whose counters differed and were updated in memory
+    """
+    trains = list(trains)
+    counts = {}
+    rows = Seat.objects.filter(
+        train__in=[train for train in trains if not uses_bitmap(train)],
+        status__in=['BOOKED', 'LOCKED']
+    ).values_list('train_id', 'status').annotate(total=Count('id')).order_by()
+    for train_id, seat_status, total in rows:
+        counts[(train_id, seat_status)] = total
+
+    changed = []
+    for train in trains:
+        if uses_bitmap(train):
+            bitmap = load_bitmap(train)
+            booked = bitmap.count('BOOKED')
+            locked = bitmap.count('LOCKED')
+        else:
+            booked = counts.get((train.pk, 'BOOKED'), 0)
+            locked = counts.get((train.pk, 'LOCKED'), 0)
+        available = max(train.total_seats - booked - locked, 0)
+        if (train.seats_available, train.seats_booked, train.seats_locked) != (available, booked, locked):
+            train.seats_available = available
+            train.seats_booked = booked
+            train.seats_locked = locked
+            changed.append(train)
+    return changed
@@ -0,0 +1,62 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+class Command(BaseCommand):
+    help = 'Measures per-request database overhead with fresh, persistent and pooled connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200,
+                          help='Requests simulated per mode')
+        parser.add_argument('--database', default='default',
+                          help='Database alias to benchmark')
+
+    def _unpooled(self, alias, conn_max_age):
+        conn = connections[alias]
+        settings_dict = {
+            **conn.settings_dict,
+            'OPTIONS': {k: v for k, v in conn.settings_dict['OPTIONS'].items() if k != 'pool'},
+            'CONN_MAX_AGE': conn_max_age,
+        }
+        return conn.__class__(settings_dict, alias=f'{alias}_benchmark')
+
+    def _measure(self, conn, iterations, close_between):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            if close_between:
+                # What Django does at the end of a request without persistent connections
+                conn.close()
+            timings.append((time.perf_counter() - started) * 1000)
+        conn.close()
+        return timings
+
+    def _report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f'{label:<12} mean {statistics.mean(timings):7.3f} ms   '
+            f'p50 {statistics.median(timings):7.3f} ms   p95 {p95:7.3f} ms'
+        )
+        return statistics.mean(timings)
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        iterations = options['iterations']
+
+        fresh = self._report('fresh', self._measure(self._unpooled(alias, 0), iterations, True))
+        self._report('persistent', self._measure(self._unpooled(alias, None), iterations, False))
+
+        conn = connections[alias]
+        if getattr(conn, 'pool', None) is None:
+            self.stdout.write(self.style.WARNING('Pooling is not configured for this database (set DB_POOL=True)'))
+            return
+        pooled = self._report('pooled', self._measure(conn, iterations, True))
+        self.stdout.write(f'Pool stats: {conn.pool.get_stats()}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Pooled connections save {fresh - pooled:.3f} ms per request ({fresh / pooled:.1f}x)')
+        )
@@ -0,0 +1,93 @@
+import io
+import time
+from datetime import time as dt_time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer, orjson
+
+
+def user_bookings_payload(rows):
+    """A UserBookingsView response with ``rows`` bookings."""
+    now = timezone.now()
+    return [
+        {
+            'booking_id': i,
+            'train': {
+                'train_id': f'T{i % 500:04d}',
+                'name': f'Express {i % 500}',
+                'source': f'Station {i % 97}',
+                'destination': f'Station {i % 89}',
+            },
+            'seat_numbers': [i % 72 + 1, i % 72 + 2],
+            'num_seats': 2,
+            'total_price': Decimal('1000.00'),
+            'status': 'CONFIRMED',
+            'booking_date': now - timedelta(minutes=i),
+        }
+        for i in range(rows)
+    ]
+
+
+def admin_trains_payload(rows):
+    """An AdminTrainListView response with ``rows`` trains."""
+    return [
+        {
+            'train_id': f'T{i:04d}',
+            'name': f'Express {i}',
+            'source': {'station_code': f'S{i % 97:03d}', 'station_name': f'Station {i % 97}'},
+            'destination': {'station_code': f'S{i % 89:03d}', 'station_name': f'Station {i % 89}'},
+            'total_seats': 72,
+            'available_seats': 72 - i % 72,
+            'departure_time': dt_time(i % 24, i % 60),
+            'arrival_time': dt_time((i + 5) % 24, i % 60),
+        }
+        for i in range(rows)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compares render and parse times of the JSON and orjson renderers on large list payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000,
+                          help='Rows in each payload')
+        parser.add_argument('--repeat', type=int, default=20,
+                          help='Timed runs per measurement; the fastest is reported')
+
+    def _best(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson is not installed; ORJSONRenderer is falling back to JSONRenderer')
+        rows = options['rows']
+        repeat = options['repeat']
+        payloads = {
+            'user bookings': user_bookings_payload(rows),
+            'admin trains': admin_trains_payload(rows),
+        }
+
+        for name, payload in payloads.items():
+            body = JSONRenderer().render(payload)
+            stock = self._best(lambda: JSONRenderer().render(payload), repeat)
+            fast = self._best(lambda: ORJSONRenderer().render(payload), repeat)
+            stock_parse = self._best(lambda: JSONParser().parse(io.BytesIO(body)), repeat)
+            fast_parse = self._best(lambda: ORJSONParser().parse(io.BytesIO(body)), repeat)
+            self.stdout.write(
+                f'{name} ({rows} rows, {len(body) / 1024:.0f} KiB): '
+                f'render {stock:.2f} ms -> {fast:.2f} ms ({stock / fast:.1f}x), '
+                f'parse {stock_parse:.2f} ms -> {fast_parse:.2f} ms ({stock_parse / fast_parse:.1f}x)'
+            )
+        self.stdout.write(self.style.SUCCESS('Done'))
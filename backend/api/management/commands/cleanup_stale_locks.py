@@ -1,15 +1,55 @@
+import time
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from api.models import SeatLock
+from api.holds import reap_expired_holds
 
 class Command(BaseCommand):
-    help = 'Cleans up expired seat locks'
+    help = 'Releases seats held by expired seat locks, in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                          help='Maximum number of locks released per transaction')
+        parser.add_argument('--loop', action='store_true',
+                          help='Keep running, sweeping again every --interval seconds')
+        parser.add_argument('--interval', type=float, default=5.0,
+                          help='Seconds to sleep between passes once caught up (with --loop)')
 
     def handle(self, *args, **options):
-        current_time = timezone.now()
-        expired_locks = SeatLock.objects.filter(expires_at__lt=current_time)
-        count = expired_locks.count()
-        expired_locks.delete()
+        batch_size = options['batch_size']
+        total_locks = total_seats = 0
+        passes = 0
+
+        try:
+            while True:
+                passes += 1
+                started = time.monotonic()
+                locks = seats = batches = 0
+
+                # Drain in small batches so no single transaction locks much at once
+                while True:
+                    batch_locks, batch_seats = reap_expired_holds(batch_size)
+                    if not (batch_locks or batch_seats):
+                        break
+                    locks += batch_locks
+                    seats += batch_seats
+                    batches += 1
+
+                elapsed = time.monotonic() - started
+                total_locks += locks
+                total_seats += seats
+                if locks or seats or not options['loop']:
+                    self.stdout.write(
+                        f'Pass {passes}: deleted {locks} locks and released {seats} seats '
+                        f'in {batches} batches, {elapsed:.3f}s ({locks / elapsed if elapsed else 0:.0f} locks/s)'
+                    )
+
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully deleted {count} expired seat locks')
-        ) 
\ No newline at end of file
+            self.style.SUCCESS(
+                f'Successfully deleted {total_locks} expired seat locks and released {total_seats} seats'
+            )
+        )
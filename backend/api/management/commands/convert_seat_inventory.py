@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from api.bitmap import SeatBitmap
+from api.inventory import compute_seat_counters, load_bitmap, uses_bitmap
+from api.models import Booking, Seat, SeatLock, Train
+
+class Command(BaseCommand):
+    help = 'Converts trains between Seat-row and packed bitmap seat inventory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('train_ids', nargs='*', type=str,
+                          help='Trains to convert (default: all trains)')
+        parser.add_argument('--to', choices=['bitmap', 'rows'], default='bitmap',
+                          help='Target inventory representation')
+        parser.add_argument('--keep-rows', action='store_true',
+                          help='Keep Seat rows after converting to bitmap')
+
+    def handle(self, *args, **options):
+        trains = Train.objects.order_by('train_id')
+        if options['train_ids']:
+            trains = trains.filter(train_id__in=options['train_ids'])
+        train_ids = list(trains.values_list('train_id', flat=True))
+
+        converted = 0
+        for train_id in train_ids:
+            with transaction.atomic():
+                train = Train.objects.select_for_update().get(pk=train_id)
+                if options['to'] == 'bitmap' and not uses_bitmap(train):
+                    self.to_bitmap(train, keep_rows=options['keep_rows'])
+                elif options['to'] == 'rows' and uses_bitmap(train):
+                    self.to_rows(train)
+                else:
+                    continue
+
+                changed = compute_seat_counters([train])
+                if changed:
+                    train.inventory_version += 1
+                    Train.objects.bulk_update(
+                        changed, ['seats_available', 'seats_booked', 'seats_locked', 'inventory_version']
+                    )
+            converted += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Converted {converted} of {len(train_ids)} trains to {options["to"]} inventory')
+        )
+
+    def to_bitmap(self, train, keep_rows=False):
+        bitmap = SeatBitmap(train.total_seats)
+        seats = Seat.objects.filter(train=train).exclude(status='AVAILABLE')
+        for seat_number, seat_status in seats.values_list('seat_number', 'status'):
+            try:
+                bitmap.set(seat_number, seat_status)
+            except IndexError:
+                raise CommandError(
+                    f'{train.train_id}: seat {seat_number} is outside 1..{train.total_seats}'
+                )
+
+        train.seat_bitmap = bitmap.to_bytes()
+        Train.objects.filter(pk=train.pk).update(seat_bitmap=train.seat_bitmap)
+        if not keep_rows:
+            Seat.objects.filter(train=train).delete()
+            Train.objects.filter(pk=train.pk).update(seats_materialized=False)
+
+    def to_rows(self, train):
+        # Booked seats link back to their booking; locked seats to their lock
+        booking_for_seat = {}
+        for booking_id, seat_numbers in Booking.objects.filter(
+            train=train,
+            status='CONFIRMED'
+        ).values_list('id', 'seat_numbers'):
+            for seat_number in seat_numbers:
+                booking_for_seat[seat_number] = booking_id
+        lock_for_seat = {
+            lock.seat_number: lock
+            for lock in SeatLock.objects.filter(train=train)
+        }
+
+        seats = []
+        for seat_number, seat_status in load_bitmap(train):
+            lock = lock_for_seat.get(seat_number) if seat_status == 'LOCKED' else None
+            seats.append(Seat(
+                train=train,
+                seat_number=seat_number,
+                status=seat_status,
+                booking_id=booking_for_seat.get(seat_number) if seat_status == 'BOOKED' else None,
+                locked_by_id=lock.user_id if lock else None,
+                lock_expires_at=lock.expires_at if lock else None
+            ))
+
+        Seat.objects.filter(train=train).delete()
+        Seat.objects.bulk_create(seats, batch_size=1000)
+        train.seat_bitmap = None
+        train.seats_materialized = True
+        Train.objects.filter(pk=train.pk).update(seat_bitmap=None, seats_materialized=True)
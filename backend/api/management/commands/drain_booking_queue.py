@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api.booking_queue import drain_train, requeue_stale_intents, trains_with_queued_intents
+
+class Command(BaseCommand):
+    help = 'Books queued booking intents, one train per worker at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                          help='Trains drained in parallel; bounds concurrent booking transactions')
+        parser.add_argument('--batch-size', type=int, default=100,
+                          help='Intents claimed from a train per transaction')
+        parser.add_argument('--loop', action='store_true',
+                          help='Keep running, polling for new intents every --interval seconds')
+        parser.add_argument('--interval', type=float, default=0.5,
+                          help='Seconds to sleep when the queue is empty (with --loop)')
+
+    def _drain(self, train_id, batch_size):
+        try:
+            return drain_train(train_id, batch_size)
+        finally:
+            # Worker threads open their own connections; do not leak them
+            connection.close()
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        totals = {'CONFIRMED': 0, 'FAILED': 0}
+
+        try:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                while True:
+                    requeued = requeue_stale_intents()
+                    if requeued:
+                        self.stdout.write(self.style.WARNING(f'Re-queued {requeued} abandoned intents'))
+
+                    train_ids = trains_with_queued_intents()
+                    if not train_ids:
+                        if not options['loop']:
+                            break
+                        time.sleep(options['interval'])
+                        continue
+
+                    started = time.monotonic()
+                    results = list(pool.map(lambda train_id: self._drain(train_id, batch_size), train_ids))
+                    elapsed = time.monotonic() - started
+                    processed = 0
+                    for result in results:
+                        for outcome, count in result.items():
+                            totals[outcome] += count
+                            processed += count
+                    self.stdout.write(
+                        f'Drained {processed} intents on {len(train_ids)} trains in {elapsed:.3f}s '
+                        f'({processed / elapsed if elapsed else 0:.0f} intents/s)'
+                    )
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Confirmed {totals['CONFIRMED']} and failed {totals['FAILED']} queued bookings"
+            )
+        )
@@ -0,0 +1,212 @@
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from api.ids import advance_sequence, next_train_ids, parse_train_id
+from api.inventory import bulk_create_seat_inventory, initial_seat_bitmap
+from api.models import Station, Train
+
+FORMATS = ('csv', 'jsonl')
+
+
+class InvalidRow(Exception):
+    """Raised for a timetable row that cannot be imported."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports trains from a CSV or JSONL timetable in large batches. Each row needs '
+        'name, total_seats, departure_time, arrival_time and a source and destination, '
+        'given as station names (source, destination) or codes (source_code, '
+        'destination_code); train_id is optional. Unknown stations are created.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Timetable file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS,
+                          help='File format (default: from the file extension, else csv)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                          help='Number of trains inserted per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                          help='Parse and validate the file without writing anything')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        # One read of every station up front; new ones are added as they are created
+        self.stations_by_code = {}
+        self.stations_by_name = {}
+        self.seen_names = set()
+        self.seen_ids = set()
+        for station in Station.objects.all():
+            self._remember(station)
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        started = time.monotonic()
+        imported = seats = skipped = 0
+        try:
+            rows = self._read(stream, file_format)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                batch_started = time.monotonic()
+                batch_trains, batch_seats, batch_skipped = self._import_batch(batch, options['dry_run'])
+                imported += batch_trains
+                seats += batch_seats
+                skipped += batch_skipped
+                elapsed = time.monotonic() - batch_started
+                total_elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Imported {imported} trains ({seats} seats), skipped {skipped}: '
+                    f'batch of {batch_trains} in {elapsed:.2f}s, '
+                    f'{imported / total_elapsed if total_elapsed else 0:.0f} trains/s overall'
+                )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{verb} {imported} trains with {seats} seats in {elapsed:.2f}s, skipped {skipped} rows'
+            )
+        )
+
+    def _read(self, stream, file_format):
+        """Yield (line number, row dict) pairs without loading the whole file."""
+        if file_format == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, InvalidRow(f'invalid JSON: {e}')
+
+    def _remember(self, station):
+        self.stations_by_code[station.station_code.upper()] = station
+        self.stations_by_name.setdefault(station.station_name.upper(), station)
+
+    def _new_station(self, name):
+        # Same code scheme as TrainCreateView, made unique if the prefix is taken
+        base = code = name[:5].upper()
+        suffix = 1
+        while code in self.stations_by_code:
+            suffix += 1
+            code = f'{base[:10 - len(str(suffix))]}{suffix}'
+        station = Station(station_code=code, station_name=name, city=name, state='Unknown')
+        self._remember(station)
+        return station
+
+    def _station(self, row, field, new_stations):
+        code = str(row.get(f'{field}_code') or '').strip()
+        if code:
+            station = self.stations_by_code.get(code.upper())
+            if station is None:
+                raise InvalidRow(f'unknown {field} station code {code}')
+            return station
+        name = str(row.get(field) or '').strip()
+        if not name:
+            raise InvalidRow(f'{field} or {field}_code is required')
+        station = self.stations_by_name.get(name.upper())
+        if station is None:
+            station = self._new_station(name)
+            new_stations.append(station)
+        return station
+
+    def _parse(self, row, new_stations):
+        if isinstance(row, InvalidRow):
+            raise row
+        name = str(row.get('name') or row.get('train_name') or '').strip()
+        if not name:
+            raise InvalidRow('name is required')
+        try:
+            total_seats = int(row.get('total_seats') or row.get('seat_capacity'))
+        except (TypeError, ValueError):
+            raise InvalidRow('total_seats must be a number')
+        if total_seats <= 0:
+            raise InvalidRow('total_seats must be greater than 0')
+        times = []
+        for field in ('departure_time', 'arrival_time'):
+            try:
+                times.append(datetime.strptime(str(row.get(field) or ''), '%H:%M:%S').time())
+            except ValueError:
+                raise InvalidRow(f'{field} must be in HH:MM:SS format')
+        return Train(
+            train_id=str(row.get('train_id') or '').strip(),
+            name=name,
+            source=self._station(row, 'source', new_stations),
+            destination=self._station(row, 'destination', new_stations),
+            total_seats=total_seats,
+            # bulk_create skips Train.save, which sets this for new trains
+            seats_available=total_seats,
+            departure_time=times[0],
+            arrival_time=times[1],
+            seat_bitmap=initial_seat_bitmap(total_seats),
+            # Seat rows are inserted with the batch rather than on first use
+            seats_materialized=True
+        )
+
+    def _import_batch(self, batch, dry_run):
+        new_stations = []
+        trains = []
+        skipped = 0
+        for line_number, row in batch:
+            try:
+                trains.append(self._parse(row, new_stations))
+            except InvalidRow as e:
+                self.stderr.write(f'Line {line_number}: {e}')
+                skipped += 1
+
+        # Names and IDs must be new, both to the database and within the file
+        existing = Train.objects.filter(
+            Q(train_id__in=[train.train_id for train in trains if train.train_id]) |
+            Q(name__in=[train.name for train in trains])
+        ).values_list('train_id', 'name')
+        for train_id, name in existing:
+            self.seen_ids.add(train_id)
+            self.seen_names.add(name)
+        accepted = []
+        for train in trains:
+            if train.name in self.seen_names or train.train_id in self.seen_ids:
+                self.stderr.write(f'Skipping {train.name}: a train with this name or ID already exists')
+                skipped += 1
+                continue
+            self.seen_names.add(train.name)
+            if train.train_id:
+                self.seen_ids.add(train.train_id)
+            accepted.append(train)
+
+        if dry_run:
+            return len(accepted), sum(train.total_seats for train in accepted), skipped
+
+        with transaction.atomic():
+            # Trains pick up the new stations' keys when they are inserted
+            Station.objects.bulk_create(new_stations)
+            # Keep the ID sequence ahead of explicit IDs so it never hands them out again
+            explicit = [parse_train_id(train.train_id) for train in accepted if train.train_id]
+            advance_sequence(max((number for number in explicit if number is not None), default=0))
+            unnumbered = [train for train in accepted if not train.train_id]
+            for train, train_id in zip(unnumbered, next_train_ids(len(unnumbered))):
+                train.train_id = train_id
+            Train.objects.bulk_create(accepted)
+            seats = bulk_create_seat_inventory(accepted)
+        return len(accepted), seats, skipped
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.inventory import compute_seat_counters
+from api.models import Train
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized seat counters on trains from their Seat rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('train_ids', nargs='*', type=str,
+                          help='Trains to repair (default: all trains)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                          help='Number of trains recomputed per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                          help='Report drifted trains without saving')
+
+    def handle(self, *args, **options):
+        trains = Train.objects.order_by('train_id')
+        if options['train_ids']:
+            trains = trains.filter(train_id__in=options['train_ids'])
+
+        train_ids = list(trains.values_list('train_id', flat=True))
+        batch_size = options['batch_size']
+        repaired = 0
+
+        for start in range(0, len(train_ids), batch_size):
+            batch_ids = train_ids[start:start + batch_size]
+            with transaction.atomic():
+                batch = Train.objects.select_for_update().filter(train_id__in=batch_ids)
+                changed = compute_seat_counters(batch)
+                for train in changed:
+                    self.stdout.write(
+                        f'{train.train_id}: available={train.seats_available} '
+                        f'booked={train.seats_booked} locked={train.seats_locked}'
+                    )
+                if changed and not options['dry_run']:
+                    # Clients caching on the version must see the corrected counts
+                    for train in changed:
+                        train.inventory_version += 1
+                    Train.objects.bulk_update(
+                        changed, ['seats_available', 'seats_booked', 'seats_locked', 'inventory_version']
+                    )
+            repaired += len(changed)
+
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} {repaired} of {len(train_ids)} trains with drifted seat counters')
+        )
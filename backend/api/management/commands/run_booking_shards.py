@@ -0,0 +1,48 @@
+import subprocess
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from api.sharding import ShardWriter, shard_addresses
+
+class Command(BaseCommand):
+    help = 'Runs the per-train booking writers configured in BOOKING_SHARDS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', type=int,
+                          help='Run only this shard (by index in BOOKING_SHARDS) in this process')
+        parser.add_argument('--batch-size', type=int, default=64,
+                          help='Maximum bookings group-committed together')
+        parser.add_argument('--window', type=float, default=0.002,
+                          help='Seconds to wait for more bookings before committing a batch')
+
+    def handle(self, *args, **options):
+        addresses = shard_addresses()
+        if options['shard'] is not None:
+            if not 0 <= options['shard'] < len(addresses):
+                raise CommandError(f"--shard must be between 0 and {len(addresses) - 1}")
+            address = addresses[options['shard']]
+            self.stdout.write(f"Shard {options['shard']} writing on {address[0]}:{address[1]}")
+            try:
+                ShardWriter(address, options['batch_size'], options['window']).serve_forever()
+            except KeyboardInterrupt:
+                pass
+            return
+
+        # One process per shard, so shards scale with cores rather than share a GIL
+        processes = [
+            subprocess.Popen([
+                sys.executable, sys.argv[0], 'run_booking_shards',
+                '--shard', str(index),
+                '--batch-size', str(options['batch_size']),
+                '--window', str(options['window']),
+            ])
+            for index in range(len(addresses))
+        ]
+        try:
+            for process in processes:
+                process.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for process in processes:
+                process.terminate()
+        self.stdout.write(self.style.SUCCESS(f'Stopped {len(processes)} booking shards'))
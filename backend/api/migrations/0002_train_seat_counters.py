@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:59
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_seat_counters(apps, schema_editor):
+    Train = apps.get_model("api", "Train")
+    Seat = apps.get_model("api", "Seat")
+
+    counts = {}
+    rows = (
+        Seat.objects.filter(status__in=["BOOKED", "LOCKED"])
+        .values_list("train_id", "status")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    for train_id, status, total in rows:
+        counts[(train_id, status)] = total
+
+    trains = list(Train.objects.all())
+    for train in trains:
+        train.seats_booked = counts.get((train.pk, "BOOKED"), 0)
+        train.seats_locked = counts.get((train.pk, "LOCKED"), 0)
+        train.seats_available = max(
+            train.total_seats - train.seats_booked - train.seats_locked, 0
+        )
+    Train.objects.bulk_update(
+        trains, ["seats_available", "seats_booked", "seats_locked"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="train",
+            name="seats_available",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="train",
+            name="seats_booked",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="train",
+            name="seats_locked",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_seat_counters, migrations.RunPython.noop),
+    ]
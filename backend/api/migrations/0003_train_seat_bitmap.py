@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_train_seat_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="train",
+            name="seat_bitmap",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
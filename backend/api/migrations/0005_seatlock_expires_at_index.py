@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="seatlock",
+            index=models.Index(
+                fields=["expires_at"], name="api_seatloc_expires_9ba4a5_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:25
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_bookingintent"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["train", "status"], name="api_booking_train_i_83c054_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["user", "created_at"], name="api_booking_user_id_cd32a2_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="seat",
+            index=models.Index(
+                fields=["train", "status", "seat_number"],
+                name="api_seat_train_i_33b12b_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="seat",
+            index=models.Index(
+                condition=models.Q(("status", "LOCKED")),
+                fields=["lock_expires_at"],
+                name="seat_locked_expiry_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="station",
+            index=models.Index(
+                django.db.models.functions.text.Upper("station_name"),
+                name="station_name_upper_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="train",
+            index=models.Index(
+                fields=["source", "destination"], name="api_train_source__c9c8a2_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:30
+
+from django.db import migrations, models
+
+TRAIN_ID_SEQUENCE = "api_train_id_seq"
+
+
+def create_train_id_sequence(apps, schema_editor):
+    Train = apps.get_model("api", "Train")
+    IdSequence = apps.get_model("api", "IdSequence")
+
+    # Continue after the highest generated ID, compared as a number
+    last = 0
+    for train_id in Train.objects.values_list("train_id", flat=True).iterator():
+        if train_id[:1] == "T" and train_id[1:].isdigit():
+            last = max(last, int(train_id[1:]))
+
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {TRAIN_ID_SEQUENCE}")
+        if last:
+            schema_editor.execute("SELECT setval(%s, %s)", [TRAIN_ID_SEQUENCE, last])
+    else:
+        IdSequence.objects.using(schema_editor.connection.alias).update_or_create(
+            name=TRAIN_ID_SEQUENCE, defaults={"last_value": last}
+        )
+
+
+def drop_train_id_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {TRAIN_ID_SEQUENCE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdSequence",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=50, primary_key=True, serialize=False),
+                ),
+                ("last_value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_train_id_sequence, drop_train_id_sequence),
+    ]
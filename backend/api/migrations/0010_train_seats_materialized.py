@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:34
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def mark_materialized_trains(apps, schema_editor):
+    Train = apps.get_model("api", "Train")
+    Seat = apps.get_model("api", "Seat")
+
+    # Trains created without Seat rows get them on first use from now on
+    Train.objects.filter(
+        Exists(Seat.objects.filter(train=OuterRef("pk")))
+    ).update(seats_materialized=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_train_id_sequence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="train",
+            name="seats_materialized",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_materialized_trains, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_train_seats_materialized"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="train",
+            name="inventory_version",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
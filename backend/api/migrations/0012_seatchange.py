@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_train_inventory_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SeatChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.BigIntegerField()),
+                ("seat_numbers", models.JSONField(default=list)),
+                (
+                    "train",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="seat_changes",
+                        to="api.train",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("train", "version")},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_seatchange"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="train",
+            name="seats_available",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="train",
+            name="seats_booked",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="train",
+            name="seats_locked",
+            field=models.IntegerField(default=0),
+        ),
+    ]
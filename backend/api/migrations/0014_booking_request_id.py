@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0013_train_signed_seat_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="request_id",
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
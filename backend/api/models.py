@@ -1,5 +1,8 @@
-from django.db import models
+import uuid
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.db.models import Q
+from django.db.models.functions import Upper
 from django.utils import timezone
 
 class User(AbstractUser):
@@ -13,6 +16,10 @@ class Station(models.Model):
 
     class Meta:
         ordering = ['station_name']
+        indexes = [
+            # Serves station_name__iexact lookups, which compare UPPER(station_name)
+            models.Index(Upper('station_name'), name='station_name_upper_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         # If no station code is provided, generate one from the station name
@@ -39,24 +46,59 @@ class Train(models.Model):
     total_seats = models.PositiveIntegerField(default=0)
     departure_time = models.TimeField(default="00:00:00")
     arrival_time = models.TimeField(default="00:00:00")
+    # Denormalized seat counters, kept in step with Seat rows by api.inventory.
+    # Signed: in 'conditional' claim mode they are moved after commit, and a
+    # release may briefly be counted before the claim it undoes
+    seats_available = models.IntegerField(default=0)
+    seats_booked = models.IntegerField(default=0)
+    seats_locked = models.IntegerField(default=0)
+    # Packed seat inventory (see api.bitmap); null when seats are stored as Seat rows
+    seat_bitmap = models.BinaryField(null=True, blank=True, editable=False)
+    # Whether a row-backed train's Seat rows exist yet; until then every seat
+    # is implicitly available (see api.inventory.materialize_seats)
+    seats_materialized = models.BooleanField(default=False)
+    # Bumped with every seat status change; seat views use it as their ETag
+    inventory_version = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['source', 'destination'])]
 
     def save(self, *args, **kwargs):
-        if not self.train_id:
-            # Get the highest train_id number
-            last_train = Train.objects.order_by('-train_id').first()
-            if last_train:
-                try:
-                    last_num = int(last_train.train_id[1:])
-                    self.train_id = f'T{str(last_num + 1).zfill(4)}'
-                except ValueError:
-                    self.train_id = 'T0001'
-            else:
-                self.train_id = 'T0001'
-        super().save(*args, **kwargs)
+        if self._state.adding and not (self.seats_booked or self.seats_locked):
+            # A new train starts with every seat available
+            self.seats_available = int(self.total_seats)
+        if self.train_id:
+            super().save(*args, **kwargs)
+            return
+
+        from .ids import next_train_id
+        while True:
+            self.train_id = next_train_id()
+            # Insert, so a generated ID never overwrites a train that took it
+            # explicitly (see next_train_id); if it is taken, draw another
+            try:
+                with transaction.atomic():
+                    super().save(*args, **{**kwargs, 'force_insert': True})
+                return
+            except IntegrityError:
+                if not Train.objects.filter(pk=self.train_id).exists():
+                    raise
 
     def __str__(self):
         return f"{self.name} ({self.train_id}): {self.source.station_name} → {self.destination.station_name}"
 
+class SeatChange(models.Model):
+    """Seats whose status changed in one inventory_version bump of a train."""
+    train = models.ForeignKey(Train, on_delete=models.CASCADE, related_name='seat_changes')
+    version = models.BigIntegerField()
+    seat_numbers = models.JSONField(default=list)
+
+    class Meta:
+        unique_together = ('train', 'version')
+
+    def __str__(self):
+        return f"{self.train_id} v{self.version}: {self.seat_numbers}"
+
 class SeatLock(models.Model):
     train = models.ForeignKey(Train, on_delete=models.CASCADE)
     seat_number = models.PositiveIntegerField()
@@ -66,6 +108,7 @@ class SeatLock(models.Model):
 
     class Meta:
         unique_together = ('train', 'seat_number')
+        indexes = [models.Index(fields=['expires_at'])]
 
     def is_expired(self):
         return timezone.now() > self.expires_at
@@ -90,11 +133,24 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     request_timestamp = models.DateTimeField(default=timezone.now)  # Track exact request time
+    # Set by shard writers, so a booking whose reply timed out can be looked up
+    request_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['train', 'status']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    @staticmethod
+    def price_for(seat_count):
+        """Return the total price of a booking for ``seat_count`` seats (500 per seat)."""
+        return seat_count * 500
 
     def save(self, *args, **kwargs):
         # Calculate total price if not set
         if not self.total_price:
-            self.total_price = self.seat_count * 500
+            self.total_price = self.price_for(self.seat_count)
         
         # Increment version on each save
         if self.id:
@@ -122,6 +178,89 @@ class Seat(models.Model):
     class Meta:
         unique_together = ('train', 'seat_number')
         ordering = ['seat_number']
+        indexes = [
+            models.Index(fields=['train', 'status', 'seat_number']),
+            # Orphaned-lock sweep in api.holds; only locked seats are indexed
+            models.Index(fields=['lock_expires_at'], condition=Q(status='LOCKED'), name='seat_locked_expiry_idx'),
+        ]
 
     def __str__(self):
         return f"Seat {self.seat_number} - {self.train.name} ({self.status})"
+
+class IdempotencyKey(models.Model):
+    """Stored response for a POST made with an Idempotency-Key header."""
+    scope = models.CharField(max_length=255)  # method, path and caller the key belongs to
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # null while in progress
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('scope', 'key')
+        indexes = [models.Index(fields=['expires_at'])]
+
+    def __str__(self):
+        return f"{self.key} ({self.scope})"
+
+class IdSequence(models.Model):
+    """Counter backing ID allocation on databases without native sequences."""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.last_value})"
+
+class WaitlistEntry(models.Model):
+    """A user's place in a train's FIFO waitlist."""
+    WAITLIST_STATUS = (
+        ('WAITING', 'Waiting'),
+        ('PROMOTED', 'Promoted'),
+        ('CANCELLED', 'Cancelled')
+    )
+
+    train = models.ForeignKey(Train, on_delete=models.CASCADE, related_name='waitlist')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    seat_count = models.PositiveIntegerField(default=1)
+    position = models.PositiveIntegerField()  # FIFO order within the train
+    status = models.CharField(max_length=10, choices=WAITLIST_STATUS, default='WAITING')
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('train', 'position')
+        indexes = [models.Index(fields=['train', 'status', 'position'])]
+
+    def __str__(self):
+        return f"Waitlist #{self.position} - {self.train.name} ({self.seat_count} seats, {self.status})"
+
+class BookingIntent(models.Model):
+    """A booking request admitted to the booking queue, processed by drain_booking_queue."""
+    INTENT_STATUS = (
+        ('QUEUED', 'Queued'),
+        ('PROCESSING', 'Processing'),
+        ('CONFIRMED', 'Confirmed'),
+        ('FAILED', 'Failed')
+    )
+
+    ticket = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    train = models.ForeignKey(Train, on_delete=models.CASCADE, related_name='booking_intents')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    seat_numbers = models.JSONField(default=list)  # empty when the server picks the seats
+    seat_count = models.PositiveIntegerField(default=1)
+    preferences = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=INTENT_STATUS, default='QUEUED')
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True)
+    error_type = models.CharField(max_length=30, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # when a worker took it
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['train', 'status', 'id'])]
+
+    def __str__(self):
+        return f"Intent {self.ticket} - {self.train.name} ({self.status})"
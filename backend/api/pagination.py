@@ -0,0 +1,66 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+# Page size bounds for keyset-paginated lists
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(Exception):
+    """Raised for a pagination cursor that was not issued by keyset_page."""
+
+
+def encode_cursor(created_at, pk):
+    """Return an opaque cursor pointing just past the given row."""
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return the (created_at, pk) a cursor points past.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of a queryset, newest first, by (created_at, id) keyset.
+
+    Unlike offset pagination each page is a range read on the created_at
+    index no matter how deep it is, and rows inserted while a client pages
+    through never shift or repeat entries on later pages.
+
+    Args:
+        queryset (QuerySet): Rows with a created_at field
+        cursor (str, optional): next_cursor of the previous page
+        limit (int): Rows per page
+
+    Returns:
+        tuple: (list of rows, next_cursor or None on the last page)
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # created_at <= c keeps the index range; ties are broken on id
+        queryset = queryset.filter(created_at__lte=created_at).exclude(
+            Q(created_at=created_at) & Q(id__gte=pk)
+        )
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].pk)
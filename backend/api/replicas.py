@@ -0,0 +1,92 @@
+import random
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+
+
+def _pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def pin_to_primary(user):
+    """Send the user's replica reads to the primary for REPLICA_PIN_SECONDS."""
+    if settings.REPLICA_DATABASES and settings.REPLICA_PIN_SECONDS > 0:
+        cache.set(_pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    """Return True if the user wrote recently enough to need primary reads."""
+    return bool(cache.get(_pin_key(user.pk)))
+
+
+def read_from_replica(view_method):
+    """
+    Let a read-only handler's queries go to a read replica.
+
+    One replica is picked per request, so its queries never mix replicas
+    that lag by different amounts. Users who wrote within the last REPLICA_PIN_SECONDS keep
+    reading from the primary, so they always see their own bookings and
+    cancellations. Without configured replicas this does nothing.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        replicas = settings.REPLICA_DATABASES
+        # Admin API-key requests carry no user at all
+        user = request.user
+        if not replicas or (user is not None and user.is_authenticated and is_pinned(user)):
+            return view_method(self, request, *args, **kwargs)
+
+        _state.alias = random.choice(replicas)
+        try:
+            return view_method(self, request, *args, **kwargs)
+        finally:
+            _state.alias = None
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Route reads inside read_from_replica handlers to that request's replica.
+
+    Everything else, all writes and migrations go to the primary. Reads made
+    inside a transaction on the primary stay there too, so a handler that
+    locks and releases expired holds reads back its own changes.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = getattr(_state, 'alias', None)
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """Pin users to the primary after any request that may have written."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF hands the authenticated user back to the Django request
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and user is not None and user.is_authenticated:
+            pin_to_primary(user)
+        return response
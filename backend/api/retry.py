@@ -0,0 +1,75 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+
+from .inventory import ConcurrentUpdate
+
+_retrying = threading.local()
+
+
+def run_with_retry(func, retry_on, attempts=3, backoff=0.02, max_backoff=0.2, deadline=1.0):
+    """
+    Call ``func`` until it succeeds, retrying on transient conflicts.
+
+    Waits between attempts use exponential backoff with full jitter, so
+    requests that collided once do not collide again in lockstep. Retries
+    stop after ``attempts`` calls or once the next wait would run past
+    ``deadline`` seconds from the first call, whichever comes first.
+
+    Args:
+        func (callable): Zero-argument callable, typically a whole transaction
+        retry_on (tuple): Exception classes that are worth retrying
+        attempts (int): Maximum number of calls
+        backoff (float): Upper bound of the first wait, in seconds
+        max_backoff (float): Cap on the upper bound of any wait, in seconds
+        deadline (float): Total time budget, in seconds
+
+    Returns:
+        The return value of ``func``
+
+    Raises:
+        The last exception raised by ``func`` when retries are exhausted
+    """
+    started = time.monotonic()
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except retry_on:
+            if attempt == attempts:
+                raise
+            delay = random.uniform(0, min(max_backoff, backoff * 2 ** (attempt - 1)))
+            if time.monotonic() - started + delay > deadline:
+                raise
+            time.sleep(delay)
+
+
+def retry_on_conflict(func):
+    """
+    Run a seat transaction under settings.BOOKING_RETRY.
+
+    Retries NOWAIT failures and deadlocks (OperationalError) and seat bitmaps
+    that kept changing (ConcurrentUpdate).
+
+    Calls nested inside another retry_on_conflict run ``func`` once and let
+    the conflict propagate: the outer call retries its whole transaction,
+    so no backoff wait happens while an enclosing transaction holds locks.
+    """
+    if getattr(_retrying, 'active', False):
+        return func()
+
+    retry = settings.BOOKING_RETRY
+    _retrying.active = True
+    try:
+        return run_with_retry(
+            func,
+            retry_on=(OperationalError, ConcurrentUpdate),
+            attempts=retry['ATTEMPTS'],
+            backoff=retry['BACKOFF'],
+            max_backoff=retry['MAX_BACKOFF'],
+            deadline=retry['DEADLINE'],
+        )
+    finally:
+        _retrying.active = False
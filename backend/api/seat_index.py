@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .allocation import NotEnoughSeats, SeatAllocator
+from .inventory import available_seat_numbers, load_bitmap, seat_changes_since, uses_bitmap
+from .models import Seat, Train
+
+_indexes = OrderedDict()  # train_id -> _SeatIndex, least recently used first
+_indexes_lock = threading.Lock()
+
+
+class _SeatIndex:
+    """A train's SeatAllocator and the inventory_version it reflects."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.allocator = None
+        self.version = None
+
+
+def _index_for(train_id):
+    with _indexes_lock:
+        index = _indexes.get(train_id)
+        if index is None:
+            index = _indexes[train_id] = _SeatIndex()
+        _indexes.move_to_end(train_id)
+        while len(_indexes) > settings.SEAT_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+        return index
+
+
+def forget_seat_index(train):
+    """Drop the train's cached index so the next allocation rebuilds it."""
+    with _indexes_lock:
+        _indexes.pop(train.pk, None)
+
+
+def _rebuild(index, train, version):
+    # The version is read before the seats, so the seats are never older
+    # than it and every later change is still ahead of it in the log
+    index.allocator = SeatAllocator(available_seat_numbers(train))
+    index.version = version
+
+
+def _catch_up(index, train, version):
+    """
+    Apply the seat changes logged since the index's version.
+
+    Returns:
+        bool: False if the log no longer covers them and a rebuild is needed
+    """
+    changed = seat_changes_since(Train(pk=train.pk, inventory_version=version), index.version)
+    if changed is None:
+        return False
+    if changed:
+        if uses_bitmap(train):
+            bitmap = load_bitmap(train)
+            statuses = [(n, bitmap.get(n)) for n in changed]
+        else:
+            statuses = Seat.objects.filter(train=train, seat_number__in=changed).values_list('seat_number', 'status')
+        available = [n for n, seat_status in statuses if seat_status == 'AVAILABLE']
+        index.allocator.take(changed)
+        index.allocator.release(available)
+    index.version = version
+    return True
+
+
+def allocate_seats(train, seat_count, together=False, preference=None):
+    """
+    Pick seats for a booking from the train's cached free-block index.
+
+    Each process keeps a SeatAllocator per train (the
+    settings.SEAT_INDEX_CACHE_SIZE most recently used), tagged with the
+    inventory_version it reflects. An allocation reads the current version
+    and brings the index up to date from the seat change log, re-reading
+    only the seats that changed, so its cost follows the seats booked and
+    released since the last allocation rather than the size of the train.
+    The index is rebuilt from a full read when the log no longer reaches
+    back to its version, or once when it cannot fit the group, in case seats
+    were freed without a version bump.
+
+    The picked seats are taken out of the index straight away, so concurrent
+    allocations in this process get different seats. Callers must call
+    forget_seat_index if they do not go on to book them.
+
+    Args:
+        train (Train): The train
+        seat_count (int): Number of seats wanted
+        together (bool): Keep the group in as few rows as possible
+        preference (str, optional): 'window' or 'aisle'
+
+    Returns:
+        list: Sorted seat numbers
+
+    Raises:
+        NotEnoughSeats: If the train cannot fit the group
+    """
+    index = _index_for(train.pk)
+    with index.lock:
+        fields = ['inventory_version']
+        if uses_bitmap(train):
+            fields.append('seat_bitmap')
+        row = Train.objects.values(*fields).get(pk=train.pk)
+        train.seat_bitmap = row.get('seat_bitmap', train.seat_bitmap)
+        version = row['inventory_version']
+
+        rebuilt = False
+        if index.allocator is None or not _catch_up(index, train, version):
+            _rebuild(index, train, version)
+            rebuilt = True
+        try:
+            return index.allocator.allocate(seat_count, together=together, preference=preference)
+        except NotEnoughSeats:
+            if rebuilt:
+                raise
+        _rebuild(index, train, version)
+        return index.allocator.allocate(seat_count, together=together, preference=preference)
@@ -124,6 +124,11 @@ class BookingDetailSerializer(serializers.ModelSerializer):
     arrival_time_at_destination = serializers.TimeField(source='train.arrival_time')
     no_of_seats = serializers.IntegerField(source='seat_count')
     total_price = serializers.SerializerMethodField()
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Every field above reads the train, its stations or the user
+        return queryset.select_related('train__source', 'train__destination', 'user')
     
     def get_total_price(self, obj):
         # Calculate total price (500 per seat)
@@ -0,0 +1,349 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signing import SignatureExpired, TimestampSigner
+from django.db import DatabaseError, close_old_connections
+
+from .allocation import NotEnoughSeats, SeatAllocator
+from .booking import book_best_seats, book_seats, book_seats_batch, plan_seats
+from .holds import release_expired_holds
+from .inventory import (
+    ConcurrentUpdate,
+    InvalidSeats,
+    SeatsUnavailable,
+    available_seat_numbers,
+)
+from .models import Train, User
+
+logger = logging.getLogger(__name__)
+
+
+class ShardUnavailable(Exception):
+    """Raised when the shard owning a train cannot be reached in time."""
+
+
+class ShardTimeout(ShardUnavailable):
+    """
+    Raised when a booking reached its shard but no reply came back in time.
+
+    The shard may still make the booking, so it must not be retried blindly;
+    ``request_id`` is stored on the booking if it is made (see
+    pending_booking_token).
+    """
+
+    def __init__(self, message, request_id):
+        super().__init__(message)
+        self.request_id = request_id
+
+
+def shard_addresses():
+    """Return the (host, port) of every configured shard writer."""
+    addresses = []
+    for shard in settings.BOOKING_SHARDS:
+        host, _, port = shard.rpartition(':')
+        addresses.append((host, int(port)))
+    return addresses
+
+
+def shard_index(train_id, shard_count):
+    """Return the shard owning a train; stable across processes and restarts."""
+    return zlib.crc32(str(train_id).encode()) % shard_count
+
+
+def _authkey():
+    # Shards unpickle what they receive, so never run them unauthenticated
+    if not settings.BOOKING_SHARD_AUTHKEY:
+        raise ImproperlyConfigured("BOOKING_SHARD_AUTHKEY must be set to use booking shards")
+    return settings.BOOKING_SHARD_AUTHKEY.encode()
+
+
+_client = threading.local()
+
+
+def submit_booking(train_id, user_id, seat_numbers=None, seat_count=None, preferences=None):
+    """
+    Send a booking to the shard writer that owns the train and wait for it.
+
+    Each web thread keeps one connection per shard open between requests.
+    Every booking carries a fresh request_id and a deadline
+    BOOKING_SHARD_REQUEST_TTL seconds out; the shard stores the request_id
+    on the booking, and drops the request unapplied once the deadline passes.
+
+    Args:
+        train_id (str): The train to book on
+        user_id (int): The passenger
+        seat_numbers (list, optional): Specific seats wanted
+        seat_count (int, optional): Number of seats for the shard to pick
+        preferences (dict, optional): 'together' and 'position' for seat_count requests
+
+    Returns:
+        dict: The shard's reply; 'ok' is True with booking_id, seat_numbers and
+            total_price, or False with error_type and message
+
+    Raises:
+        ShardTimeout: If the request was sent but no reply came within
+            BOOKING_SHARD_TIMEOUT seconds; the booking may still be made
+        ShardUnavailable: If the shard could not be reached, so nothing was sent
+    """
+    addresses = shard_addresses()
+    address = addresses[shard_index(train_id, len(addresses))]
+    connections = getattr(_client, 'connections', None)
+    if connections is None:
+        connections = _client.connections = {}
+
+    request_id = uuid.uuid4()
+    sent = False
+    try:
+        conn = connections.get(address)
+        if conn is None:
+            conn = connections[address] = Client(address, authkey=_authkey())
+        conn.send({
+            'train_id': train_id,
+            'user_id': user_id,
+            'seat_numbers': seat_numbers or [],
+            'seat_count': seat_count,
+            'preferences': preferences or {},
+            'request_id': request_id,
+            'deadline': time.time() + settings.BOOKING_SHARD_REQUEST_TTL,
+        })
+        sent = True
+        if conn.poll(settings.BOOKING_SHARD_TIMEOUT):
+            return conn.recv()
+        error = f"Shard {address[0]}:{address[1]} did not reply in time"
+    except (OSError, EOFError) as e:
+        error = f"Shard {address[0]}:{address[1]} is unavailable: {e}"
+
+    # The connection may still get a late reply; never reuse it
+    conn = connections.pop(address, None)
+    if conn is not None:
+        conn.close()
+    if sent:
+        raise ShardTimeout(error, request_id)
+    raise ShardUnavailable(error)
+
+
+def _pending_signer():
+    return TimestampSigner(salt='api.sharding.pending')
+
+
+def pending_booking_token(request_id):
+    """Return a token the client can poll with for a booking that timed out."""
+    return _pending_signer().sign(str(request_id))
+
+
+def read_pending_booking_token(token):
+    """
+    Decode a pending_booking_token.
+
+    Returns:
+        tuple: (request_id, settled); settled is True once the shard can no
+            longer make the booking, so its absence means it was not made
+
+    Raises:
+        BadSignature: If the token was not issued by pending_booking_token
+    """
+    signer = _pending_signer()
+    request_id = signer.unsign(token)
+    # Leave the shard a reply timeout beyond its deadline to commit
+    try:
+        signer.unsign(token, max_age=settings.BOOKING_SHARD_REQUEST_TTL + settings.BOOKING_SHARD_TIMEOUT)
+    except SignatureExpired:
+        return request_id, True
+    return request_id, False
+
+
+def _error(error_type, message, **extra):
+    return {'ok': False, 'error_type': error_type, 'message': message, **extra}
+
+
+def _confirmed(booking):
+    return {
+        'ok': True,
+        'booking_id': booking.id,
+        'seat_numbers': booking.seat_numbers,
+        'total_price': booking.total_price,
+    }
+
+
+class ShardWriter:
+    """
+    Single writer for the trains of one shard.
+
+    Connection threads only enqueue requests; one writer thread applies them
+    in arrival order. It keeps each train's free seats in memory so requests
+    are checked and seats are picked without reading the database, and it
+    commits every train's share of a batch in one transaction.
+
+    Other paths (holds, cancellations, the waitlist) still change seats
+    directly in the database, so the in-memory view can go stale. Whenever it
+    rejects a request it is reloaded once before the rejection stands, and a
+    batch that fails to commit is replayed one booking at a time.
+    """
+
+    def __init__(self, address, batch_size=64, window=0.002):
+        self.address = address
+        self.batch_size = batch_size
+        self.window = window
+        self.requests = queue.Queue()
+        self.free_seats = {}  # train_id -> SeatAllocator over the available seats
+
+    def serve_forever(self):
+        listener = Listener(self.address, authkey=_authkey())
+        threading.Thread(target=self._write_loop, daemon=True).start()
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                logger.warning("Rejected shard connection: %s", e)
+                continue
+            threading.Thread(target=self._read_loop, args=(conn,), daemon=True).start()
+
+    def _read_loop(self, conn):
+        try:
+            while True:
+                self.requests.put((conn.recv(), conn))
+        except (EOFError, OSError):
+            conn.close()
+
+    def _next_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.requests.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            by_train = defaultdict(list)
+            for request, conn in batch:
+                by_train[request['train_id']].append((request, conn))
+
+            for train_id, items in by_train.items():
+                try:
+                    replies = self.apply(train_id, [request for request, _ in items])
+                except Exception:
+                    logger.exception("Shard writer failed on train %s", train_id)
+                    self.free_seats.pop(train_id, None)
+                    replies = [_error('concurrent_booking', "The booking could not be completed. Please retry.")] * len(items)
+                for (_, conn), reply in zip(items, replies):
+                    try:
+                        conn.send(reply)
+                    except OSError:
+                        pass
+
+    def _load_free_seats(self, train):
+        self.free_seats[train.pk] = SeatAllocator(available_seat_numbers(train))
+        return self.free_seats[train.pk]
+
+    def apply(self, train_id, requests):
+        """
+        Book a batch of requests for one train.
+
+        Returns:
+            list: One reply per request, in order
+        """
+        try:
+            train = Train.objects.get(pk=train_id)
+        except Train.DoesNotExist:
+            return [_error('not_found', "Train not found.")] * len(requests)
+
+        if release_expired_holds(train):
+            self.free_seats.pop(train_id, None)
+        free = self.free_seats.get(train_id)
+        if free is None:
+            free = self._load_free_seats(train)
+
+        replies = [None] * len(requests)
+        plans = []
+        reloaded = False
+        now = time.time()
+        for i, request in enumerate(requests):
+            if request.get('deadline', now) < now:
+                # The caller has reported the booking as not made
+                replies[i] = _error('expired', "The booking request expired before it could be processed.")
+                continue
+            while True:
+                try:
+                    seat_numbers = plan_seats(
+                        train,
+                        free,
+                        seat_numbers=request['seat_numbers'],
+                        seat_count=request['seat_count'],
+                        together=bool(request['preferences'].get('together')),
+                        preference=request['preferences'].get('position')
+                    )
+                    break
+                except (NotEnoughSeats, SeatsUnavailable) as e:
+                    if reloaded:
+                        replies[i] = self._rejection(e)
+                        seat_numbers = None
+                        break
+                    # Seats may have been freed behind our back; look again once per batch
+                    reloaded = True
+                    free = self._load_free_seats(train)
+                    free.take([n for _, seats in plans for n in seats])
+                except InvalidSeats as e:
+                    replies[i] = _error('invalid_seats', str(e))
+                    seat_numbers = None
+                    break
+            if seat_numbers is not None:
+                plans.append((i, seat_numbers))
+
+        if not plans:
+            return replies
+
+        try:
+            bookings = book_seats_batch(
+                train,
+                [(requests[i]['user_id'], seat_numbers) for i, seat_numbers in plans],
+                request_ids=[requests[i].get('request_id') for i, _ in plans]
+            )
+            for (i, _), booking in zip(plans, bookings):
+                replies[i] = _confirmed(booking)
+        except (InvalidSeats, SeatsUnavailable, DatabaseError, ConcurrentUpdate):
+            # The in-memory view was stale; replay the batch one booking at a time
+            self.free_seats.pop(train_id, None)
+            for i, _ in plans:
+                replies[i] = self._book_one(train, requests[i])
+        return replies
+
+    def _book_one(self, train, request):
+        user = User(pk=request['user_id'])
+        preferences = request['preferences']
+        try:
+            if request['seat_numbers']:
+                booking = book_seats(user, train, request['seat_numbers'], request_id=request.get('request_id'))
+            else:
+                booking = book_best_seats(
+                    user,
+                    train,
+                    request['seat_count'],
+                    together=bool(preferences.get('together')),
+                    preference=preferences.get('position'),
+                    request_id=request.get('request_id')
+                )
+        except InvalidSeats as e:
+            return _error('invalid_seats', str(e))
+        except (NotEnoughSeats, SeatsUnavailable) as e:
+            return self._rejection(e)
+        except (DatabaseError, ConcurrentUpdate):
+            return _error('concurrent_booking', "The seats could not be booked right now. Please retry.")
+        return _confirmed(booking)
+
+    def _rejection(self, error):
+        if isinstance(error, NotEnoughSeats):
+            return _error('not_enough_seats', str(error))
+        return _error('seats_taken', "Some selected seats are not available.", unavailable_seats=error.seat_numbers)
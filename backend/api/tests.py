@@ -1,3 +1,1613 @@
-from django.test import TestCase
+import json
+import os
+import random
+import re
+import runpy
+import tempfile
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from irctc_backend import settings as project_settings
+
+from . import ids
+from .allocation import NotEnoughSeats, SeatAllocator
+from .batch_booking import book_batch
+from .booking import book_seats
+from .booking_queue import claim_intents, drain_train, process_intent, requeue_stale_intents
+from .cancellation import cancel_bookings
+from . import group_commit
+from .group_commit import _PendingBooking, _commit_batch, book_coalesced
+from .holds import confirm_hold, hold_seats, reap_expired_holds, release_expired_holds, release_hold
+from .inventory import (
+    ConcurrentUpdate,
+    InvalidSeats,
+    SeatsUnavailable,
+    compute_seat_counters,
+    initial_seat_bitmap,
+    reserve_seats,
+)
+from .models import Booking, BookingIntent, IdempotencyKey, Seat, SeatChange, SeatLock, Station, Train, User, WaitlistEntry
+from .renderers import ORJSONRenderer
+from .replicas import ReplicaRouter, pin_to_primary, read_from_replica
+from .retry import retry_on_conflict, run_with_retry
+from .seat_index import allocate_seats, forget_seat_index
+from .sharding import ShardTimeout, ShardWriter
+
+SEED_TRAINS = 50
+SEED_SEATS_PER_TRAIN = 60
+
+
+def make_train(name='Express', total_seats=12, backend='rows'):
+    """Create a train between two test stations, stored with the given seat backend."""
+    source, _ = Station.objects.get_or_create(
+        station_code='SRC', defaults={'station_name': 'Alpha', 'city': 'Alpha', 'state': 'State'}
+    )
+    destination, _ = Station.objects.get_or_create(
+        station_code='DST', defaults={'station_name': 'Beta', 'city': 'Beta', 'state': 'State'}
+    )
+    train = Train.objects.create(
+        name=name,
+        source=source,
+        destination=destination,
+        total_seats=total_seats,
+        seat_bitmap=initial_seat_bitmap(total_seats, backend)
+    )
+    # Outside PostgreSQL the ID sequence rolls back with each test, so an
+    # earlier test's train may have left a seat index under the same train_id
+    forget_seat_index(train)
+    return train
+
+
+def auth_headers(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are only checked on PostgreSQL')
+class HotQueryPlanTests(TestCase):
+    """
+    EXPLAIN the hot queries behind the booking views and fail on a sequential scan.
+
+    Sequential scans are disabled for each check, so the planner only falls
+    back to one when no index can serve the query at all. That makes the
+    checks independent of how many rows the seed data has.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        stations = Station.objects.bulk_create([
+            Station(station_code=f"S{i:04d}", station_name=f"Station {i}", city="City", state="State")
+            for i in range(200)
+        ])
+        trains = Train.objects.bulk_create([
+            Train(
+                train_id=f"T{i:04d}",
+                name=f"Train {i}",
+                source=stations[i % 100],
+                destination=stations[100 + i % 100],
+                total_seats=SEED_SEATS_PER_TRAIN,
+                seats_available=SEED_SEATS_PER_TRAIN
+            )
+            for i in range(SEED_TRAINS)
+        ])
+        cls.user = User.objects.create_user('planner', 'planner@example.com', 'password')
+        cls.train = trains[0]
+        bookings = Booking.objects.bulk_create([
+            Booking(user=cls.user, train=train, seat_count=1, seat_numbers=[1], status='CONFIRMED')
+            for train in trains
+        ])
+        Seat.objects.bulk_create([
+            Seat(
+                train=train,
+                seat_number=seat_number,
+                status='BOOKED' if seat_number == 1 else 'AVAILABLE',
+                booking=booking if seat_number == 1 else None
+            )
+            for train, booking in zip(trains, bookings)
+            for seat_number in range(1, SEED_SEATS_PER_TRAIN + 1)
+        ])
+        SeatLock.objects.create(
+            train=cls.train,
+            seat_number=2,
+            user=cls.user,
+            expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, table):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertNotIn(f"Seq Scan on {table}", plan, plan)
+
+    def test_available_seats(self):
+        # inventory.available_seat_numbers, used by booking, holds and the allocator
+        self.assertUsesIndex(
+            Seat.objects.filter(train=self.train, status='AVAILABLE').order_by('seat_number').values_list('seat_number'),
+            'api_seat'
+        )
+
+    def test_seat_matrix(self):
+        # inventory.seat_statuses, used by BookSeatView.get and SeatMatrixView
+        self.assertUsesIndex(
+            Seat.objects.filter(train=self.train).order_by('seat_number').values_list('seat_number', 'status'),
+            'api_seat'
+        )
+
+    def test_seat_changes_since(self):
+        # inventory.seat_changes_since, used by SeatMatrixChangesView
+        self.assertUsesIndex(
+            SeatChange.objects.filter(train=self.train, version__gt=0, version__lte=10).values_list('seat_numbers'),
+            'api_seatchange'
+        )
+
+    def test_orphaned_locked_seats(self):
+        # holds.reap_expired_holds
+        self.assertUsesIndex(
+            Seat.objects.filter(status='LOCKED', lock_expires_at__lte=timezone.now()),
+            'api_seat'
+        )
+
+    def test_users_bookings_on_train(self):
+        # BookSeatView.get and SeatMatrixView mark the user's own seats
+        self.assertUsesIndex(
+            Booking.objects.filter(train=self.train, user=self.user, status='CONFIRMED').values_list('seat_numbers'),
+            'api_booking'
+        )
+
+    def test_user_booking_history(self):
+        # UserBookingsView
+        self.assertUsesIndex(
+            Booking.objects.filter(user=self.user).order_by('-created_at'),
+            'api_booking'
+        )
+
+    def test_user_booking_history_page(self):
+        # UserBookingsView with ?cursor=
+        created_at = timezone.now()
+        self.assertUsesIndex(
+            Booking.objects.filter(user=self.user, created_at__lte=created_at).exclude(
+                created_at=created_at, id__gte=100
+            ).order_by('-created_at', '-id')[:21],
+            'api_booking'
+        )
+
+    def test_expired_seat_locks(self):
+        # holds.reap_expired_holds
+        self.assertUsesIndex(
+            SeatLock.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at'),
+            'api_seatlock'
+        )
+
+    def test_station_name_lookup(self):
+        # TrainAvailabilityView
+        self.assertUsesIndex(
+            Station.objects.filter(station_name__iexact='station 7'),
+            'api_station'
+        )
+
+    def test_trains_between_stations(self):
+        # TrainAvailabilityView
+        self.assertUsesIndex(
+            Train.objects.filter(source_id=self.train.source_id, destination_id=self.train.destination_id),
+            'api_train'
+        )
+
+    def test_waitlist_head(self):
+        # waitlist.promote_waitlist
+        self.assertUsesIndex(
+            WaitlistEntry.objects.filter(train=self.train, status='WAITING').order_by('position'),
+            'api_waitlistentry'
+        )
+
+    def test_booking_queue_head(self):
+        # booking_queue.claim_intents
+        self.assertUsesIndex(
+            BookingIntent.objects.filter(train=self.train, status='QUEUED').order_by('id'),
+            'api_bookingintent'
+        )
+
+
+@override_settings(REPLICA_DATABASES=['replica_0'], REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Route decisions only; no replica database has to exist."""
+
+    router = ReplicaRouter()
+
+    def setUp(self):
+        cache.clear()
+
+    def read_alias(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+
+        class View:
+            @read_from_replica
+            def get(view, request):
+                return self.router.db_for_read(Train), self.router.db_for_write(Train)
+
+        return View().get(request)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.read_alias(AnonymousUser()), ('replica_0', 'default'))
+
+    def test_recent_writer_reads_from_primary(self):
+        user = User(pk=1)
+        pin_to_primary(user)
+        self.assertEqual(self.read_alias(user), ('default', 'default'))
+        self.assertEqual(self.read_alias(User(pk=2)), ('replica_0', 'default'))
+
+    def test_reads_outside_marked_views_use_primary(self):
+        self.read_alias(AnonymousUser())
+        self.assertEqual(self.router.db_for_read(Train), 'default')
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_replicas_configured(self):
+        self.assertEqual(self.read_alias(AnonymousUser()), ('default', 'default'))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Connection pooling is only configured for PostgreSQL')
+class DatabasePoolSettingsTests(TestCase):
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(project_settings.__file__)['DATABASES']['default']
+
+    def test_pool_options_are_wired(self):
+        plain = self.load_settings(DB_POOL='false', DB_CONN_MAX_AGE='30')
+        self.assertEqual((plain['CONN_MAX_AGE'], plain['OPTIONS']), (30, {}))
+        self.assertTrue(plain['CONN_HEALTH_CHECKS'])
+
+        pooled = self.load_settings(DB_POOL='true', DB_POOL_MIN_SIZE='1', DB_POOL_MAX_SIZE='3', DB_POOL_TIMEOUT='2')
+        self.assertEqual(pooled['CONN_MAX_AGE'], 0)
+        self.assertEqual(pooled['OPTIONS']['pool'], {
+            'min_size': 1, 'max_size': 3, 'max_lifetime': 30 * 60, 'timeout': 2,
+        })
+
+        # The pooled settings open a working pool against the test database
+        wrapper = type(connections['default'])(
+            {**connection.settings_dict, 'CONN_MAX_AGE': pooled['CONN_MAX_AGE'], 'OPTIONS': pooled['OPTIONS']},
+            alias='pool_check'
+        )
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            self.assertIsNotNone(wrapper.pool)
+            self.assertEqual((wrapper.pool.min_size, wrapper.pool.max_size), (1, 3))
+        finally:
+            wrapper.close()
+            wrapper.close_pool()
+
+
+@override_settings(ADMIN_API_KEY='test-admin-key')
+class ImportTimetableTests(TestCase):
+    admin_headers = {'HTTP_AUTHORIZATION': 'Api-Key test-admin-key'}
+
+    def import_csv(self, content):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as csv_file:
+            csv_file.write(content)
+        try:
+            call_command('import_timetable', path, stdout=StringIO(), stderr=StringIO())
+        finally:
+            os.remove(path)
+
+    def create_train(self, name):
+        return self.client.post('/api/trains/create', {
+            'train_name': name,
+            'source': 'Alpha',
+            'destination': 'Beta',
+            'seat_capacity': 12,
+            'arrival_time_at_source': '10:00:00',
+            'arrival_time_at_destination': '12:00:00'
+        }, content_type='application/json', **self.admin_headers)
+
+    def test_explicit_ids_are_not_handed_out_again(self):
+        self.import_csv(
+            'train_id,name,total_seats,departure_time,arrival_time,source,destination\n'
+            'T0005,Imported Express,12,08:00:00,10:00:00,Alpha,Beta\n'
+            ',Imported Mail,12,09:00:00,11:00:00,Alpha,Beta\n'
+        )
+        self.assertTrue(Train.objects.filter(train_id='T0005').exists())
+
+        created = []
+        for i in range(5):
+            response = self.create_train(f'Created {i}')
+            self.assertEqual(response.status_code, 201, response.content)
+            created.append(response.json()['train_id'])
+        self.assertNotIn('T0005', created)
+        self.assertEqual(Train.objects.count(), 7)
+
+    def created_id(self, name):
+        response = self.create_train(name)
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['train_id']
+
+    @override_settings(TRAIN_ID_BLOCK_SIZE=10)
+    def test_import_drops_reserved_ids_it_overtakes(self):
+        ids._block.clear()
+        first = ids.parse_train_id(self.created_id('Created 0'))
+        reserved = ids.format_train_id(first + 1)
+        self.import_csv(
+            'train_id,name,total_seats,departure_time,arrival_time,source,destination\n'
+            f'{reserved},Imported Express,12,08:00:00,10:00:00,Alpha,Beta\n'
+        )
+        self.assertEqual(ids.parse_train_id(self.created_id('Created 1')), first + 2)
+        self.assertEqual(Train.objects.get(train_id=reserved).name, 'Imported Express')
+
+    @override_settings(TRAIN_ID_BLOCK_SIZE=10)
+    def test_reserved_id_taken_elsewhere_is_skipped(self):
+        ids._block.clear()
+        first = self.created_id('Created 0')
+        # An import in another process cannot drop this process's reserved IDs
+        reserved = ids.format_train_id(ids.parse_train_id(first) + 1)
+        created = Train.objects.get(train_id=first)
+        Train.objects.create(
+            train_id=reserved,
+            name='Imported Express',
+            source=created.source,
+            destination=created.destination,
+            total_seats=12
+        )
+        self.assertNotEqual(self.created_id('Created 1'), reserved)
+        self.assertEqual(Train.objects.get(train_id=reserved).name, 'Imported Express')
+
+    def test_ids_grow_past_four_digits(self):
+        ids.advance_sequence(9999)
+        self.assertEqual(self.created_id('Created 0'), 'T10000')
+        self.import_csv(
+            'train_id,name,total_seats,departure_time,arrival_time,source,destination\n'
+            'T10005,Imported Express,12,08:00:00,10:00:00,Alpha,Beta\n'
+        )
+        self.assertEqual(self.created_id('Created 1'), 'T10006')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Concurrent creation needs PostgreSQL')
+@override_settings(TRAIN_ID_BLOCK_SIZE=5)
+class ConcurrentTrainIdTests(TransactionTestCase):
+    def test_concurrent_creation_never_reuses_an_id(self):
+        ids._block.clear()
+        template = make_train('Template')
+        created = []
+
+        def create_trains(worker):
+            try:
+                for i in range(10):
+                    created.append(make_train(f'Worker {worker} {i}').train_id)
+                    if worker == 0 and i == 3:
+                        # An import running alongside, taking numbers explicitly
+                        ids.advance_sequence(ids.parse_train_id(template.train_id) + 20)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=create_trains, args=(n,)) for n in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(created), 40)
+        self.assertEqual(len(set(created)), 40)
+        self.assertEqual(Train.objects.count(), 41)
+
+
+class RepairSeatCountersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('repairer', 'repairer@example.com', 'password')
+        self.rows = make_train('Rows', total_seats=8)
+        self.bitmap = make_train('Bitmap', total_seats=8, backend='bitmap')
+        self.clean = make_train('Clean', total_seats=8)
+        for train in (self.rows, self.bitmap):
+            book_seats(self.user, train, [1, 2, 3])
+            hold_seats(self.user, train, [4])
+
+    def corrupt(self):
+        Train.objects.filter(pk__in=[self.rows.pk, self.bitmap.pk]).update(
+            seats_available=99, seats_booked=0, seats_locked=5
+        )
+
+    def counters(self, train):
+        train.refresh_from_db()
+        return train.seats_available, train.seats_booked, train.seats_locked
+
+    def test_counters_are_recomputed_from_the_inventory(self):
+        self.corrupt()
+        versions = dict(Train.objects.values_list('pk', 'inventory_version'))
+        out = StringIO()
+        call_command('repair_seat_counters', '--batch-size', '1', stdout=out)
+
+        self.assertEqual(compute_seat_counters(Train.objects.all()), [])
+        for train in (self.rows, self.bitmap):
+            self.assertEqual(self.counters(train), (4, 3, 1))
+            self.assertEqual(train.inventory_version, versions[train.pk] + 1)
+        self.clean.refresh_from_db()
+        self.assertEqual(self.clean.inventory_version, versions[self.clean.pk])
+        self.assertIn('Repaired 2 of 3 trains', out.getvalue())
+
+    def test_dry_run_only_reports(self):
+        self.corrupt()
+        out = StringIO()
+        call_command('repair_seat_counters', self.rows.pk, '--dry-run', stdout=out)
+        self.assertIn('Found 1 of 1 trains', out.getvalue())
+        self.assertEqual(self.counters(self.rows), (99, 0, 5))
+
+
+class TrainAvailabilityTests(TestCase):
+    url = '/api/trains/availability?source=Alpha&destination=Beta'
+
+    def setUp(self):
+        self.user = User.objects.create_user('searcher', 'searcher@example.com', 'password')
+
+    def test_listing_costs_the_same_queries_for_any_number_of_trains(self):
+        trains = [make_train('First', total_seats=8)]
+        # Two station lookups and one query for the trains with their stations
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()), 1)
+
+        for i in range(5):
+            trains.append(make_train(f'Train {i}', total_seats=8, backend='bitmap' if i % 2 else 'rows'))
+            book_seats(self.user, trains[-1], list(range(1, i + 2)))
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        available = {row['train_id']: row['available_seats'] for row in response.json()}
+        self.assertEqual(available, {
+            train.train_id: 8 - i for i, train in enumerate(trains)
+        })
+
+
+class LazySeatTests(TestCase):
+    def setUp(self):
+        self.train = make_train(total_seats=8)
+        self.user = User.objects.create_user('lazy', 'lazy@example.com', 'password')
+
+    def test_seat_matrix_read_does_not_create_seats(self):
+        response = self.client.get(f'/api/trains/{self.train.train_id}/seats')
+        self.assertEqual(response.status_code, 200)
+        statuses = [seat['status'] for row in response.json()['seat_matrix'] for seat in row]
+        self.assertEqual(statuses, ['AVAILABLE'] * 8)
+        self.train.refresh_from_db()
+        self.assertFalse(self.train.seats_materialized)
+        self.assertFalse(Seat.objects.filter(train=self.train).exists())
+
+    def test_first_booking_creates_seats(self):
+        book_seats(self.user, self.train, [2, 3])
+        self.assertEqual(Seat.objects.filter(train=self.train).count(), 8)
+        self.assertEqual(
+            list(Seat.objects.filter(train=self.train, status='BOOKED').values_list('seat_number', flat=True)),
+            [2, 3]
+        )
+        response = self.client.get(f'/api/trains/{self.train.train_id}/seats')
+        booked = [seat['seat_number'] for row in response.json()['seat_matrix'] for seat in row if seat['is_booked']]
+        self.assertEqual(booked, [2, 3])
+
+    @override_settings(SEAT_CLAIM_MODE='conditional')
+    def test_failed_first_claim_does_not_strand_the_instance(self):
+        # The rows created by the failed claim roll back with it
+        results = book_batch(self.user, [
+            {'train': self.train, 'seat_numbers': [99]},
+            {'train': self.train, 'seat_numbers': [1]},
+            {'train': self.train, 'seat_count': 2},
+        ], mode='per_item')
+        self.assertIsInstance(results[0], InvalidSeats)
+        self.assertEqual(results[1].seat_numbers, [1])
+        self.assertEqual(len(results[2].seat_numbers), 2)
+        self.assertEqual(Seat.objects.filter(train=self.train).count(), 8)
+        self.assertEqual(Seat.objects.filter(train=self.train, status='BOOKED').count(), 3)
+
+
+class LapsedHoldReadTests(TestCase):
+    """Seat reads show lapsed holds as available without releasing them."""
+
+    def setUp(self):
+        self.train = make_train(total_seats=6)
+        self.user = User.objects.create_user('holder', 'holder@example.com', 'password')
+        hold_seats(self.user, self.train, [1, 2])
+        SeatLock.objects.filter(train=self.train).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_reads_do_not_write(self):
+        urls = [
+            f'/api/trains/{self.train.train_id}',
+            f'/api/trains/{self.train.train_id}/seats',
+            f'/api/trains/{self.train.train_id}/seats/changes?since=0',
+        ]
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.json()['available_seats'], 6, url)
+            for query in queries:
+                sql = query['sql'].upper()
+                self.assertTrue(sql.startswith('SELECT') and 'FOR UPDATE' not in sql, (url, sql))
+
+        self.assertEqual(SeatLock.objects.filter(train=self.train).count(), 2)
+        self.assertEqual(Seat.objects.filter(train=self.train, status='LOCKED').count(), 2)
+
+    def test_lapsed_holds_show_as_available(self):
+        response = self.client.get(f'/api/trains/{self.train.train_id}/seats')
+        statuses = [seat['status'] for row in response.json()['seat_matrix'] for seat in row]
+        self.assertEqual(statuses, ['AVAILABLE'] * 6)
+
+
+class SeatAllocatorTests(SimpleTestCase):
+    def test_together_prefers_a_row_with_adjacent_seats(self):
+        # Row 1 has five free seats but no four side by side; row 2 is empty
+        available = [2, 3, 4, 6] + list(range(7, 13))
+        for _ in range(20):
+            seats = SeatAllocator(available).allocate(4, together=True)
+            self.assertEqual(seats, list(range(seats[0], seats[0] + 4)))
+            self.assertTrue(all(7 <= seat <= 12 for seat in seats), seats)
+
+    def test_together_falls_back_to_one_row(self):
+        seats = SeatAllocator([1, 3, 5, 8, 10, 12]).allocate(3, together=True)
+        self.assertEqual(len({(seat - 1) // 6 for seat in seats}), 1, seats)
+
+    def test_window_preference(self):
+        seats = SeatAllocator(range(1, 13)).allocate(1, preference='window')
+        self.assertIn((seats[0] - 1) % 6, (0, 5))
+
+    def test_allocations_do_not_overlap(self):
+        allocator = SeatAllocator(range(1, 13))
+        first = allocator.allocate(5, together=True)
+        second = allocator.allocate(7)
+        self.assertEqual(sorted(first + second), list(range(1, 13)))
+        with self.assertRaises(NotEnoughSeats):
+            allocator.allocate(1)
+
+    def test_take_and_release_refile_rows(self):
+        allocator = SeatAllocator(range(1, 13))
+        allocator.take([1, 2, 3, 4, 5, 7, 8, 9, 10, 11, 12, 13])
+        self.assertTrue(allocator.is_free(6))
+        self.assertFalse(allocator.is_free(7))
+        with self.assertRaises(NotEnoughSeats):
+            allocator.allocate(2)
+        allocator.release([9, 10, 6])
+        self.assertEqual(allocator.allocate(2, together=True), [9, 10])
+        self.assertEqual(allocator.allocate(1), [6])
+
+
+class RetryTests(SimpleTestCase):
+    def failing(self, *errors):
+        calls = []
+
+        def func():
+            calls.append(None)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return 'done'
+        return func, calls
+
+    def test_attempts_are_capped(self):
+        func, calls = self.failing(*[OperationalError('deadlock detected')] * 5)
+        with mock.patch('api.retry.time.sleep') as sleep:
+            with self.assertRaises(OperationalError):
+                run_with_retry(func, retry_on=(OperationalError,), attempts=4, deadline=60)
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(sleep.call_count, 3)
+
+    @override_settings(BOOKING_RETRY={'ATTEMPTS': 3, 'BACKOFF': 0.01, 'MAX_BACKOFF': 0.01, 'DEADLINE': 60})
+    def test_only_conflicts_are_retried(self):
+        func, calls = self.failing(ConcurrentUpdate('bitmap changed'), OperationalError('could not obtain lock'))
+        with mock.patch('api.retry.time.sleep'):
+            self.assertEqual(retry_on_conflict(func), 'done')
+        self.assertEqual(len(calls), 3)
+
+        for error in (IntegrityError('duplicate key'), SeatsUnavailable([1])):
+            func, calls = self.failing(error)
+            with mock.patch('api.retry.time.sleep') as sleep:
+                with self.assertRaises(type(error)):
+                    retry_on_conflict(func)
+            self.assertEqual(len(calls), 1)
+            sleep.assert_not_called()
+
+    def test_jitter_stays_within_the_backoff_bounds(self):
+        bounds = [0.02, 0.04, 0.05, 0.05, 0.05]
+        for uniform in (lambda low, high: high, random.uniform):
+            func, calls = self.failing(*[OperationalError('deadlock detected')] * 5)
+            with mock.patch('api.retry.random.uniform', side_effect=uniform) as jitter, \
+                    mock.patch('api.retry.time.sleep') as sleep:
+                run_with_retry(
+                    func, retry_on=(OperationalError,), attempts=6, backoff=0.02, max_backoff=0.05, deadline=60
+                )
+            self.assertEqual([call.args for call in jitter.call_args_list], [(0, bound) for bound in bounds])
+            delays = [call.args[0] for call in sleep.call_args_list]
+            self.assertEqual(len(delays), 5)
+            for delay, bound in zip(delays, bounds):
+                self.assertTrue(0 <= delay <= bound, (delay, bound))
+
+    def test_a_wait_past_the_deadline_is_not_taken(self):
+        func, calls = self.failing(*[OperationalError('deadlock detected')] * 5)
+        with mock.patch('api.retry.random.uniform', side_effect=lambda low, high: high), \
+                mock.patch('api.retry.time.sleep') as sleep:
+            with self.assertRaises(OperationalError):
+                run_with_retry(func, retry_on=(OperationalError,), attempts=6, backoff=0.02, deadline=0.03)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(sleep.call_count, 1)
+
+
+class SeatIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('indexer', 'indexer@example.com', 'password')
+
+    def check_catches_up_from_change_log(self, backend):
+        train = make_train(total_seats=12, backend=backend)
+        first = allocate_seats(train, 6, together=True)
+        book_seats(self.user, train, first)
+        # Another booking and its cancellation, behind the index's back
+        free = sorted(set(range(1, 13)) - set(first))
+        other = book_seats(self.user, train, free[:2])
+        cancel_bookings(Booking.objects.filter(pk=other.pk))
+        book_seats(self.user, train, [free[0]])
+
+        with mock.patch('api.seat_index.available_seat_numbers', side_effect=AssertionError("index rebuilt")):
+            picked = allocate_seats(train, 5)
+        self.assertEqual(picked, free[1:])
+
+    def test_rows_index_catches_up_from_change_log(self):
+        self.check_catches_up_from_change_log('rows')
+
+    def test_bitmap_index_catches_up_from_change_log(self):
+        self.check_catches_up_from_change_log('bitmap')
+
+    def test_rebuilds_when_change_log_is_trimmed(self):
+        train = make_train(total_seats=12)
+        first = allocate_seats(train, 2)
+        book_seats(self.user, train, first)
+        free = sorted(set(range(1, 13)) - set(first))
+        SeatChange.objects.filter(train=train).delete()
+        book_seats(self.user, train, [free[-1]])
+        self.assertEqual(allocate_seats(train, 9), free[:-1])
+
+
+class BatchBookingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('batcher', 'batcher@example.com', 'password')
+        self.first = make_train('First', total_seats=12)
+        self.second = make_train('Second', total_seats=12, backend='bitmap')
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        book_seats(other, self.second, [5])
+
+    def post_batch(self, mode, second_seats):
+        # 'conditional' mode moves the counters once the booking commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/bookings/batch', {
+                'mode': mode,
+                'items': [
+                    {'train_id': self.first.train_id, 'seat_count': 2},
+                    {'train_id': self.second.train_id, 'seat_numbers': second_seats},
+                ]
+            }, content_type='application/json', **auth_headers(self.user))
+
+    def assertCountersConsistent(self):
+        self.assertEqual(compute_seat_counters(Train.objects.all()), [])
+
+    def test_atomic_books_every_item(self):
+        response = self.post_batch('atomic', [1, 2, 3])
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual([item['status'] for item in data['results']], ['CONFIRMED', 'CONFIRMED'])
+        self.assertEqual(data['results'][1]['seat_numbers'], [1, 2, 3])
+        self.assertEqual(data['total_price'], Booking.price_for(5))
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 2)
+        self.assertCountersConsistent()
+
+    @override_settings(SEAT_CLAIM_MODE='conditional')
+    def test_atomic_books_every_item_without_train_locks(self):
+        self.assertEqual(self.post_batch('atomic', [1, 2, 3]).status_code, 201)
+        self.assertCountersConsistent()
+
+    def test_atomic_books_nothing_when_an_item_fails(self):
+        response = self.post_batch('atomic', [4, 5])
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertEqual(response.json()['failed_item'], 1)
+        self.assertEqual(response.json()['error_type'], 'seats_taken')
+        self.assertFalse(Booking.objects.filter(user=self.user).exists())
+        self.assertCountersConsistent()
+
+    def test_per_item_reports_each_item(self):
+        response = self.post_batch('per_item', [4, 5])
+        self.assertEqual(response.status_code, 207, response.content)
+        results = response.json()['results']
+        self.assertEqual(results[0]['status'], 'CONFIRMED')
+        self.assertEqual(results[1]['status'], 'FAILED')
+        self.assertEqual(results[1]['unavailable_seats'], [5])
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 1)
+        self.assertCountersConsistent()
+
+
+@override_settings(ADMIN_API_KEY='test-admin-key', SEAT_INVENTORY_BACKEND='bitmap')
+class AdminTrainCreateTests(TestCase):
+    admin_headers = {'HTTP_AUTHORIZATION': 'Api-Key test-admin-key'}
+
+    def setUp(self):
+        make_train('Existing')
+
+    def test_admin_created_train_uses_configured_backend(self):
+        response = self.client.post('/api/admin/trains', {
+            'name': 'Admin Express',
+            'source_code': 'SRC',
+            'destination_code': 'DST',
+            'total_seats': '10',
+            'departure_time': '08:00:00',
+            'arrival_time': '10:00:00'
+        }, content_type='application/json', **self.admin_headers)
+        self.assertEqual(response.status_code, 201, response.content)
+        train = Train.objects.get(train_id=response.json()['train']['train_id'])
+        self.assertEqual(train.seat_bitmap, initial_seat_bitmap(10, 'bitmap'))
+
+        user = User.objects.create_user('admin-train', 'admin-train@example.com', 'password')
+        book_seats(user, train, [1, 2])
+        self.assertFalse(Seat.objects.filter(train=train).exists())
+        self.assertEqual(compute_seat_counters(Train.objects.filter(pk=train.pk)), [])
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('retrier', 'retrier@example.com', 'password')
+        self.train = make_train(total_seats=8)
+
+    def book(self, key, seat_numbers):
+        return self.client.post(f'/api/trains/{self.train.train_id}/book', {
+            'user_id': self.user.pk,
+            'seat_numbers': seat_numbers
+        }, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key, **auth_headers(self.user))
+
+    def test_replay_returns_the_stored_response(self):
+        first = self.book('key-1', [1, 2])
+        self.assertEqual(first.status_code, 201, first.content)
+        replay = self.book('key-1', [1, 2])
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json()['booking_id'], first.json()['booking_id'])
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 1)
+
+    def test_key_reused_with_a_different_body_is_rejected(self):
+        self.assertEqual(self.book('key-1', [1, 2]).status_code, 201)
+        response = self.book('key-1', [3])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 1)
+
+    def test_validation_failure_is_replayed(self):
+        self.assertEqual(self.book('key-1', [0]).status_code, 400)
+        replay = self.book('key-1', [0])
+        self.assertEqual(replay.status_code, 400)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+    def test_conflict_releases_the_key(self):
+        other = User.objects.create_user('holder', 'holder@example.com', 'password')
+        taken = book_seats(other, self.train, [1])
+        self.assertEqual(self.book('key-1', [1]).status_code, 409)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        cancel_bookings(Booking.objects.filter(pk=taken.pk))
+        retry = self.book('key-1', [1])
+        self.assertEqual(retry.status_code, 201, retry.content)
+        self.assertNotIn('Idempotent-Replayed', retry)
+
+
+class DoubleBookingTests(TestCase):
+    def setUp(self):
+        self.first = User.objects.create_user('first', 'first@example.com', 'password')
+        self.second = User.objects.create_user('second', 'second@example.com', 'password')
+
+    def book(self, user, train, seat_numbers):
+        # 'conditional' mode moves the counters once the booking commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/trains/{train.train_id}/book', {
+                'user_id': user.pk,
+                'seat_numbers': seat_numbers
+            }, content_type='application/json', **auth_headers(user))
+
+    def assert_second_claim_loses(self, backend):
+        train = make_train(f'Double {backend}', total_seats=8, backend=backend)
+        self.assertEqual(self.book(self.first, train, [3, 4]).status_code, 201)
+
+        response = self.book(self.second, train, [4, 5])
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertEqual(response.json()['error_type'], 'seats_taken')
+        self.assertEqual(response.json()['unavailable_seats'], [4])
+        self.assertFalse(Booking.objects.filter(user=self.second).exists())
+
+        train.refresh_from_db()
+        self.assertEqual((train.seats_available, train.seats_booked), (6, 2))
+        self.assertEqual(compute_seat_counters([train]), [])
+
+    def test_rows_backend(self):
+        self.assert_second_claim_loses('rows')
+
+    def test_bitmap_backend(self):
+        self.assert_second_claim_loses('bitmap')
+
+    @override_settings(SEAT_CLAIM_MODE='conditional')
+    def test_rows_backend_without_train_lock(self):
+        self.assert_second_claim_loses('rows')
+
+    @override_settings(SEAT_CLAIM_MODE='conditional')
+    def test_bitmap_backend_without_train_lock(self):
+        self.assert_second_claim_loses('bitmap')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Concurrent claims need PostgreSQL')
+@override_settings(SEAT_CLAIM_MODE='conditional')
+class ConditionalClaimConcurrencyTests(TransactionTestCase):
+    def test_claims_on_different_seats_do_not_wait_for_each_other(self):
+        train = make_train(total_seats=8)
+        first = User.objects.create_user('first', 'first@example.com', 'password')
+        second = User.objects.create_user('second', 'second@example.com', 'password')
+        book_seats(first, train, [8])
+        claimed, finish = threading.Event(), threading.Event()
+        bookings = {}
+
+        def hold_open():
+            # Claim seat 1 and keep the transaction open until told to commit
+            try:
+                with transaction.atomic():
+                    bookings['first'] = book_seats(first, Train.objects.get(pk=train.pk), [1])
+                    claimed.set()
+                    finish.wait(10)
+            finally:
+                connection.close()
+
+        def claim_other_seat():
+            try:
+                bookings['second'] = book_seats(second, Train.objects.get(pk=train.pk), [2])
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_open)
+        holder.start()
+        self.assertTrue(claimed.wait(10))
+        other = threading.Thread(target=claim_other_seat)
+        other.start()
+        other.join(5)
+        finished_while_open = not other.is_alive()
+        finish.set()
+        other.join()
+        holder.join()
+
+        self.assertTrue(finished_while_open, 'the second claim waited for the first transaction')
+        self.assertEqual(set(bookings), {'first', 'second'})
+        train.refresh_from_db()
+        self.assertEqual((train.seats_booked, train.inventory_version), (3, 3))
+        self.assertEqual(compute_seat_counters([train]), [])
+
+
+class SeatHoldTests(TestCase):
+    def setUp(self):
+        self.train = make_train(total_seats=8)
+        self.user = User.objects.create_user('holder', 'holder@example.com', 'password')
+        self.other = User.objects.create_user('rival', 'rival@example.com', 'password')
+
+    def post(self, user, action, seat_numbers=None):
+        data = {} if seat_numbers is None else {'seat_numbers': seat_numbers}
+        return self.client.post(
+            f'/api/trains/{self.train.train_id}/{action}', data,
+            content_type='application/json', **auth_headers(user)
+        )
+
+    def expire_holds(self):
+        SeatLock.objects.filter(train=self.train).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def assertCounters(self, available, booked, locked):
+        self.train.refresh_from_db()
+        self.assertEqual(
+            (self.train.seats_available, self.train.seats_booked, self.train.seats_locked),
+            (available, booked, locked)
+        )
+        self.assertEqual(compute_seat_counters([self.train]), [])
+
+    def test_hold_then_confirm(self):
+        self.assertEqual(self.post(self.user, 'hold', [2, 3]).status_code, 201)
+        self.assertCounters(6, 0, 2)
+        rival = self.post(self.other, 'hold', [3, 4])
+        self.assertEqual(rival.status_code, 409, rival.content)
+        self.assertEqual(rival.json()['unavailable_seats'], [3])
+
+        response = self.post(self.user, 'hold/confirm')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['seat_numbers'], [2, 3])
+        self.assertFalse(SeatLock.objects.exists())
+        self.assertCounters(6, 2, 0)
+
+    def test_release_returns_seats(self):
+        self.post(self.user, 'hold', [2, 3])
+        response = self.post(self.user, 'hold/release', [3])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['seat_numbers'], [3])
+        self.assertCounters(7, 0, 1)
+        self.assertEqual(self.post(self.other, 'hold', [3]).status_code, 201)
+        self.assertEqual(self.post(self.user, 'hold/release').json()['seat_numbers'], [2])
+        self.assertCounters(7, 0, 1)
+
+    def test_expired_hold_cannot_be_confirmed(self):
+        self.post(self.user, 'hold', [2, 3])
+        SeatLock.objects.filter(seat_number=3).update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.post(self.user, 'hold/confirm', [2, 3])
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertEqual(response.json()['unavailable_seats'], [3])
+
+        self.expire_holds()
+        response = self.post(self.user, 'hold/confirm')
+        self.assertEqual(response.status_code, 404, response.content)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_expired_hold_does_not_block_other_bookings(self):
+        self.post(self.user, 'hold', [2, 3])
+        self.expire_holds()
+        book_seats(self.other, self.train, [3])
+        self.assertFalse(SeatLock.objects.exists())
+        self.assertCounters(7, 1, 0)
+
+    def test_reaper_releases_expired_holds(self):
+        self.post(self.user, 'hold', [2, 3])
+        self.post(self.other, 'hold', [5])
+        SeatLock.objects.filter(seat_number__in=[2, 3]).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reap_expired_holds(), (2, 2))
+        self.assertEqual(list(SeatLock.objects.values_list('seat_number', flat=True)), [5])
+        self.assertCounters(7, 0, 1)
+
+
+class CleanupStaleLocksTests(TestCase):
+    def test_sweeps_more_expired_locks_than_one_batch(self):
+        user = User.objects.create_user('sweeper', 'sweeper@example.com', 'password')
+        rows = make_train('Rows', total_seats=8)
+        bitmap = make_train('Bitmap', total_seats=8, backend='bitmap')
+        hold_seats(user, rows, [1, 2, 3, 4])
+        hold_seats(user, bitmap, [5, 6, 7])
+        hold_seats(user, rows, [8])
+        SeatLock.objects.exclude(train=rows, seat_number=8).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        out = StringIO()
+        call_command('cleanup_stale_locks', '--batch-size', '2', stdout=out)
+
+        self.assertIn('deleted 7 locks and released 7 seats in 4 batches', out.getvalue())
+        self.assertEqual(list(SeatLock.objects.values_list('train_id', 'seat_number')), [(rows.pk, 8)])
+        self.assertEqual(compute_seat_counters(Train.objects.all()), [])
+        rows.refresh_from_db()
+        bitmap.refresh_from_db()
+        self.assertEqual((rows.seats_available, rows.seats_locked), (7, 1))
+        self.assertEqual((bitmap.seats_available, bitmap.seats_locked), (8, 0))
+        self.assertEqual(
+            list(Seat.objects.filter(train=rows).exclude(status='AVAILABLE').values_list('seat_number', flat=True)),
+            [8]
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Row locks are only taken on PostgreSQL')
+class HoldLockOrderTests(TestCase):
+    """Every hold path locks Train, then Seat, then SeatLock rows, as hold_seats does."""
+    LOCK_RANKS = {'api_train': 0, 'api_seat': 1, 'api_seatlock': 2}
+
+    def setUp(self):
+        self.user = User.objects.create_user('orderly', 'orderly@example.com', 'password')
+
+    def locked_tables(self, queries):
+        tables = []
+        for query in queries:
+            sql = query['sql']
+            match = re.match(r'(?:SELECT .*? FROM|UPDATE|DELETE FROM) "(api_\w+)"', sql)
+            if not match or (sql.startswith('SELECT') and 'FOR UPDATE' not in sql):
+                continue
+            table = match.group(1)
+            if table in self.LOCK_RANKS and table not in tables:
+                tables.append(table)
+        return tables
+
+    def assertLockOrder(self, operation, backend, expire=False):
+        train = make_train(total_seats=8, backend=backend)
+        with CaptureQueriesContext(connection) as queries:
+            hold_seats(self.user, train, [1, 2])
+        held = self.locked_tables(queries)
+        if expire:
+            SeatLock.objects.filter(train=train).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            operation(train)
+        locked = self.locked_tables(queries)
+        self.assertEqual(held, sorted(held, key=self.LOCK_RANKS.get))
+        self.assertIn('api_seatlock', locked)
+        self.assertEqual(locked, sorted(locked, key=self.LOCK_RANKS.get), backend)
+
+    def test_lock_order(self):
+        for backend in ('rows', 'bitmap'):
+            with self.subTest(backend=backend):
+                self.assertLockOrder(lambda train: confirm_hold(self.user, train), backend)
+                self.assertLockOrder(lambda train: release_hold(self.user, train), backend)
+                self.assertLockOrder(release_expired_holds, backend, expire=True)
+                self.assertLockOrder(lambda train: reap_expired_holds(), backend, expire=True)
+
+
+class CancellationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('canceller', 'canceller@example.com', 'password')
+        self.other = User.objects.create_user('bystander', 'bystander@example.com', 'password')
+        self.rows = make_train('Rows', total_seats=8)
+        self.bitmap = make_train('Bitmap', total_seats=8, backend='bitmap')
+
+    def assertAvailable(self, train, seats_available):
+        train.refresh_from_db()
+        self.assertEqual(train.seats_available, seats_available)
+        self.assertEqual(compute_seat_counters([train]), [])
+
+    def test_cancel_frees_seats(self):
+        for train in (self.rows, self.bitmap):
+            booking = book_seats(self.user, train, [1, 2])
+            url = f'/api/trains/{train.train_id}/booking/{booking.pk}/cancel'
+            response = self.client.post(url, **auth_headers(self.user))
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertAvailable(train, 8)
+            book_seats(self.other, train, [1, 2])
+
+            response = self.client.post(url, **auth_headers(self.user))
+            self.assertEqual(response.status_code, 409)
+            self.assertAvailable(train, 6)
+
+    def test_bulk_cancel_skips_bookings_of_other_users(self):
+        mine = [book_seats(self.user, self.rows, [1]), book_seats(self.user, self.bitmap, [1, 2])]
+        theirs = book_seats(self.other, self.rows, [2])
+        booking_ids = [booking.pk for booking in mine] + [theirs.pk]
+        response = self.client.post('/api/user/bookings/cancel', {
+            'booking_ids': booking_ids
+        }, content_type='application/json', **auth_headers(self.user))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['cancelled'], [str(booking.pk) for booking in mine])
+        self.assertEqual(response.json()['skipped'], [str(theirs.pk)])
+        self.assertAvailable(self.rows, 7)
+        self.assertAvailable(self.bitmap, 8)
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        first = [book_seats(self.user, self.rows, [seat]) for seat in (1, 2)]
+        rest = [book_seats(self.user, self.rows, [seat]) for seat in range(3, 9)]
+        with CaptureQueriesContext(connection) as few:
+            cancel_bookings(Booking.objects.filter(pk__in=[booking.pk for booking in first]))
+        with CaptureQueriesContext(connection) as many:
+            cancel_bookings(Booking.objects.filter(pk__in=[booking.pk for booking in rest]))
+        self.assertEqual(len(many), len(few))
+        self.assertAvailable(self.rows, 8)
+
+
+class WaitlistPromotionTests(TestCase):
+    def setUp(self):
+        self.train = make_train(total_seats=4, backend='bitmap')
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.front = book_seats(owner, self.train, [1, 2])
+        self.back = book_seats(owner, self.train, [3, 4])
+        self.first = User.objects.create_user('first', 'first@example.com', 'password')
+        self.second = User.objects.create_user('second', 'second@example.com', 'password')
+
+    def join(self, user, seat_count):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/trains/{self.train.train_id}/waitlist', {
+                'seat_count': seat_count
+            }, content_type='application/json', **auth_headers(user))
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def cancel(self, booking):
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_bookings(Booking.objects.filter(pk=booking.pk))
+
+    def entry(self, user):
+        return WaitlistEntry.objects.get(train=self.train, user=user)
+
+    def test_freed_seats_go_to_the_head_of_the_queue(self):
+        self.assertEqual(self.join(self.first, 2)['position'], 1)
+        self.assertEqual(self.join(self.second, 2)['position'], 2)
+
+        self.cancel(self.front)
+        entry = self.entry(self.first)
+        self.assertEqual(entry.status, 'PROMOTED')
+        self.assertEqual(entry.booking.seat_numbers, [1, 2])
+        self.assertEqual(entry.booking.total_price, Booking.price_for(2))
+        self.assertEqual(self.entry(self.second).status, 'WAITING')
+
+        self.cancel(self.back)
+        self.assertEqual(self.entry(self.second).status, 'PROMOTED')
+        self.train.refresh_from_db()
+        self.assertEqual(self.train.seats_available, 0)
+        self.assertEqual(compute_seat_counters([self.train]), [])
+
+    def test_large_group_is_not_overtaken(self):
+        self.join(self.first, 3)
+        self.join(self.second, 1)
+        self.cancel(self.front)
+        self.assertEqual(self.entry(self.first).status, 'WAITING')
+        self.assertEqual(self.entry(self.second).status, 'WAITING')
+
+        self.cancel(self.back)
+        self.assertEqual(self.entry(self.first).status, 'PROMOTED')
+        self.assertEqual(self.entry(self.second).status, 'PROMOTED')
+
+    def test_join_books_straight_away_when_seats_are_free(self):
+        self.cancel(self.front)
+        self.join(self.first, 2)
+        self.assertEqual(self.entry(self.first).status, 'PROMOTED')
+        self.assertEqual(compute_seat_counters(Train.objects.filter(pk=self.train.pk)), [])
+
+
+@override_settings(BOOKING_ADMISSION='queue')
+class BookingQueueTests(TestCase):
+    def setUp(self):
+        self.train = make_train(total_seats=8)
+        self.first = User.objects.create_user('first', 'first@example.com', 'password')
+        self.second = User.objects.create_user('second', 'second@example.com', 'password')
+
+    def book(self, user, seat_numbers):
+        return self.client.post(f'/api/trains/{self.train.train_id}/book', {
+            'user_id': user.pk,
+            'seat_numbers': seat_numbers
+        }, content_type='application/json', **auth_headers(user))
+
+    def ticket_status(self, user, response):
+        return self.client.get(f"/api/bookings/queue/{response.json()['ticket']}", **auth_headers(user))
+
+    def test_drain_books_intents_in_order(self):
+        first = self.book(self.first, [1, 2])
+        second = self.book(self.second, [2, 3])
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+        self.assertEqual(second.json()['position'], 2)
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(self.ticket_status(self.second, second).json()['position'], 2)
+        self.assertEqual(self.ticket_status(self.first, second).status_code, 404)
+
+        self.assertEqual(drain_train(self.train.pk), {'CONFIRMED': 1, 'FAILED': 1})
+        confirmed = self.ticket_status(self.first, first).json()
+        self.assertEqual(confirmed['queue_status'], 'CONFIRMED')
+        self.assertEqual(confirmed['seat_numbers'], [1, 2])
+        failed = self.ticket_status(self.second, second).json()
+        self.assertEqual(failed['queue_status'], 'FAILED')
+        self.assertEqual(failed['error_type'], 'seats_taken')
+        self.assertEqual(compute_seat_counters(Train.objects.filter(pk=self.train.pk)), [])
+
+    @override_settings(BOOKING_QUEUE_MAX_PER_TRAIN=1)
+    def test_full_queue_turns_requests_away(self):
+        self.assertEqual(self.book(self.first, [1]).status_code, 202)
+        response = self.book(self.second, [2])
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_intent_requeued_past_its_lease_is_not_booked_twice(self):
+        self.book(self.first, [1, 2])
+        intent, = claim_intents(self.train.pk, 10)
+        BookingIntent.objects.filter(pk=intent.pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_intents(), 1)
+
+        self.assertIsNone(process_intent(intent))
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(drain_train(self.train.pk), {'CONFIRMED': 1, 'FAILED': 0})
+        self.assertEqual(Booking.objects.count(), 1)
+
+    @override_settings(BOOKING_RETRY={'ATTEMPTS': 3, 'BACKOFF': 0.01, 'MAX_BACKOFF': 0.01, 'DEADLINE': 60})
+    def test_conflicts_retry_outside_the_intent_transaction(self):
+        self.book(self.first, [1, 2])
+        intent, = claim_intents(self.train.pk, 10)
+        conflicts = [OperationalError('could not obtain lock')]
+
+        def reserve_after_conflict(*args):
+            if conflicts:
+                raise conflicts.pop()
+            return reserve_seats(*args)
+
+        outside = len(connection.atomic_blocks)
+        depths = []
+        with mock.patch('api.booking.reserve_seats', side_effect=reserve_after_conflict), \
+                mock.patch('api.retry.time.sleep', side_effect=lambda delay: depths.append(len(connection.atomic_blocks))):
+            self.assertEqual(process_intent(intent), 'CONFIRMED')
+        self.assertEqual(depths, [outside])
+        self.assertEqual(BookingIntent.objects.get(pk=intent.pk).status, 'CONFIRMED')
+        self.assertEqual(Booking.objects.get().seat_numbers, [1, 2])
+
+
+class ShardWriterTests(TestCase):
+    def setUp(self):
+        self.train = make_train(total_seats=8)
+        self.users = [
+            User.objects.create_user(f'shard{i}', f'shard{i}@example.com', 'password') for i in range(3)
+        ]
+        self.writer = ShardWriter(('127.0.0.1', 0))
+
+    def request(self, user, seat_numbers=None, seat_count=None):
+        return {
+            'train_id': self.train.pk,
+            'user_id': user.pk,
+            'seat_numbers': seat_numbers or [],
+            'seat_count': seat_count,
+            'preferences': {}
+        }
+
+    def assertCountersConsistent(self):
+        self.assertEqual(compute_seat_counters(Train.objects.filter(pk=self.train.pk)), [])
+
+    def test_batch_gets_one_reply_per_request(self):
+        first, second, third = self.users
+        replies = self.writer.apply(self.train.pk, [
+            self.request(first, seat_numbers=[1, 2]),
+            self.request(second, seat_numbers=[2, 3]),
+            self.request(third, seat_count=2),
+            self.request(second, seat_numbers=['x']),
+        ])
+        self.assertEqual([reply['ok'] for reply in replies], [True, False, True, False])
+        self.assertEqual(replies[0]['seat_numbers'], [1, 2])
+        self.assertEqual(replies[1]['error_type'], 'seats_taken')
+        self.assertEqual(replies[1]['unavailable_seats'], [2])
+        self.assertEqual(len(replies[2]['seat_numbers']), 2)
+        self.assertNotIn(2, replies[2]['seat_numbers'])
+        self.assertEqual(replies[3]['error_type'], 'invalid_seats')
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertCountersConsistent()
+
+    def test_stale_view_is_corrected_from_the_database(self):
+        first, second, third = self.users
+        self.writer.apply(self.train.pk, [self.request(first, seat_numbers=[1])])
+
+        # Seats taken and freed behind the writer's back
+        book_seats(second, self.train, [4])
+        cancel_bookings(Booking.objects.filter(user=first))
+
+        replies = self.writer.apply(self.train.pk, [
+            self.request(third, seat_numbers=[4]),
+            self.request(third, seat_numbers=[1]),
+        ])
+        self.assertFalse(replies[0]['ok'])
+        self.assertEqual(replies[0]['error_type'], 'seats_taken')
+        self.assertTrue(replies[1]['ok'], replies[1])
+        self.assertCountersConsistent()
+
+    def test_unknown_train(self):
+        replies = self.writer.apply('T9999', [self.request(self.users[0], seat_count=1)])
+        self.assertEqual(replies[0]['error_type'], 'not_found')
+
+    def test_request_id_is_stored_and_expired_requests_are_dropped(self):
+        first, second, _ = self.users
+        request_id = uuid.uuid4()
+        live = dict(self.request(first, seat_count=2), request_id=request_id, deadline=timezone.now().timestamp() + 60)
+        expired = dict(self.request(second, seat_numbers=[8]), request_id=uuid.uuid4(), deadline=timezone.now().timestamp() - 1)
+        replies = self.writer.apply(self.train.pk, [live, expired])
+        self.assertTrue(replies[0]['ok'])
+        self.assertEqual(Booking.objects.get(pk=replies[0]['booking_id']).request_id, request_id)
+        self.assertEqual(replies[1]['error_type'], 'expired')
+        self.assertFalse(Booking.objects.filter(user=second).exists())
+
+
+@override_settings(BOOKING_WRITER='sharded')
+class ShardTimeoutTests(TestCase):
+    def setUp(self):
+        self.train = make_train(total_seats=8)
+        self.user = User.objects.create_user('slow', 'slow@example.com', 'password')
+        self.request_id = uuid.uuid4()
+
+    def book(self):
+        timeout = ShardTimeout("Shard did not reply in time", self.request_id)
+        with mock.patch('api.views.submit_booking', side_effect=timeout) as submit:
+            response = self.client.post(
+                f'/api/trains/{self.train.train_id}/book',
+                {'user_id': self.user.pk, 'seat_numbers': [1]},
+                content_type='application/json',
+                HTTP_IDEMPOTENCY_KEY='slow-1',
+                **auth_headers(self.user)
+            )
+        return response, submit.call_count
+
+    def test_timeout_keeps_the_key_and_reports_pending(self):
+        response, calls = self.book()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(calls, 1)
+
+        # A retry with the key gets the same answer instead of a second booking
+        replay, calls = self.book()
+        self.assertEqual(calls, 0)
+        self.assertEqual(replay.status_code, 202)
+        self.assertEqual(replay.data['status_url'], response.data['status_url'])
+
+        status_url = response.data['status_url']
+        pending = self.client.get(status_url, **auth_headers(self.user))
+        self.assertEqual(pending.data['booking_status'], 'PENDING')
+
+        # The shard makes the booking after all
+        book_seats(self.user, self.train, [1], request_id=self.request_id)
+        confirmed = self.client.get(status_url, **auth_headers(self.user))
+        self.assertEqual(confirmed.data['booking_status'], 'CONFIRMED')
+        self.assertEqual(confirmed.data['seat_numbers'], [1])
+
+    def test_pending_booking_fails_once_the_shard_would_drop_it(self):
+        response, _ = self.book()
+        with override_settings(BOOKING_SHARD_REQUEST_TTL=-60):
+            failed = self.client.get(response.data['status_url'], **auth_headers(self.user))
+        self.assertEqual(failed.data['booking_status'], 'FAILED')
+
+    def test_forged_token(self):
+        response = self.client.get('/api/bookings/pending/not-a-token', **auth_headers(self.user))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(GROUP_COMMIT_WINDOW=0)
+class GroupCommitTests(TestCase):
+    def setUp(self):
+        self.train = make_train(total_seats=8)
+        self.users = [
+            User.objects.create_user(f'group{i}', f'group{i}@example.com', 'password') for i in range(3)
+        ]
+
+    def test_batch_books_each_request_or_fails_it_alone(self):
+        first, second, third = self.users
+        batch = [
+            _PendingBooking(first, [1, 2], None, False, None),
+            _PendingBooking(second, [2, 3], None, False, None),
+            _PendingBooking(third, None, 3, True, None),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            _commit_batch(self.train.pk, batch)
+        self.assertEqual(sum('INSERT INTO "api_booking"' in query['sql'] for query in queries), 1)
+
+        self.assertTrue(all(request.done.is_set() for request in batch))
+        self.assertEqual(batch[0].booking.seat_numbers, [1, 2])
+        self.assertIsInstance(batch[1].error, SeatsUnavailable)
+        self.assertIsNone(batch[1].booking)
+        self.assertEqual(len(batch[2].booking.seat_numbers), 3)
+        self.assertNotIn(2, batch[2].booking.seat_numbers)
+        self.assertEqual(batch[2].booking.user, third)
+        self.assertEqual(compute_seat_counters(Train.objects.filter(pk=self.train.pk)), [])
+
+    def test_single_request_raises_its_own_error(self):
+        booking = book_coalesced(self.users[0], self.train, seat_numbers=[4])
+        self.assertEqual(booking.seat_numbers, [4])
+        with self.assertRaises(SeatsUnavailable):
+            book_coalesced(self.users[1], self.train, seat_numbers=[4, 5])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    @override_settings(GROUP_COMMIT_WAIT_TIMEOUT=0.05)
+    def test_follower_gives_up_on_a_batch_that_never_starts(self):
+        # A leader that has queued its request but never collects the batch
+        stalled = _PendingBooking(self.users[0], [1], None, False, None)
+        group_commit._pending[self.train.pk] = [stalled]
+        try:
+            with self.assertRaises(ConcurrentUpdate):
+                book_coalesced(self.users[1], self.train, seat_numbers=[2])
+            batch = group_commit._pending[self.train.pk]
+        finally:
+            group_commit._pending.pop(self.train.pk, None)
+        # The withdrawn request is left out once the batch does run
+        self.assertEqual(group_commit._start(batch), [stalled])
+        self.assertFalse(Booking.objects.exists())
+
+    @override_settings(BOOKING_WRITER='group_commit')
+    def test_malformed_preferences_are_rejected_with_seat_numbers(self):
+        user = self.users[0]
+        response = self.client.post(
+            f'/api/trains/{self.train.train_id}/book',
+            {'user_id': user.pk, 'seat_numbers': [1], 'preferences': [1]},
+            content_type='application/json',
+            **auth_headers(user)
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Concurrent writers need PostgreSQL')
+@override_settings(GROUP_COMMIT_WINDOW=0.2)
+class GroupCommitConcurrencyTests(TransactionTestCase):
+    def test_concurrent_requests_share_a_batch(self):
+        train = make_train(total_seats=8)
+        users = [User.objects.create_user(f'group{i}', f'group{i}@example.com', 'password') for i in range(4)]
+        results = {}
+
+        def book(user):
+            try:
+                results[user.pk] = book_coalesced(user, train, seat_count=2)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        seats = sorted(seat for booking in results.values() for seat in booking.seat_numbers)
+        self.assertEqual(seats, list(range(1, 9)))
+        # One batch: every booking was inserted by the same statement
+        self.assertEqual(len({booking.request_timestamp for booking in Booking.objects.all()}), 1)
+        self.assertEqual(compute_seat_counters(Train.objects.all()), [])
+
+
+class SeatMatrixETagTests(TestCase):
+    def setUp(self):
+        self.train = make_train(total_seats=8)
+        self.user = User.objects.create_user('poller', 'poller@example.com', 'password')
+        self.url = f'/api/trains/{self.train.train_id}/seats'
+
+    def test_unchanged_matrix_is_not_sent_again(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertEqual(first['Cache-Control'], 'no-cache')
+
+        cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(cached.content, b'')
+
+    def test_booking_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        book_seats(self.user, self.train, [3])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['available_seats'], 7)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_per_user_matrix_is_tagged_per_user(self):
+        other = User.objects.create_user('neighbour', 'neighbour@example.com', 'password')
+        url = f'/api/trains/{self.train.train_id}/book'
+        mine = self.client.get(url, **auth_headers(self.user))
+        self.assertEqual(mine.status_code, 200, mine.content)
+        self.assertEqual(mine['Cache-Control'], 'private, no-cache')
+        theirs = self.client.get(url, HTTP_IF_NONE_MATCH=mine['ETag'], **auth_headers(other))
+        self.assertEqual(theirs.status_code, 200)
+        self.assertNotEqual(theirs['ETag'], mine['ETag'])
+
+
+class SeatMatrixChangesTests(TestCase):
+    def setUp(self):
+        self.train = make_train(total_seats=8)
+        self.user = User.objects.create_user('syncer', 'syncer@example.com', 'password')
+        self.base = self.client.get(f'/api/trains/{self.train.train_id}/seats').json()['version']
+
+    def changes(self, since, **headers):
+        return self.client.get(f'/api/trains/{self.train.train_id}/seats/changes?since={since}', **headers)
+
+    def test_delta_lists_exactly_the_changed_seats(self):
+        booking = book_seats(self.user, self.train, [2, 3])
+        middle = self.changes(self.base).json()
+        self.assertFalse(middle['full'])
+        self.assertEqual(
+            [(seat['seat_number'], seat['status']) for seat in middle['seats']],
+            [(2, 'BOOKED'), (3, 'BOOKED')]
+        )
+
+        book_seats(self.user, self.train, [5])
+        cancel_bookings(Booking.objects.filter(pk=booking.pk))
+        latest = self.changes(middle['version']).json()
+        self.assertEqual(
+            [(seat['seat_number'], seat['status']) for seat in latest['seats']],
+            [(2, 'AVAILABLE'), (3, 'AVAILABLE'), (5, 'BOOKED')]
+        )
+        self.assertEqual(latest['available_seats'], 7)
+
+        current = self.changes(latest['version'])
+        self.assertEqual((current.json()['full'], current.json()['seats']), (False, []))
+        self.assertEqual(self.changes(latest['version'], HTTP_IF_NONE_MATCH=current['ETag']).status_code, 304)
+
+    def test_etag_depends_on_since(self):
+        book_seats(self.user, self.train, [2])
+        book_seats(self.user, self.train, [5])
+        older = self.changes(self.base)
+        self.assertEqual(len(older.json()['seats']), 2)
+
+        newer = self.changes(self.base + 1, HTTP_IF_NONE_MATCH=older['ETag'])
+        self.assertEqual(newer.status_code, 200)
+        self.assertEqual([seat['seat_number'] for seat in newer.json()['seats']], [5])
+        self.assertNotEqual(newer['ETag'], older['ETag'])
+        self.assertEqual(self.changes(self.base, HTTP_IF_NONE_MATCH=older['ETag']).status_code, 304)
+
+    def assertFullSnapshot(self, since):
+        data = self.changes(since).json()
+        self.assertTrue(data['full'], since)
+        self.assertEqual(len(data['seats']), 8)
+        self.assertEqual([seat['seat_number'] for seat in data['seats'] if seat['is_booked']], [1])
+
+    @override_settings(SEAT_CHANGE_LOG_SIZE=1)
+    def test_full_snapshot_when_the_log_was_trimmed(self):
+        # Jump to just before a trim; the log is trimmed every 100 versions
+        Train.objects.filter(pk=self.train.pk).update(inventory_version=98)
+        book_seats(self.user, self.train, [1])
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        book_seats(other, self.train, [4])
+        self.assertEqual(list(SeatChange.objects.values_list('version', flat=True)), [100])
+
+        data = self.changes(98).json()
+        self.assertTrue(data['full'])
+        self.assertEqual([seat['seat_number'] for seat in data['seats'] if seat['is_booked']], [1, 4])
+        data = self.changes(99).json()
+        self.assertFalse(data['full'])
+        self.assertEqual([seat['seat_number'] for seat in data['seats']], [4])
+
+    def test_full_snapshot_for_unknown_versions(self):
+        book_seats(self.user, self.train, [1])
+        self.train.refresh_from_db()
+        self.assertFullSnapshot(self.train.inventory_version + 1)
+        self.assertFullSnapshot(-1)
+
+    def test_since_is_required(self):
+        self.assertEqual(self.changes('abc').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/trains/{self.train.train_id}/seats/changes').status_code, 400)
+
+
+class UserBookingsPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pager', 'pager@example.com', 'password')
+        train = make_train(total_seats=12)
+        self.bookings = [book_seats(self.user, train, [seat]) for seat in range(1, 8)]
+        # Two timestamps only, so most pages end in the middle of a tie
+        earlier, later = timezone.now() - timedelta(hours=1), timezone.now()
+        Booking.objects.filter(pk__in=[booking.pk for booking in self.bookings[:3]]).update(created_at=earlier)
+        Booking.objects.filter(pk__in=[booking.pk for booking in self.bookings[3:]]).update(created_at=later)
+        self.train = train
+
+    def page(self, **params):
+        response = self.client.get('/api/user/bookings', params, **auth_headers(self.user))
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_cover_every_booking_once(self):
+        seen = []
+        free_seats = iter(range(8, 13))
+        data = self.page(limit=2)
+        while True:
+            seen += [booking['booking_id'] for booking in data['results']]
+            if data['next_cursor'] is None:
+                break
+            # New bookings appear before the first page, never on later ones
+            book_seats(self.user, self.train, [next(free_seats)])
+            data = self.page(limit=2, cursor=data['next_cursor'])
+
+        expected = [booking.pk for booking in self.bookings[3:][::-1] + self.bookings[:3][::-1]]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(data['results']), 1)
+
+    def test_exact_last_page_has_no_cursor(self):
+        self.assertIsNotNone(self.page(limit=6)['next_cursor'])
+        self.assertIsNone(self.page(limit=7)['next_cursor'])
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ('not-a-cursor', 'bm90fGE', '!!!'):
+            response = self.client.get('/api/user/bookings', {'cursor': cursor}, **auth_headers(self.user))
+            self.assertEqual(response.status_code, 400, cursor)
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def assertRendersLikeDRF(self, data):
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_booking_and_seat_payload(self):
+        self.assertRendersLikeDRF({
+            'booking_id': 42,
+            'ticket': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'train': {'name': 'Night\u2028Mail\u2029Express', 'source': 'Thiruvananthapuram \u0ba4'},
+            'seat_numbers': [1, 2, 3],
+            'total_price': Decimal('1500.00'),
+            'fare': Decimal('0.1'),
+            'created_at': datetime(2026, 10, 17, 9, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'expires_at': datetime(2026, 10, 17, 9, 35, tzinfo=dt_timezone(timedelta(hours=5, minutes=30))),
+            'journey_date': date(2026, 10, 18),
+            'departure_time': time(22, 15),
+            'seats_by_number': {1: 'BOOKED', 2: 'AVAILABLE'},
+            'seat_matrix': [[{'seat_number': 1, 'status': 'BOOKED', 'is_booked': True}]],
+            'empty': None,
+        })
+
+    def test_integers_wider_than_64_bits(self):
+        self.assertRendersLikeDRF({'version': 2 ** 70})
+
+    def test_exponent_floats_decode_to_the_same_values(self):
+        # The one known formatting difference: 1e16 instead of 1e+16
+        data = {'values': [1e16, 1e-05, Decimal('1E+22'), 0.1, -0.0]}
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data))
+        )
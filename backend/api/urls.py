@@ -5,16 +5,28 @@ from .views import (
     TrainCreateView,
     TrainAvailabilityView,
     BookSeatView,
+    BatchBookingView,
+    SeatHoldView,
+    SeatHoldConfirmView,
+    SeatHoldReleaseView,
+    WaitlistView,
     BookingDetailView,
+    BookingQueueStatusView,
+    PendingBookingStatusView,
+    BookingCancelView,
+    BulkBookingCancelView,
     AdminSignupView,
     AdminDashboardView,
+    AdminDatabasePoolView,
     AdminStationListView,
     AdminTrainListView,
+    AdminTrainCancelView,
     grant_admin,
     revoke_admin,
     check_admin,
     TrainDetailView,
     SeatMatrixView,
+    SeatMatrixChangesView,
     UserBookingsView,
 )
 
@@ -25,20 +37,34 @@ urlpatterns = [
     
     # Admin URLs
     path("admin/dashboard", AdminDashboardView.as_view(), name="admin-dashboard"),
+    path("admin/db/pool", AdminDatabasePoolView.as_view(), name="admin-db-pool"),
     path("admin/stations", AdminStationListView.as_view(), name="admin-stations"),
     path("admin/trains", AdminTrainListView.as_view(), name="admin-trains"),
     path("admin/trains/<str:train_id>", AdminTrainListView.as_view(), name="admin-train-detail"),
+    path("admin/trains/<str:train_id>/cancel", AdminTrainCancelView.as_view(), name="admin-train-cancel"),
     
     # Train URLs
     path("trains/create", TrainCreateView.as_view(), name="train-create"),
     path("trains/availability", TrainAvailabilityView.as_view(), name="train-availability"),
     path("trains/<str:train_id>", TrainDetailView.as_view(), name="train-detail"),
     path("trains/<str:train_id>/book", BookSeatView.as_view(), name="book-seat"),
+    path("trains/<str:train_id>/hold", SeatHoldView.as_view(), name="seat-hold"),
+    path("trains/<str:train_id>/hold/confirm", SeatHoldConfirmView.as_view(), name="seat-hold-confirm"),
+    path("trains/<str:train_id>/hold/release", SeatHoldReleaseView.as_view(), name="seat-hold-release"),
+    path("trains/<str:train_id>/waitlist", WaitlistView.as_view(), name="waitlist"),
     path("trains/<str:train_id>/seats", SeatMatrixView.as_view(), name="seat-matrix"),
+    path("trains/<str:train_id>/seats/changes", SeatMatrixChangesView.as_view(), name="seat-matrix-changes"),
     path("trains/<str:train_id>/booking/<int:booking_id>", BookingDetailView.as_view(), name="booking-detail"),
+    path("trains/<str:train_id>/booking/<int:booking_id>/cancel", BookingCancelView.as_view(), name="booking-cancel"),
     
+    # Booking URLs
+    path("bookings/batch", BatchBookingView.as_view(), name="booking-batch"),
+    path("bookings/queue/<uuid:ticket>", BookingQueueStatusView.as_view(), name="booking-queue-status"),
+    path("bookings/pending/<str:token>", PendingBookingStatusView.as_view(), name="booking-pending-status"),
+
     # User URLs
     path("user/bookings", UserBookingsView.as_view(), name="user-bookings"),
+    path("user/bookings/cancel", BulkBookingCancelView.as_view(), name="user-bookings-cancel"),
     
     # Admin management URLs
     path("admin/check/<str:username>/", check_admin, name="check-admin"),
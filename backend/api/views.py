@@ -2,18 +2,18 @@ from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from django.db import transaction
 from django.core.exceptions import PermissionDenied
+from django.core.signing import BadSignature
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.db.models import Sum
-from django.db import DatabaseError
+from django.db import DatabaseError, connections
 from django.utils import timezone
 from datetime import timedelta
 from django.db import IntegrityError
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from django.db import models
-from .models import User, Train, Booking, Station, SeatLock, Seat
+from .models import User, Train, Booking, Station, SeatLock, Seat, WaitlistEntry, BookingIntent
 from .serializers import (
     SignupSerializer,
     LoginSerializer,
@@ -24,6 +24,36 @@ from .serializers import (
     BookingDetailSerializer,
 )
 from .authenticate import AdminAPIKeyAuthentication
+from .availability import trains_with_availability
+from .allocation import PREFERENCE_POSITIONS, NotEnoughSeats
+from .batch_booking import BATCH_MODES, ITEM_ERRORS, BatchItemFailed, book_batch, describe_item_error
+from .booking import book_best_seats, book_seats
+from .booking_queue import QueueFull, enqueue_booking, queue_position
+from .cancellation import BookingNotCancellable, cancel_bookings
+from .conditional import inventory_etag, not_modified, tag_response
+from .group_commit import book_coalesced
+from .holds import NoActiveHold, active_holds, confirm_hold, hold_seats, lapsed_hold_seats, release_hold
+from .idempotency import idempotent
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, keyset_page
+from .replicas import read_from_replica
+from .sharding import (
+    ShardTimeout,
+    ShardUnavailable,
+    pending_booking_token,
+    read_pending_booking_token,
+    submit_booking,
+)
+from .inventory import (
+    ConcurrentUpdate,
+    InvalidSeats,
+    SeatsUnavailable,
+    available_seat_numbers,
+    initial_seat_bitmap,
+    normalize_seat_numbers,
+    seat_changes_since,
+    seat_statuses,
+)
+from .waitlist import AlreadyWaitlisted, join_waitlist, leave_waitlist, waitlist_position
 from django.conf import settings
 from utils.admin_utils import grant_admin_privileges, revoke_admin_privileges, check_admin_status
 from rest_framework.decorators import api_view, permission_classes
@@ -90,6 +120,7 @@ class TrainCreateView(APIView):
     authentication_classes = [AdminAPIKeyAuthentication]
     permission_classes = [AdminApiKeyPermission]
 
+    @idempotent
     def post(self, request):
         try:
             print("Received data:", request.data)
@@ -190,26 +221,16 @@ class TrainCreateView(APIView):
                     "details": str(e)
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create the train within a transaction
-            with transaction.atomic():
-                train = Train.objects.create(
-                    name=name,
-                    source=source,
-                    destination=destination,
-                    total_seats=total_seats,
-                    departure_time=departure_time,
-                    arrival_time=arrival_time
-                )
-
-                # Initialize seats for the train
-                seats = [
-                    Seat(
-                        train=train,
-                        seat_number=seat_num,
-                        status='AVAILABLE'
-                    ) for seat_num in range(1, total_seats + 1)
-                ]
-                Seat.objects.bulk_create(seats)
+            # Seat rows are created on first use (see materialize_seats)
+            train = Train.objects.create(
+                name=name,
+                source=source,
+                destination=destination,
+                total_seats=total_seats,
+                departure_time=departure_time,
+                arrival_time=arrival_time,
+                seat_bitmap=initial_seat_bitmap(total_seats)
+            )
 
             return Response({
                 "message": "Train added successfully",
@@ -225,6 +246,13 @@ class TrainCreateView(APIView):
                 }
             }, status=status.HTTP_201_CREATED)
 
+        except IntegrityError as e:
+            # A train ID or name taken by a concurrent insert; a retry gets a fresh ID
+            return Response({
+                "error": "Train could not be created right now. Please retry.",
+                "details": str(e)
+            }, status=status.HTTP_409_CONFLICT)
+
         except Exception as e:
             print("Error creating train:", str(e))
             return Response({
@@ -234,23 +262,22 @@ class TrainCreateView(APIView):
 
 # Train availability
 class TrainAvailabilityView(APIView):
+    @read_from_replica
     def get(self, request):
         # Check if user is admin
         is_admin = request.user.is_authenticated and request.user.is_admin
 
         # If admin and no parameters provided, return all trains
         if is_admin and not (request.query_params.get('source') or request.query_params.get('destination')):
-            trains = Train.objects.all()
+            trains = trains_with_availability()
             result = []
             for train in trains:
-                booked_count = Booking.objects.filter(train=train, booked=True).aggregate(total=models.Sum('seat_count'))['total'] or 0
-                available_seats = max(train.total_seats - booked_count, 0)
                 result.append({
                     "train_id": train.train_id,
                     "train_name": train.name,
                     "source": train.source.station_name,
                     "destination": train.destination.station_name,
-                    "available_seats": available_seats,
+                    "available_seats": train.available_seats,
                 })
             return Response(result)
 
@@ -275,18 +302,18 @@ class TrainAvailabilityView(APIView):
             return Response({"detail": f"No station found with name: {destination}"}, status=status.HTTP_404_NOT_FOUND)
 
         # Find trains between these stations
-        trains = Train.objects.filter(source__in=source_stations, destination__in=destination_stations)
+        trains = trains_with_availability(
+            Train.objects.filter(source__in=source_stations, destination__in=destination_stations)
+        )
 
         result = []
         for train in trains:
-            booked_count = Booking.objects.filter(train=train, booked=True).aggregate(total=models.Sum('seat_count'))['total'] or 0
-            available_seats = max(train.total_seats - booked_count, 0)
             result.append({
                 "train_id": train.train_id,
                 "train_name": train.name,
                 "source": train.source.station_name,
                 "destination": train.destination.station_name,
-                "available_seats": available_seats,
+                "available_seats": train.available_seats,
             })
 
         return Response(result)
@@ -296,13 +323,25 @@ class BookSeatView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent
     def post(self, request, train_id):
         user_id = request.data.get('user_id')
         seat_numbers = request.data.get('seat_numbers', [])  # Get specific seat numbers
+        seat_count = request.data.get('seat_count')  # Or let the server pick this many seats
+        preferences = request.data.get('preferences') or {}
         
-        if not user_id or not seat_numbers:
+        if not user_id or not (seat_numbers or seat_count):
             return Response({
-                "message": "user_id and seat_numbers are required."
+                "message": "user_id and either seat_numbers or seat_count are required."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if not seat_numbers and (not str(seat_count).isdigit() or int(seat_count) <= 0):
+            return Response({
+                "message": "seat_count must be a positive number."
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(preferences, dict) or preferences.get('position') not in (None, *PREFERENCE_POSITIONS):
+            return Response({
+                "message": f"preferences.position must be one of: {', '.join(PREFERENCE_POSITIONS)}."
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
@@ -319,108 +358,190 @@ class BookSeatView(APIView):
                 "message": "Train not found."
             }, status=status.HTTP_404_NOT_FOUND)
 
+        if settings.BOOKING_ADMISSION == 'queue':
+            return self._enqueue(user, train, seat_numbers, seat_count, preferences)
+        if settings.BOOKING_WRITER == 'sharded':
+            return self._book_on_shard(user, train, seat_numbers, seat_count, preferences)
+
         try:
-            with transaction.atomic():
-                # Lock the train and get seats
-                train = Train.objects.select_for_update(nowait=True).get(pk=train.pk)
-                current_time = timezone.now()
-
-                # Get requested seats with lock
-                requested_seats = Seat.objects.select_for_update(nowait=True).filter(
-                    train=train,
-                    seat_number__in=seat_numbers
+            if settings.BOOKING_WRITER == 'group_commit':
+                booking = book_coalesced(
+                    user,
+                    train,
+                    seat_numbers=seat_numbers or None,
+                    seat_count=None if seat_numbers else int(seat_count),
+                    together=bool(preferences.get('together')),
+                    preference=preferences.get('position')
+                )
+            elif seat_numbers:
+                booking = book_seats(user, train, seat_numbers)
+            else:
+                booking = book_best_seats(
+                    user,
+                    train,
+                    int(seat_count),
+                    together=bool(preferences.get('together')),
+                    preference=preferences.get('position')
                 )
 
-                # Verify all requested seats exist
-                if requested_seats.count() != len(seat_numbers):
-                    return Response({
-                        "status": "error",
-                        "message": "One or more selected seats do not exist.",
-                        "error_type": "invalid_seats"
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-                # Check if any seats are already booked or locked
-                unavailable_seats = requested_seats.exclude(status='AVAILABLE')
-                if unavailable_seats.exists():
-                    # Get all available seats for the train
-                    available_seats = Seat.objects.filter(
-                        train=train,
-                        status='AVAILABLE'
-                    ).values_list('seat_number', flat=True)
+            return Response({
+                "status": "success",
+                "message": "Seats booked successfully",
+                "booking_id": str(booking.id),
+                "seat_numbers": booking.seat_numbers,
+                "status": "CONFIRMED",
+                "total_price": booking.total_price
+            }, status=status.HTTP_201_CREATED)
 
-                    return Response({
-                        "status": "error",
-                        "message": "Some selected seats are not available.",
-                        "unavailable_seats": list(unavailable_seats.values_list('seat_number', flat=True)),
-                        "available_seats": list(available_seats),
-                        "error_type": "seats_taken"
-                    }, status=status.HTTP_409_CONFLICT)
-
-                # Create booking
-                booking = Booking.objects.create(
-                    user=user,
-                    train=train,
-                    seat_count=len(seat_numbers),
-                    seat_numbers=seat_numbers,
-                    status='CONFIRMED',
-                    booked=True,
-                    request_timestamp=current_time
-                )
+        except NotEnoughSeats as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "not_enough_seats"
+            }, status=status.HTTP_409_CONFLICT)
 
-                # Update seat status
-                requested_seats.update(
-                    status='BOOKED',
-                    booking=booking,
-                    locked_by=None,
-                    lock_expires_at=None
-                )
+        except InvalidSeats as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "invalid_seats"
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-                return Response({
-                    "status": "success",
-                    "message": "Seats booked successfully",
-                    "booking_id": str(booking.id),
-                    "seat_numbers": seat_numbers,
-                    "status": "CONFIRMED",
-                    "total_price": booking.total_price
-                }, status=status.HTTP_201_CREATED)
-
-        except DatabaseError as e:
-            # Get updated list of available seats
-            available_seats = Seat.objects.filter(
-                train=train,
-                status='AVAILABLE'
-            ).values_list('seat_number', flat=True)
+        except SeatsUnavailable as e:
+            return Response({
+                "status": "error",
+                "message": "Some selected seats are not available.",
+                "unavailable_seats": e.seat_numbers,
+                "available_seats": available_seat_numbers(train, limit=settings.CONFLICT_AVAILABLE_SEATS_LIMIT),
+                "error_type": "seats_taken"
+            }, status=status.HTTP_409_CONFLICT)
 
+        except (DatabaseError, ConcurrentUpdate) as e:
             return Response({
                 "status": "error",
                 "message": "The seats you selected are no longer available. Please choose from the available seats.",
-                "available_seats": list(available_seats),
+                "available_seats": available_seat_numbers(train, limit=settings.CONFLICT_AVAILABLE_SEATS_LIMIT),
                 "error_type": "concurrent_booking"
             }, status=status.HTTP_409_CONFLICT)
 
+    def _enqueue(self, user, train, seat_numbers, seat_count, preferences):
+        """Admit the request to the booking queue and hand back a ticket"""
+        try:
+            intent = enqueue_booking(
+                user,
+                train,
+                seat_numbers=seat_numbers,
+                seat_count=None if seat_numbers else int(seat_count),
+                preferences=preferences
+            )
+        except InvalidSeats as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "invalid_seats"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except QueueFull as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "queue_full"
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '5'})
+
+        return Response({
+            "status": "queued",
+            "message": "Booking request queued",
+            "ticket": str(intent.ticket),
+            "position": queue_position(intent),
+            "status_url": f"/api/bookings/queue/{intent.ticket}"
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def _book_on_shard(self, user, train, seat_numbers, seat_count, preferences):
+        """Have the shard writer owning the train make the booking"""
+        try:
+            reply = submit_booking(
+                train.train_id,
+                user.pk,
+                seat_numbers=seat_numbers,
+                seat_count=None if seat_numbers else int(seat_count),
+                preferences=preferences
+            )
+        except ShardTimeout as e:
+            # The shard may still make the booking, so this is not a
+            # retryable failure: keep the idempotency key and let the client poll
+            token = pending_booking_token(e.request_id)
+            return Response({
+                "status": "pending",
+                "message": "The booking is still being processed.",
+                "request_id": token,
+                "status_url": f"/api/bookings/pending/{token}"
+            }, status=status.HTTP_202_ACCEPTED)
+        except ShardUnavailable as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "shard_unavailable"
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if reply['ok']:
+            return Response({
+                "status": "success",
+                "message": "Seats booked successfully",
+                "booking_id": str(reply['booking_id']),
+                "seat_numbers": reply['seat_numbers'],
+                "status": "CONFIRMED",
+                "total_price": reply['total_price']
+            }, status=status.HTTP_201_CREATED)
+
+        error = {
+            "status": "error",
+            "message": reply['message'],
+            "error_type": reply['error_type']
+        }
+        if reply['error_type'] == 'invalid_seats':
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        if reply['error_type'] == 'not_found':
+            return Response({"message": reply['message']}, status=status.HTTP_404_NOT_FOUND)
+        if 'unavailable_seats' in reply:
+            error["unavailable_seats"] = reply['unavailable_seats']
+        if reply['error_type'] != 'not_enough_seats':
+            error["available_seats"] = available_seat_numbers(train, limit=settings.CONFLICT_AVAILABLE_SEATS_LIMIT)
+        return Response(error, status=status.HTTP_409_CONFLICT)
+
+    @read_from_replica
     def get(self, request, train_id):
         """Get seat availability matrix for a train"""
         try:
             train = Train.objects.get(train_id=train_id)
-            seats = Seat.objects.filter(train=train).order_by('seat_number')
+            # Lapsed holds show as available; releasing them is left to writers
+            lapsed = lapsed_hold_seats(train)
             current_user = request.user
+
+            # An unchanged inventory version means an unchanged matrix
+            etag = inventory_etag(train, current_user, lapsed)
+            cached = not_modified(request, etag, private=True)
+            if cached is not None:
+                return cached
+
+            # Seats held by the current user's bookings, read once for the whole matrix
+            users_seats = set()
+            for numbers in Booking.objects.filter(
+                train=train,
+                user=current_user,
+                status='CONFIRMED'
+            ).values_list('seat_numbers', flat=True):
+                users_seats.update(numbers)
             
             seat_matrix = []
             seats_per_row = 6  # Same as frontend
             
             # Convert seats to matrix format
             current_row = []
-            for seat in seats:
-                # Check if the seat is booked by the current user
-                is_users_booking = False
-                if seat.booking and seat.booking.user:
-                    is_users_booking = seat.booking.user.id == current_user.id
-
+            for seat_number, seat_status in seat_statuses(train, lapsed=lapsed):
                 current_row.append({
-                    'seat_number': seat.seat_number,
-                    'status': seat.status,
-                    'is_booked': seat.status == 'BOOKED',
-                    'is_users_booking': is_users_booking
+                    'seat_number': seat_number,
+                    'status': seat_status,
+                    'is_booked': seat_status == 'BOOKED',
+                    'is_users_booking': seat_status == 'BOOKED' and seat_number in users_seats
                 })
                 
                 if len(current_row) == seats_per_row:
@@ -431,25 +552,408 @@ class BookSeatView(APIView):
             if current_row:
                 seat_matrix.append(current_row)
             
-            return Response({
+            return tag_response(Response({
                 'seat_matrix': seat_matrix,
                 'total_seats': train.total_seats,
-                'available_seats': seats.filter(status='AVAILABLE').count()
-            })
+                'available_seats': train.seats_available + len(lapsed)
+            }), etag, private=True)
             
         except Train.DoesNotExist:
             return Response({
                 "message": "Train not found"
             }, status=status.HTTP_404_NOT_FOUND)
 
+# Batch booking - many (train, seats) items in one request
+class BatchBookingView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _parse_items(self, raw_items):
+        """Validate the items and attach their trains, or return an error Response"""
+        if not isinstance(raw_items, list) or not raw_items:
+            return None, Response({
+                "message": "items must be a non-empty list."
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(raw_items) > settings.BATCH_BOOKING_MAX_ITEMS:
+            return None, Response({
+                "message": f"A batch can hold at most {settings.BATCH_BOOKING_MAX_ITEMS} items."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        items = []
+        for index, raw in enumerate(raw_items):
+            raw = raw if isinstance(raw, dict) else {}
+            seat_numbers = raw.get('seat_numbers') or []
+            seat_count = raw.get('seat_count')
+            preferences = raw.get('preferences') or {}
+            if not raw.get('train_id') or not (seat_numbers or seat_count):
+                message = "train_id and either seat_numbers or seat_count are required."
+            elif seat_numbers and not isinstance(seat_numbers, list):
+                message = "seat_numbers must be a list."
+            elif not seat_numbers and (not str(seat_count).isdigit() or int(seat_count) <= 0):
+                message = "seat_count must be a positive number."
+            elif not isinstance(preferences, dict) or preferences.get('position') not in (None, *PREFERENCE_POSITIONS):
+                message = f"preferences.position must be one of: {', '.join(PREFERENCE_POSITIONS)}."
+            else:
+                items.append({
+                    'train_id': str(raw['train_id']),
+                    'seat_numbers': seat_numbers,
+                    'seat_count': None if seat_numbers else int(seat_count),
+                    'together': bool(preferences.get('together')),
+                    'preference': preferences.get('position')
+                })
+                continue
+            return None, Response({
+                "message": f"Item {index}: {message}",
+                "failed_item": index
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        trains = Train.objects.in_bulk({item['train_id'] for item in items})
+        missing = sorted({item['train_id'] for item in items} - set(trains))
+        if missing:
+            return None, Response({
+                "message": f"Trains not found: {', '.join(missing)}"
+            }, status=status.HTTP_404_NOT_FOUND)
+        for item in items:
+            item['train'] = trains[item['train_id']]
+        return items, None
+
+    def _booking_data(self, index, booking):
+        return {
+            "index": index,
+            "status": "CONFIRMED",
+            "booking_id": str(booking.id),
+            "train_id": booking.train_id,
+            "seat_numbers": booking.seat_numbers,
+            "total_price": booking.total_price
+        }
+
+    @idempotent
+    def post(self, request):
+        mode = request.data.get('mode', 'atomic')
+        if mode not in BATCH_MODES:
+            return Response({
+                "message": f"mode must be one of: {', '.join(BATCH_MODES)}."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        items, error = self._parse_items(request.data.get('items'))
+        if error:
+            return error
+
+        try:
+            results = book_batch(request.user, items, mode=mode)
+        except BatchItemFailed as e:
+            error = describe_item_error(e.error)
+            return Response({
+                "status": "error",
+                **error,
+                "message": f"Item {e.index} could not be booked, so nothing was booked. {error['message']}",
+                "failed_item": e.index
+            }, status=status.HTTP_409_CONFLICT)
+        except ITEM_ERRORS as e:
+            error = describe_item_error(e)
+            return Response({
+                "status": "error",
+                **error,
+                "message": f"The batch could not be booked, so nothing was booked. {error['message']}"
+            }, status=status.HTTP_409_CONFLICT)
+
+        data = []
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                data.append({"index": index, "status": "FAILED", **describe_item_error(result)})
+            else:
+                data.append(self._booking_data(index, result))
+        confirmed = [item for item in data if item["status"] == "CONFIRMED"]
+        return Response({
+            "status": "success" if len(confirmed) == len(data) else "partial",
+            "message": f"Booked {len(confirmed)} of {len(data)} items",
+            "mode": mode,
+            "results": data,
+            "total_price": sum(item["total_price"] for item in confirmed)
+        }, status=status.HTTP_201_CREATED if len(confirmed) == len(data) else status.HTTP_207_MULTI_STATUS)
+
+# Seat holds - keep seats for a user while they pay, then confirm or release
+class SeatHoldView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @read_from_replica
+    def get(self, request, train_id):
+        train = get_object_or_404(Train, train_id=train_id)
+        holds = list(active_holds(request.user, train))
+        return Response({
+            "train_id": train.train_id,
+            "seat_numbers": [hold.seat_number for hold in holds],
+            "expires_at": min((hold.expires_at for hold in holds), default=None)
+        })
+
+    @idempotent
+    def post(self, request, train_id):
+        seat_numbers = request.data.get('seat_numbers', [])
+        if not seat_numbers:
+            return Response({
+                "message": "seat_numbers is required."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        train = get_object_or_404(Train, train_id=train_id)
+        try:
+            expires_at = hold_seats(request.user, train, seat_numbers)
+        except InvalidSeats as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "invalid_seats"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except SeatsUnavailable as e:
+            return Response({
+                "status": "error",
+                "message": "Some selected seats are not available.",
+                "unavailable_seats": e.seat_numbers,
+                "available_seats": available_seat_numbers(train, limit=settings.CONFLICT_AVAILABLE_SEATS_LIMIT),
+                "error_type": "seats_taken"
+            }, status=status.HTTP_409_CONFLICT)
+        except (DatabaseError, ConcurrentUpdate):
+            return Response({
+                "status": "error",
+                "message": "The seats you selected are no longer available. Please choose from the available seats.",
+                "available_seats": available_seat_numbers(train, limit=settings.CONFLICT_AVAILABLE_SEATS_LIMIT),
+                "error_type": "concurrent_booking"
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "status": "success",
+            "message": "Seats held successfully",
+            "seat_numbers": normalize_seat_numbers(seat_numbers),
+            "expires_at": expires_at
+        }, status=status.HTTP_201_CREATED)
+
+class SeatHoldConfirmView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @idempotent
+    def post(self, request, train_id):
+        train = get_object_or_404(Train, train_id=train_id)
+        try:
+            booking = confirm_hold(request.user, train, request.data.get('seat_numbers'))
+        except NoActiveHold as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "no_active_hold"
+            }, status=status.HTTP_404_NOT_FOUND)
+        except InvalidSeats as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "invalid_seats"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except SeatsUnavailable as e:
+            return Response({
+                "status": "error",
+                "message": "Some selected seats are not held by you or the hold has expired.",
+                "unavailable_seats": e.seat_numbers,
+                "error_type": "hold_expired"
+            }, status=status.HTTP_409_CONFLICT)
+        except (DatabaseError, ConcurrentUpdate):
+            return Response({
+                "status": "error",
+                "message": "The booking could not be confirmed right now. Please retry.",
+                "error_type": "concurrent_booking"
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "status": "success",
+            "message": "Seats booked successfully",
+            "booking_id": str(booking.id),
+            "seat_numbers": booking.seat_numbers,
+            "status": "CONFIRMED",
+            "total_price": booking.total_price
+        }, status=status.HTTP_201_CREATED)
+
+class SeatHoldReleaseView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, train_id):
+        train = get_object_or_404(Train, train_id=train_id)
+        try:
+            released = release_hold(request.user, train, request.data.get('seat_numbers'))
+        except NoActiveHold as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "no_active_hold"
+            }, status=status.HTTP_404_NOT_FOUND)
+        except InvalidSeats as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "invalid_seats"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except (DatabaseError, ConcurrentUpdate):
+            return Response({
+                "status": "error",
+                "message": "The hold could not be released right now. Please retry.",
+                "error_type": "concurrent_booking"
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "status": "success",
+            "message": "Seats released successfully",
+            "seat_numbers": released
+        })
+
+# Waitlist - queue for seats on a full train, promoted to bookings as seats free up
+class WaitlistView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _entry_data(self, entry):
+        data = {
+            "entry_id": str(entry.id),
+            "seat_count": entry.seat_count,
+            "waitlist_status": entry.status
+        }
+        if entry.status == 'WAITING':
+            data["position"] = waitlist_position(entry)
+        elif entry.booking_id:
+            data["booking_id"] = str(entry.booking_id)
+        return data
+
+    @read_from_replica
+    def get(self, request, train_id):
+        train = get_object_or_404(Train, train_id=train_id)
+        entries = WaitlistEntry.objects.filter(
+            train=train,
+            user=request.user
+        ).exclude(status='CANCELLED').order_by('position')
+        return Response({
+            "train_id": train.train_id,
+            "entries": [self._entry_data(entry) for entry in entries]
+        })
+
+    @idempotent
+    def post(self, request, train_id):
+        seat_count = request.data.get('seat_count')
+        if not str(seat_count).isdigit() or int(seat_count) <= 0:
+            return Response({
+                "message": "seat_count must be a positive number."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        train = get_object_or_404(Train, train_id=train_id)
+        if int(seat_count) > train.total_seats:
+            return Response({
+                "status": "error",
+                "message": f"Train {train.name} only has {train.total_seats} seats.",
+                "error_type": "not_enough_seats"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            entry = join_waitlist(request.user, train, int(seat_count))
+        except AlreadyWaitlisted as e:
+            return Response({
+                "status": "error",
+                "message": str(e),
+                "error_type": "already_waitlisted"
+            }, status=status.HTTP_409_CONFLICT)
+
+        # Joining promotes straight away when seats are already free
+        entry.refresh_from_db()
+        return Response({
+            "status": "success",
+            "message": "Seats booked from the waitlist" if entry.status == 'PROMOTED' else "Joined the waitlist",
+            **self._entry_data(entry)
+        }, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, train_id):
+        train = get_object_or_404(Train, train_id=train_id)
+        if not leave_waitlist(request.user, train):
+            return Response({
+                "message": "You are not on the waitlist for this train"
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "status": "success",
+            "message": "Left the waitlist"
+        })
+
+# Booking queue status - result of a request admitted with a ticket
+class BookingQueueStatusView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, ticket):
+        try:
+            intent = BookingIntent.objects.select_related('booking').get(ticket=ticket, user=request.user)
+        except BookingIntent.DoesNotExist:
+            return Response(
+                {"message": "Ticket not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        data = {
+            "ticket": str(intent.ticket),
+            "train_id": intent.train_id,
+            "queue_status": intent.status
+        }
+        if intent.status == 'QUEUED':
+            data["position"] = queue_position(intent)
+        elif intent.status == 'CONFIRMED' and intent.booking:
+            data.update({
+                "booking_id": str(intent.booking.id),
+                "seat_numbers": intent.booking.seat_numbers,
+                "total_price": intent.booking.total_price
+            })
+        elif intent.status == 'FAILED':
+            data.update({
+                "message": intent.message,
+                "error_type": intent.error_type
+            })
+        return Response(data)
+
+class PendingBookingStatusView(APIView):
+    """Outcome of a sharded booking whose reply timed out"""
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, token):
+        try:
+            request_id, settled = read_pending_booking_token(token)
+        except BadSignature:
+            return Response(
+                {"message": "Request not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        data = {"request_id": token}
+        booking = Booking.objects.filter(request_id=request_id, user=request.user).first()
+        if booking is not None:
+            data.update({
+                "booking_status": "CONFIRMED",
+                "booking_id": str(booking.id),
+                "train_id": booking.train_id,
+                "seat_numbers": booking.seat_numbers,
+                "total_price": booking.total_price
+            })
+        elif settled:
+            data.update({
+                "booking_status": "FAILED",
+                "message": "The booking was not made. Please book again.",
+                "error_type": "expired"
+            })
+        else:
+            data["booking_status"] = "PENDING"
+        return Response(data)
+
 # Booking detail view - only owner or admin can access
 class BookingDetailView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    @read_from_replica
     def get(self, request, train_id, booking_id):
         try:
-            booking = Booking.objects.get(
+            booking = BookingDetailSerializer.setup_eager_loading(Booking.objects).get(
                 id=booking_id,
                 train__train_id=train_id,
                 user=request.user
@@ -462,6 +966,86 @@ class BookingDetailView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+# Booking cancellation - frees the seats of the user's own bookings
+class BookingCancelView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, train_id, booking_id):
+        bookings = Booking.objects.filter(
+            id=booking_id,
+            train__train_id=train_id,
+            user=request.user
+        )
+        if not bookings.exists():
+            return Response(
+                {"message": "Booking not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        try:
+            cancel_bookings(bookings)
+        except BookingNotCancellable:
+            return Response({
+                "status": "error",
+                "message": "Booking is already cancelled.",
+                "error_type": "not_cancellable"
+            }, status=status.HTTP_409_CONFLICT)
+        except (DatabaseError, ConcurrentUpdate):
+            return Response({
+                "status": "error",
+                "message": "The booking could not be cancelled right now. Please retry.",
+                "error_type": "concurrent_booking"
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "status": "success",
+            "message": "Booking cancelled successfully",
+            "booking_id": str(booking_id),
+            "status": "CANCELLED"
+        })
+
+class BulkBookingCancelView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        booking_ids = request.data.get('booking_ids', [])
+        try:
+            booking_ids = [int(booking_id) for booking_id in booking_ids]
+        except (TypeError, ValueError):
+            return Response({
+                "message": "booking_ids must be a list of integers."
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not booking_ids:
+            return Response({
+                "message": "booking_ids is required."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cancelled = cancel_bookings(
+                Booking.objects.filter(id__in=booking_ids, user=request.user)
+            )
+        except BookingNotCancellable:
+            return Response({
+                "status": "error",
+                "message": "None of the bookings can be cancelled.",
+                "error_type": "not_cancellable"
+            }, status=status.HTTP_409_CONFLICT)
+        except (DatabaseError, ConcurrentUpdate):
+            return Response({
+                "status": "error",
+                "message": "The bookings could not be cancelled right now. Please retry.",
+                "error_type": "concurrent_booking"
+            }, status=status.HTTP_409_CONFLICT)
+
+        cancelled_ids = set(cancelled)
+        return Response({
+            "status": "success",
+            "message": f"{len(cancelled)} bookings cancelled successfully",
+            "cancelled": [str(booking_id) for booking_id in cancelled],
+            "skipped": [str(booking_id) for booking_id in booking_ids if booking_id not in cancelled_ids]
+        })
+
 # Admin Signup view
 class AdminSignupView(APIView):
     authentication_classes = [AdminAPIKeyAuthentication]
@@ -491,6 +1075,7 @@ class AdminDashboardView(APIView):
     authentication_classes = [AdminAPIKeyAuthentication]
     permission_classes = [AdminApiKeyPermission]
 
+    @read_from_replica
     def get(self, request):
         # Get counts and summary
         total_trains = Train.objects.count()
@@ -503,6 +1088,24 @@ class AdminDashboardView(APIView):
             "total_bookings": total_bookings,
         })
 
+# Database connection pool stats, for sizing DB_POOL_MAX_SIZE
+class AdminDatabasePoolView(APIView):
+    authentication_classes = [AdminAPIKeyAuthentication]
+    permission_classes = [AdminApiKeyPermission]
+
+    def get(self, request):
+        result = {}
+        for alias in connections:
+            conn = connections[alias]
+            pool = getattr(conn, 'pool', None)
+            result[alias] = {
+                "pooled": pool is not None,
+                "conn_max_age": conn.settings_dict['CONN_MAX_AGE'],
+                "health_checks": conn.settings_dict['CONN_HEALTH_CHECKS'],
+                "stats": pool.get_stats() if pool is not None else None
+            }
+        return Response(result)
+
 class AdminStationListView(APIView):
     authentication_classes = [AdminAPIKeyAuthentication]
     permission_classes = [AdminApiKeyPermission]
@@ -556,11 +1159,9 @@ class AdminTrainListView(APIView):
     permission_classes = [AdminApiKeyPermission]
 
     def get(self, request):
-        trains = Train.objects.all()
+        trains = trains_with_availability()
         result = []
         for train in trains:
-            booked_count = Booking.objects.filter(train=train, booked=True).aggregate(total=models.Sum('seat_count'))['total'] or 0
-            available_seats = max(train.total_seats - booked_count, 0)
             result.append({
                 "train_id": train.train_id,
                 "name": train.name,
@@ -573,7 +1174,7 @@ class AdminTrainListView(APIView):
                     "station_name": train.destination.station_name
                 },
                 "total_seats": train.total_seats,
-                "available_seats": available_seats,
+                "available_seats": train.available_seats,
                 "departure_time": train.departure_time,
                 "arrival_time": train.arrival_time
             })
@@ -624,19 +1225,30 @@ class AdminTrainListView(APIView):
                 "error": "Invalid source or destination station code"
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            total_seats = int(total_seats)
+        except (ValueError, TypeError):
+            total_seats = 0
+        if total_seats <= 0:
+            return Response({
+                "error": "total_seats must be a positive integer"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Same inventory backend selection as TrainCreateView
         train = Train.objects.create(
             name=name,
             source=source,
             destination=destination,
             total_seats=total_seats,
             departure_time=departure_time,
-            arrival_time=arrival_time
+            arrival_time=arrival_time,
+            seat_bitmap=initial_seat_bitmap(total_seats)
         )
 
         return Response({
             "message": "Train created successfully",
             "train": {
-                "id": train.id,
+                "id": train.pk,
                 "train_id": train.train_id,
                 "name": train.name,
                 "source": {
@@ -653,23 +1265,47 @@ class AdminTrainListView(APIView):
             }
         }, status=status.HTTP_201_CREATED)
 
+# Admin bulk cancellation - cancels every booking on a train
+class AdminTrainCancelView(APIView):
+    authentication_classes = [AdminAPIKeyAuthentication]
+    permission_classes = [AdminApiKeyPermission]
+
+    def post(self, request, train_id):
+        train = get_object_or_404(Train, train_id=train_id)
+        # Close the waitlist first so the freed seats are not handed straight back out
+        WaitlistEntry.objects.filter(train=train, status='WAITING').update(status='CANCELLED')
+        try:
+            cancelled = cancel_bookings(Booking.objects.filter(train=train))
+        except BookingNotCancellable:
+            cancelled = []
+        except (DatabaseError, ConcurrentUpdate):
+            return Response({
+                "error": "Bookings could not be cancelled right now. Please retry."
+            }, status=status.HTTP_409_CONFLICT)
+
+        train.refresh_from_db(fields=['seats_available'])
+        return Response({
+            "message": f"Cancelled {len(cancelled)} bookings on train {train.name} (ID: {train.train_id})",
+            "cancelled_bookings": len(cancelled),
+            "available_seats": train.seats_available
+        }, status=status.HTTP_200_OK)
+
 class ViewAllTrainsView(APIView):
     authentication_classes = []
     permission_classes = []
 
+    @read_from_replica
     def get(self, request):
-        trains = Train.objects.all()
+        trains = trains_with_availability()
         result = []
         for train in trains:
-            booked_count = Booking.objects.filter(train=train, booked=True).aggregate(total=models.Sum('seat_count'))['total'] or 0
-            available_seats = max(train.total_seats - booked_count, 0)
             result.append({
                 "train_id": train.train_id,
                 "name": train.name,
                 "source": train.source.station_name,
                 "destination": train.destination.station_name,
                 "total_seats": train.total_seats,
-                "available_seats": available_seats,
+                "available_seats": train.available_seats,
                 "departure_time": train.departure_time,
                 "arrival_time": train.arrival_time
             })
@@ -826,36 +1462,21 @@ class TrainDetailView(APIView):
     authentication_classes = []  # Allow unauthenticated access
     permission_classes = []      # No permissions required
 
+    @read_from_replica
     def get(self, request, train_id):
         try:
             print(f"Debug - Fetching train details for train_id: {train_id}")  # Debug log
-            train = Train.objects.get(train_id=train_id)
+            train = Train.objects.select_related('source', 'destination').get(train_id=train_id)
             print(f"Debug - Found train: {train.name}")  # Debug log
+            lapsed = lapsed_hold_seats(train)
+
+            etag = inventory_etag(train, lapsed=lapsed)
+            cached = not_modified(request, etag)
+            if cached is not None:
+                return cached
             
-            # Get confirmed bookings count
-            try:
-                booked_count = Booking.objects.filter(
-                    train=train, 
-                    status='CONFIRMED'
-                ).aggregate(total=Sum('seat_count'))['total'] or 0
-                print(f"Debug - Booked count: {booked_count}")  # Debug log
-            except Exception as e:
-                print(f"Debug - Error getting booked count: {str(e)}")  # Debug log
-                booked_count = 0
-            
-            # Get locked seats count
-            current_time = timezone.now()
-            try:
-                locked_seats = SeatLock.objects.filter(
-                    train=train,
-                    expires_at__gt=current_time
-                ).count()
-                print(f"Debug - Locked seats: {locked_seats}")  # Debug log
-            except Exception as e:
-                print(f"Debug - Error getting locked seats: {str(e)}")  # Debug log
-                locked_seats = 0
-            
-            available_seats = max(train.total_seats - booked_count - locked_seats, 0)
+            # Seat counters already exclude booked and locked seats
+            available_seats = train.seats_available + len(lapsed)
             print(f"Debug - Available seats: {available_seats}")  # Debug log
             
             response_data = {
@@ -869,7 +1490,7 @@ class TrainDetailView(APIView):
                 "arrival_time": train.arrival_time
             }
             print(f"Debug - Response data: {response_data}")  # Debug log
-            return Response(response_data)
+            return tag_response(Response(response_data), etag)
             
         except Train.DoesNotExist:
             print(f"Debug - Train not found: {train_id}")  # Debug log
@@ -888,12 +1509,16 @@ class TrainDetailView(APIView):
 
 # New SeatMatrixView
 class SeatMatrixView(APIView):
+    @read_from_replica
     def get(self, request, train_id):
         try:
             train = get_object_or_404(Train, train_id=train_id)
-            
-            # Get all seats for this train with their current status
-            seats = Seat.objects.filter(train=train).order_by('seat_number')
+            lapsed = lapsed_hold_seats(train)
+
+            etag = inventory_etag(train, lapsed=lapsed)
+            cached = not_modified(request, etag)
+            if cached is not None:
+                return cached
             
             # Create a seat matrix
             total_seats = train.total_seats
@@ -901,11 +1526,11 @@ class SeatMatrixView(APIView):
             
             # Create rows of 6 seats each (3 on each side with aisle in middle)
             current_row = []
-            for seat in seats:
+            for seat_number, seat_status in seat_statuses(train, lapsed=lapsed):
                 current_row.append({
-                    'seat_number': seat.seat_number,
-                    'status': seat.status,
-                    'is_booked': seat.status == 'BOOKED'
+                    'seat_number': seat_number,
+                    'status': seat_status,
+                    'is_booked': seat_status == 'BOOKED'
                 })
                 
                 if len(current_row) == 6:  # When we have 6 seats, start a new row
@@ -916,12 +1541,14 @@ class SeatMatrixView(APIView):
             if current_row:
                 seat_matrix.append(current_row)
             
-            return Response({
+            return tag_response(Response({
                 'train_id': train_id,
                 'total_seats': total_seats,
-                'available_seats': seats.filter(status='AVAILABLE').count(),
+                'available_seats': train.seats_available + len(lapsed),
+                # Pass back as ?since= to /seats/changes for later updates
+                'version': train.inventory_version,
                 'seat_matrix': seat_matrix
-            }, status=status.HTTP_200_OK)
+            }, status=status.HTTP_200_OK), etag)
             
         except Train.DoesNotExist:
             return Response({
@@ -933,14 +1560,90 @@ class SeatMatrixView(APIView):
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class SeatMatrixChangesView(APIView):
+    @read_from_replica
+    def get(self, request, train_id):
+        """
+        Return the seats whose status changed since the version a client last saw.
+
+        The client passes the 'version' from its last seat matrix or delta as
+        ?since=. When the change log no longer reaches back that far the full
+        seat list is returned instead, flagged with 'full': true.
+        """
+        try:
+            since = int(request.query_params.get('since', ''))
+        except ValueError:
+            return Response({
+                'error': 'since must be a seat matrix version'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        train = get_object_or_404(Train, train_id=train_id)
+        lapsed = lapsed_hold_seats(train)
+
+        etag = inventory_etag(train, lapsed=lapsed, since=since)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+
+        changed = seat_changes_since(train, since)
+        if changed is None:
+            statuses = seat_statuses(train, lapsed=lapsed)
+        else:
+            # Lapsed holds are not in the change log until they are released
+            changed = sorted(set(changed) | lapsed)
+            statuses = seat_statuses(train, changed, lapsed) if changed else []
+        return tag_response(Response({
+            'train_id': train_id,
+            'version': train.inventory_version,
+            'full': changed is None,
+            'available_seats': train.seats_available + len(lapsed),
+            'seats': [
+                {
+                    'seat_number': seat_number,
+                    'status': seat_status,
+                    'is_booked': seat_status == 'BOOKED'
+                }
+                for seat_number, seat_status in statuses
+            ]
+        }, status=status.HTTP_200_OK), etag)
+
 class UserBookingsView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    @read_from_replica
     def get(self, request):
+        """
+        List the user's bookings, newest first.
+
+        Without query parameters the whole history is returned as a list.
+        With ?limit= and/or ?cursor= one page is returned as
+        {"results": [...], "next_cursor": ...}; pass next_cursor back as
+        ?cursor= for the following page until it is null.
+        """
         try:
-            # Get all bookings for the current user
-            bookings = Booking.objects.filter(user=request.user).order_by('-created_at')
+            # Trains and stations come in the same query as the bookings
+            bookings = Booking.objects.filter(user=request.user).select_related(
+                'train__source',
+                'train__destination'
+            )
+
+            paginate = 'limit' in request.query_params or 'cursor' in request.query_params
+            if paginate:
+                try:
+                    limit = min(max(int(request.query_params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                except ValueError:
+                    return Response({
+                        'error': 'limit must be a number'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                try:
+                    bookings, next_cursor = keyset_page(bookings, request.query_params.get('cursor'), limit)
+                except InvalidCursor as e:
+                    return Response({
+                        'error': str(e)
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                bookings = bookings.order_by('-created_at', '-id')
             
             # Prepare the response data
             bookings_data = []
@@ -960,7 +1663,12 @@ class UserBookingsView(APIView):
                     'booking_date': booking.created_at.strftime('%Y-%m-%d %H:%M:%S'),
                 }
                 bookings_data.append(booking_data)
-            
+
+            if paginate:
+                return Response({
+                    'results': bookings_data,
+                    'next_cursor': next_cursor
+                })
             return Response(bookings_data)
             
         except Exception as e:
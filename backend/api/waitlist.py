@@ -0,0 +1,176 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .allocation import NotEnoughSeats, SeatAllocator
+from .inventory import SeatsUnavailable, available_seat_numbers, reserve_seats_for_bookings
+from .models import Booking, Train, WaitlistEntry
+from .retry import retry_on_conflict, run_with_retry
+
+# Times a promotion batch is re-planned after losing seats to a direct booking
+PROMOTION_ATTEMPTS = 3
+
+
+class AlreadyWaitlisted(Exception):
+    """Raised when a user joins a waitlist they are already waiting on."""
+
+
+def waitlist_position(entry):
+    """Return the entry's 1-based place among the train's waiting entries."""
+    return WaitlistEntry.objects.filter(
+        train_id=entry.train_id,
+        status='WAITING',
+        position__lt=entry.position
+    ).count() + 1
+
+
+def join_waitlist(user, train, seat_count):
+    """
+    Append a user to the end of a train's waitlist.
+
+    Positions are handed out as the current maximum plus one; two joins
+    racing for the same position hit the (train, position) unique constraint
+    and the loser retries with the next one.
+
+    Args:
+        user (User): The passenger
+        train (Train): The train
+        seat_count (int): Number of seats wanted
+
+    Returns:
+        WaitlistEntry: The new entry
+
+    Raises:
+        AlreadyWaitlisted: If the user is already waiting on this train
+    """
+    def join():
+        with transaction.atomic():
+            if WaitlistEntry.objects.filter(train=train, user=user, status='WAITING').exists():
+                raise AlreadyWaitlisted("You are already on the waitlist for this train")
+            last = WaitlistEntry.objects.filter(train=train).aggregate(last=Max('position'))['last']
+            return WaitlistEntry.objects.create(
+                train=train,
+                user=user,
+                seat_count=seat_count,
+                position=(last or 0) + 1
+            )
+
+    entry = run_with_retry(join, retry_on=(IntegrityError,), attempts=5, backoff=0.005, max_backoff=0.05)
+    # Seats may already be free; promote straight away rather than wait for a release
+    schedule_promotion(train)
+    return entry
+
+
+def leave_waitlist(user, train):
+    """
+    Take a user off a train's waitlist.
+
+    Returns:
+        int: Number of entries cancelled
+    """
+    with transaction.atomic():
+        left = WaitlistEntry.objects.filter(
+            train=train,
+            user=user,
+            status='WAITING'
+        ).update(status='CANCELLED')
+        if left:
+            # A large group leaving the head of the queue may unblock smaller ones
+            schedule_promotion(train)
+    return left
+
+
+def schedule_promotion(train):
+    """
+    Promote the train's waitlist once the current transaction commits.
+
+    Called wherever seats are released. Outside a transaction the promotion
+    runs immediately. A failed promotion is logged, not raised, so it never
+    breaks the release that triggered it; the next release retries it.
+    """
+    train_id = train.pk
+    transaction.on_commit(lambda: promote_waitlist(train_id), robust=True)
+
+
+def promote_waitlist(train_id, batch_size=None):
+    """
+    Book seats for waiting users, oldest entry first, in batches.
+
+    Each batch locks up to ``batch_size`` waiting entries, plans their seats
+    with one SeatAllocator over the train's current availability, inserts
+    their bookings in one statement and claims all their seats with one
+    update, in one transaction. The queue is strictly FIFO: promotion stops
+    at the first entry that does not fit, so a large group is never overtaken.
+
+    Args:
+        train_id (str): Primary key of the train
+        batch_size (int, optional): Entries per transaction. Defaults to
+            settings.WAITLIST_PROMOTION_BATCH
+
+    Returns:
+        list: Bookings created for promoted entries
+    """
+    batch_size = batch_size or settings.WAITLIST_PROMOTION_BATCH
+    promoted = []
+    while True:
+        for attempt in range(PROMOTION_ATTEMPTS):
+            try:
+                bookings, done = retry_on_conflict(lambda: _promote_batch(train_id, batch_size))
+                break
+            except SeatsUnavailable:
+                # A direct booking took planned seats; plan again from fresh availability
+                if attempt == PROMOTION_ATTEMPTS - 1:
+                    raise
+        promoted += bookings
+        if done:
+            return promoted
+
+
+def _promote_batch(train_id, batch_size):
+    with transaction.atomic():
+        entries = list(
+            WaitlistEntry.objects.select_for_update().filter(
+                train_id=train_id,
+                status='WAITING'
+            ).order_by('position')[:batch_size]
+        )
+        if not entries:
+            return [], True
+
+        train = Train.objects.get(pk=train_id)
+        allocator = SeatAllocator(available_seat_numbers(train))
+        plans = []
+        for entry in entries:
+            try:
+                plans.append((entry, allocator.allocate(entry.seat_count, together=True)))
+            except NotEnoughSeats:
+                break
+        if not plans:
+            return [], True
+
+        now = timezone.now()
+        bookings = Booking.objects.bulk_create([
+            Booking(
+                user_id=entry.user_id,
+                train=train,
+                seat_count=len(seat_numbers),
+                seat_numbers=seat_numbers,
+                total_price=Booking.price_for(len(seat_numbers)),  # bulk_create skips Booking.save()
+                status='CONFIRMED',
+                booked=True,
+                request_timestamp=now
+            )
+            for entry, seat_numbers in plans
+        ])
+        reserve_seats_for_bookings(train, {
+            booking.pk: seat_numbers for booking, (_, seat_numbers) in zip(bookings, plans)
+        })
+        for booking, (entry, _) in zip(bookings, plans):
+            entry.status = 'PROMOTED'
+            entry.booking = booking
+            entry.promoted_at = now
+        WaitlistEntry.objects.bulk_update([entry for entry, _ in plans], ['status', 'booking', 'promoted_at'])
+
+        done = len(plans) < len(entries) or len(entries) < batch_size
+        return bookings, done
@@ -9,7 +9,7 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
-from decouple import config
+from decouple import Csv, config
 
 from pathlib import Path
 
@@ -54,6 +54,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.replicas.ReplicaPinMiddleware",
 ]
 
 ROOT_URLCONF = "irctc_backend.urls"
@@ -128,6 +129,12 @@ AUTH_USER_MODEL = 'api.User'
 SECRET_KEY = config('SECRET_KEY')
 DEBUG = config('DEBUG', cast=bool, default=True)
 
+# Connection reuse: with DB_POOL (psycopg 3 + psycopg_pool) each worker keeps a
+# pool of open connections; without it, connections persist for DB_CONN_MAX_AGE
+# seconds. Either way connections are health-checked before being reused
+# (for the pool, Django passes ConnectionPool.check_connection).
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -136,15 +143,134 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT', default='5432'),
+        # Pooled connections go back to the pool after each request instead
+        'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                # Seconds before a connection is replaced, and to wait for a free one
+                'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=30 * 60, cast=float),
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            },
+        } if DB_POOL else {},
+    }
+}
+
+# Read replicas as host[:port] entries; each becomes a 'replica_N' database
+# with the primary's name and credentials. Views marked read_from_replica
+# read from them (see api/replicas.py).
+for index, replica in enumerate(config('DB_REPLICAS', default='', cast=Csv())):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+# Seconds a user's reads stay on the primary after they write. Pins live in
+# the default cache, so deployments with several worker processes need a
+# shared backend such as Redis or memcached.
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
     }
 }
 
 ADMIN_API_KEY = config('ADMIN_API_KEY')
 
+# How new trains store their seats: 'rows' (one Seat row per seat) or
+# 'bitmap' (a packed bitset on the train row, see api/bitmap.py)
+SEAT_INVENTORY_BACKEND = config('SEAT_INVENTORY_BACKEND', default='rows')
+
+# How BookSeatView serializes bookings: 'train_lock' takes a NOWAIT lock on the
+# train row, 'conditional' only claims the requested seats with a guarded UPDATE
+# and moves the train's counters after commit, so non-overlapping bookings on
+# the same train run in parallel
+SEAT_CLAIM_MODE = config('SEAT_CLAIM_MODE', default='train_lock')
+
+# In-server retries for booking transactions that hit a lock conflict, and how
+# many available seats a conflict response lists (None for all of them)
+BOOKING_RETRY = {
+    'ATTEMPTS': config('BOOKING_RETRY_ATTEMPTS', default=3, cast=int),
+    'BACKOFF': config('BOOKING_RETRY_BACKOFF', default=0.02, cast=float),
+    'MAX_BACKOFF': config('BOOKING_RETRY_MAX_BACKOFF', default=0.2, cast=float),
+    'DEADLINE': config('BOOKING_RETRY_DEADLINE', default=1.0, cast=float),
+}
+CONFLICT_AVAILABLE_SEATS_LIMIT = config('CONFLICT_AVAILABLE_SEATS_LIMIT', default=100, cast=int) or None
+
+# Seconds a stored Idempotency-Key response is replayed for, and how long a
+# request may hold a key before a retry is allowed to take it over
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+IDEMPOTENCY_KEY_LEASE = config('IDEMPOTENCY_KEY_LEASE', default=60, cast=int)
+
+# Seconds a seat hold lasts before its seats become available again
+SEAT_HOLD_SECONDS = config('SEAT_HOLD_SECONDS', default=5 * 60, cast=int)
+
+# train_ids each process reserves from the ID sequence at a time; 1 keeps
+# IDs gap-free and in creation order, larger blocks save a round trip per train
+TRAIN_ID_BLOCK_SIZE = config('TRAIN_ID_BLOCK_SIZE', default=1, cast=int)
+
+# Inventory versions of seat changes kept per train for delta seat matrices;
+# clients further behind get a full snapshot
+SEAT_CHANGE_LOG_SIZE = config('SEAT_CHANGE_LOG_SIZE', default=1000, cast=int)
+
+# Trains per process whose free-seat index is kept between automatic
+# allocations (see api.seat_index)
+SEAT_INDEX_CACHE_SIZE = config('SEAT_INDEX_CACHE_SIZE', default=1000, cast=int)
+
+# Waitlist entries promoted per transaction when seats are released
+WAITLIST_PROMOTION_BATCH = config('WAITLIST_PROMOTION_BATCH', default=50, cast=int)
+
+# 'direct' books inside the request; 'queue' admits requests to the booking
+# queue with a ticket and lets drain_booking_queue workers book them
+BOOKING_ADMISSION = config('BOOKING_ADMISSION', default='direct')
+# Queued intents a train accepts before new requests are turned away (0 = unlimited)
+BOOKING_QUEUE_MAX_PER_TRAIN = config('BOOKING_QUEUE_MAX_PER_TRAIN', default=5000, cast=int)
+# Seconds a worker may hold an intent before another worker re-queues it
+BOOKING_QUEUE_LEASE = config('BOOKING_QUEUE_LEASE', default=60, cast=int)
+
+# 'local' books in the web process, one transaction per booking;
+# 'group_commit' coalesces concurrent bookings for a train in this process
+# into one transaction; 'sharded' sends each booking to the
+# run_booking_shards writer process that owns the train
+BOOKING_WRITER = config('BOOKING_WRITER', default='local')
+# Seconds a group-commit leader waits for more bookings, and the batch cap
+GROUP_COMMIT_WINDOW = config('GROUP_COMMIT_WINDOW', default=0.005, cast=float)
+GROUP_COMMIT_MAX_BATCH = config('GROUP_COMMIT_MAX_BATCH', default=100, cast=int)
+# Seconds a request waits for its batch to start before failing with a retry
+GROUP_COMMIT_WAIT_TIMEOUT = config('GROUP_COMMIT_WAIT_TIMEOUT', default=5.0, cast=float)
+
+# Largest number of items accepted by the batch booking endpoint
+BATCH_BOOKING_MAX_ITEMS = config('BATCH_BOOKING_MAX_ITEMS', default=50, cast=int)
+# host:port of each shard writer; trains are assigned by a hash of train_id
+BOOKING_SHARDS = config('BOOKING_SHARDS', default='127.0.0.1:7301,127.0.0.1:7302', cast=Csv())
+BOOKING_SHARD_AUTHKEY = config('BOOKING_SHARD_AUTHKEY', default=SECRET_KEY)
+# Seconds the web process waits for a shard's reply
+BOOKING_SHARD_TIMEOUT = config('BOOKING_SHARD_TIMEOUT', default=5.0, cast=float)
+# Seconds after which a shard drops a booking it has not started yet; a
+# booking whose reply timed out reports pending until then
+BOOKING_SHARD_REQUEST_TTL = config('BOOKING_SHARD_REQUEST_TTL', default=30, cast=int)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    # orjson-backed JSON (see api/renderers.py); plain DRF JSON without orjson
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 from corsheaders.defaults import default_headers
 
@@ -154,4 +280,5 @@ CORS_ALLOW_HEADERS = list(default_headers) + [
     'x-api-key',
     'authorization',
     'Api-Key',
+    'idempotency-key',
 ]